@@ -0,0 +1,70 @@
+"""
+Compares the default dtypes of APL with dtypes='compact'
+(categoricals and string[pyarrow]) on synthetic data: load time,
+memory of APL.df, time of the derived tables and peak RSS.
+
+Each policy runs in a fresh process, see synthetic.run_modes.
+
+    python benchmarks/bench_apl_dtypes.py --n-rows 2000000
+"""
+import argparse
+import logging
+import sys
+import tempfile
+import time
+
+from pathlib import Path as P
+
+sys.path.insert(0, str(P(__file__).resolve().parents[1]))
+
+from benchmarks.synthetic import peak_rss, run_modes, write_apl
+from lsarp_api.apl.APL import APL
+
+POLICIES = {
+    "default": lambda fn: APL(fn=fn, fn_results=None, version=None),
+    "compact": lambda fn: APL(fn=fn, fn_results=None, version=None, dtypes="compact"),
+}
+
+TABLES = ["encounters", "cultures", "bi_info", "drugs", "organisms", "age_gender"]
+
+
+def run(fn, policy):
+    logging.disable(logging.WARNING)
+
+    start = time.perf_counter()
+    apl = POLICIES[policy](fn)
+    load = time.perf_counter() - start
+    mb = apl.df.memory_usage(deep=True).sum() / 1e6
+
+    start = time.perf_counter()
+    for name in TABLES:
+        getattr(apl, name)
+    apl.gen_results()
+    derived = time.perf_counter() - start
+
+    print(
+        f"{policy:10s} {len(apl.df):>10d} rows {load:8.2f} s load {mb:10.0f} MB df "
+        f"{derived:8.2f} s derived tables {peak_rss():10.0f} MB peak RSS"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n-rows", type=int, default=2_000_000)
+    parser.add_argument("--fn", default=None)
+    parser.add_argument("--policy", default=None, choices=list(POLICIES))
+    args = parser.parse_args()
+
+    if args.policy is not None:
+        run(args.fn, args.policy)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fn = args.fn or str(P(tmp) / "APL.parquet")
+        if args.fn is None:
+            write_apl(fn, n_rows=args.n_rows)
+        run_modes(__file__, POLICIES, ["--fn", fn], option="--policy")
+
+
+if __name__ == "__main__":
+    main()
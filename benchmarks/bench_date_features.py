@@ -0,0 +1,64 @@
+"""
+Times add_date_features_from_datetime_col for the three numeric
+modes and reports the memory used by the added columns.
+
+Each mode runs in a fresh process, see synthetic.run_modes.
+
+    python benchmarks/bench_date_features.py --n-rows 10000000
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from pathlib import Path as P
+
+sys.path.insert(0, str(P(__file__).resolve().parents[1]))
+
+from benchmarks.synthetic import peak_rss, run_modes
+from lsarp_api.tools import add_date_features_from_datetime_col
+
+MODES = {
+    str(numeric): lambda df, numeric=numeric: add_date_features_from_datetime_col(
+        df, "COLLECT_DTM", numeric=numeric
+    )
+    for numeric in [True, False, "mixed"]
+}
+
+
+def make_times(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp("2010-01-01").value
+    stop = pd.Timestamp("2023-01-01").value
+    return pd.to_datetime(rng.integers(start, stop, n_rows))
+
+
+def run(n_rows, mode):
+    df = pd.DataFrame({"COLLECT_DTM": make_times(n_rows)})
+    start = time.perf_counter()
+    MODES[mode](df)
+    wall = time.perf_counter() - start
+    mb = df.drop(columns="COLLECT_DTM").memory_usage(deep=True).sum() / 1e6
+    print(
+        f"numeric={mode:6s} {len(df):>10d} rows {wall:8.2f} s {mb:10.0f} MB added "
+        f"{peak_rss():10.0f} MB peak RSS"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n-rows", type=int, default=10_000_000)
+    parser.add_argument("--mode", default=None, choices=list(MODES))
+    args = parser.parse_args()
+
+    if args.mode is not None:
+        run(args.n_rows, args.mode)
+        return
+
+    run_modes(__file__, MODES, ["--n-rows", args.n_rows])
+
+
+if __name__ == "__main__":
+    main()
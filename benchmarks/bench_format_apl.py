@@ -0,0 +1,55 @@
+"""
+Peak memory of format_apl_data on a synthetic APL-shaped frame.
+
+Each mode runs in a fresh process, see synthetic.run_modes. The peak
+RSS is reset after the raw frame is generated, so the reported peak
+only includes the formatting step. The raw frame itself is reported
+separately.
+
+    python benchmarks/bench_format_apl.py --n-rows 20000000
+"""
+import argparse
+import sys
+import time
+
+from pathlib import Path as P
+
+sys.path.insert(0, str(P(__file__).resolve().parents[1]))
+
+from benchmarks.synthetic import make_raw_apl, peak_rss, reset_peak_rss, run_modes
+from lsarp_api.tools import format_apl_data
+
+MODES = {
+    "copy": lambda df: format_apl_data(df),
+    "inplace": lambda df: format_apl_data(df, inplace=True),
+    "years": lambda df: format_apl_data(df, years=[2015, 2016]),
+}
+
+
+def run(n_rows, mode):
+    df = make_raw_apl(n_rows)
+    raw = df.memory_usage(deep=True).sum() / 1e6
+    reset_peak_rss()
+    before = peak_rss()
+    start = time.perf_counter()
+    MODES[mode](df)
+    wall = time.perf_counter() - start
+    peak = peak_rss() - before
+    print(f"{mode:10s} {len(df):>10d} rows {raw:10.0f} MB raw {wall:8.2f} s {peak:10.0f} MB peak RSS increase")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n-rows", type=int, default=20_000_000)
+    parser.add_argument("--mode", default=None, choices=list(MODES))
+    args = parser.parse_args()
+
+    if args.mode is not None:
+        run(args.n_rows, args.mode)
+        return
+
+    run_modes(__file__, MODES, ["--n-rows", args.n_rows])
+
+
+if __name__ == "__main__":
+    main()
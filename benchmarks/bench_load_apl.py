@@ -0,0 +1,60 @@
+"""
+Compares the full load of the APL parquet file with the
+column-pruned, predicate-pushdown load of load_apl_data.
+
+Each mode runs in a fresh process, see synthetic.run_modes.
+
+    python benchmarks/bench_load_apl.py --n-rows 2000000
+"""
+import argparse
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from pathlib import Path as P
+
+sys.path.insert(0, str(P(__file__).resolve().parents[1]))
+
+from benchmarks.synthetic import peak_rss, run_modes, write_apl
+from lsarp_api.apl.APL import load_apl_data
+
+MODES = {
+    "full": lambda fn: pd.read_parquet(fn),
+    "years": lambda fn: load_apl_data(fn, years=[2020]),
+    "organisms+years": lambda fn: load_apl_data(fn, organisms=["SA"], years=[2020]),
+    "organisms+years+columns": lambda fn: load_apl_data(
+        fn, organisms=["SA"], years=[2020], columns=["BI_NBR", "DRUG", "INTERP"]
+    ),
+}
+
+
+def run(fn, mode):
+    start = time.perf_counter()
+    df = MODES[mode](fn)
+    wall = time.perf_counter() - start
+    rss = peak_rss()
+    print(f"{mode:25s} {len(df):>10d} rows {wall:8.2f} s {rss:10.0f} MB peak RSS")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n-rows", type=int, default=2_000_000)
+    parser.add_argument("--fn", default=None)
+    parser.add_argument("--mode", default=None, choices=list(MODES))
+    args = parser.parse_args()
+
+    if args.mode is not None:
+        run(args.fn, args.mode)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fn = args.fn or str(P(tmp) / "APL.parquet")
+        if args.fn is None:
+            write_apl(fn, n_rows=args.n_rows)
+        run_modes(__file__, MODES, ["--fn", fn])
+
+
+if __name__ == "__main__":
+    main()
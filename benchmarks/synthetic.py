@@ -0,0 +1,163 @@
+"""
+Synthetic APL-shaped data for the benchmarks.
+
+The real APL extracts are only available on ARC. The generated frames
+have the same columns and a similar structure: encounters contain
+cultures (BI numbers), cultures contain one row per tested drug.
+
+Also contains the harness that runs each benchmark mode in a fresh
+process and measures its peak RSS.
+"""
+import ctypes
+import resource
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+
+from lsarp_api.tools import format_apl_data
+
+ORGANISMS = {
+    "SA": "Staphylococcus aureus",
+    "EC": "Escherichia coli",
+    "KP": "Klebsiella pneumoniae",
+    "PA": "Pseudomonas aeruginosa",
+    "ENTFAES": "Enterococcus faecalis",
+    "CA": "Candida albicans",
+}
+
+DRUGS = [
+    "Amikacin", "Ampicillin", "Cefazolin", "Ceftriaxone", "Ciprofloxacin",
+    "Clindamycin", "Cloxacillin", "Ertapenem", "Gentamicin", "Meropenem",
+    "Penicillin", "Piperacillin-tazobactam", "Tobramycin",
+    "Trimethoprim-sulfamethoxazole", "Vancomycin",
+]
+
+FACILITIES = ["FMC", "PLC", "RGH", "SHC", "ACH"]
+
+
+def make_raw_apl(n_rows=1_000_000, seed=0):
+    """
+    Returns an unformatted APL frame with about `n_rows` rows.
+    """
+    rng = np.random.default_rng(seed)
+    n_drugs = 8
+    n_bi = max(n_rows // n_drugs, 1)
+    n_enc = max(n_bi // 2, 1)
+    n_pid = max(n_enc // 2, 1)
+
+    # Encounters
+    enc_pid = rng.integers(0, n_pid, n_enc)
+    admit = pd.Timestamp("2010-01-01") + pd.to_timedelta(
+        rng.integers(0, 12 * 365 * 24 * 60, n_enc), unit="min"
+    )
+    enc = pd.DataFrame(
+        {
+            "ORD_ENCNTR_NBR": [f"E{i:09d}" for i in range(n_enc)],
+            "PID": [f"P{i:08d}" for i in enc_pid],
+            "ENCNTR_ADMIT_DTM": admit,
+            "DSCHG_DTM": admit + pd.to_timedelta(rng.integers(1, 60, n_enc), unit="D"),
+            "ENCR_GRP": rng.choice(["INPATIENT", "EMERGENCY", "OUTPATIENT"], n_enc),
+            "GENDER": rng.choice(["Male", "Female"], n_enc),
+            "NAGE_YR": rng.integers(0, 100, n_enc),
+            "ORD_ENCNTR_TYPE": rng.choice(["Inpatient", "Emergency"], n_enc),
+            "VISIT_REASON": rng.choice(["Fever", "Sepsis", "Pneumonia", ""], n_enc),
+            "SOURCE_LIS": rng.choice(["SUNQUEST", "MILLENNIUM"], n_enc),
+            "CURRENT_PT_FACILITY": rng.choice(FACILITIES, n_enc),
+        }
+    )
+
+    # Cultures
+    bi_enc = np.sort(rng.integers(0, n_enc, n_bi))
+    org = rng.choice(list(ORGANISMS), n_bi)
+    bi = enc.iloc[bi_enc].reset_index(drop=True)
+    bi["BI_NBR"] = [f"BI_{i // 10000:02d}_{i % 10000:04d}" for i in range(n_bi)]
+    bi["COLLECT_DTM"] = bi.ENCNTR_ADMIT_DTM + pd.to_timedelta(
+        rng.integers(-24 * 60, 20 * 24 * 60, n_bi), unit="min"
+    )
+    bi["CULT_START_DTM"] = bi.COLLECT_DTM + pd.Timedelta(hours=2)
+    bi["ORGANISM"] = org
+    bi["ORG_LONG_NAME"] = [ORGANISMS[o] for o in org]
+    bi["ORG_SHORT_NAME"] = bi["ORGANISM"]
+    bi["ORG_GENUS"] = bi.ORG_LONG_NAME.str.split(" ").str[0]
+    bi["ORG_GRAM_TYPE"] = np.where(np.isin(org, ["SA", "ENTFAES"]), "POS", "NEG")
+    bi["ORG_GROUP"] = bi["ORG_GENUS"]
+    bi["ORG_GROUP_SHORT"] = bi["ORGANISM"]
+    bi["BODY_SITE"] = "Blood"
+    bi["CURRENT_PT_LOCN"] = rng.choice(["ICU", "WARD", "ER"], n_bi)
+    bi["FLAG_DSCHG_OUT_OF_BOUNDS"] = False
+    bi["FLAG_AGE_GT_130YR"] = False
+
+    # Drug results and reports
+    rows = np.repeat(np.arange(n_bi), n_drugs)
+    df = bi.iloc[rows].reset_index(drop=True)
+    n = len(df)
+    df["DRUG"] = rng.choice(DRUGS, n)
+    df["DRUG_CLASS"] = "Antibacterial"
+    df["INTERP"] = rng.choice(["S", "S", "S", "I", "R", None], n)
+    df["REPORT_NAME"] = rng.choice(["Gram stain", "Culture", "Susceptibility"], n)
+    df["REPORT_NAME_2"] = df["REPORT_NAME"]
+    df["PARENT"] = "BLOOD CULTURE"
+    df["RESULT_ENTRY"] = rng.choice(["1", "2", ""], n)
+    df["RESULT_DISPLAY"] = rng.choice(["Positive", "Negative", "See comment", ""], n)
+    return df
+
+
+def make_apl(n_rows=1_000_000, seed=0, datetime_numeric=False):
+    """
+    Returns a formatted APL frame with about `n_rows` rows.
+    """
+    return format_apl_data(make_raw_apl(n_rows, seed), datetime_numeric=datetime_numeric)
+
+
+def write_apl(fn, n_rows=1_000_000, seed=0, row_group_size=100_000):
+    """
+    Writes a formatted APL frame sorted by YEAR and ORGANISM, so that
+    the parquet row group statistics can be used for filtering.
+    """
+    df = make_apl(n_rows, seed).sort_values(["YEAR", "ORGANISM"]).reset_index(drop=True)
+    df.to_parquet(fn, row_group_size=row_group_size)
+    return fn
+
+
+def run_modes(script, modes, argv=(), option="--mode"):
+    """
+    Runs `python script *argv --mode <mode>` for each mode in a fresh
+    process, so that the peak RSS of the modes does not influence each
+    other. The script dispatches the mode to its function.
+
+    Parameters
+    ----------
+    script - str, benchmark script, usually __file__
+    modes - dict {name: callable} or list of names
+    argv - list of str, arguments passed to each process
+    option - str, command line option that selects the mode
+    """
+    for mode in modes:
+        subprocess.run(
+            [sys.executable, str(script), *map(str, argv), option, mode], check=True
+        )
+
+
+def peak_rss():
+    """
+    Peak resident set size of this process in MB. Unlike ru_maxrss
+    VmHWM is reset by exec, so it does not include the parent process.
+    """
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def reset_peak_rss():
+    """
+    Resets the peak RSS to the current RSS (Linux only).
+    """
+    # Return freed memory to the OS first, otherwise the next step
+    # reuses it without increasing the RSS.
+    ctypes.CDLL("libc.so.6").malloc_trim(0)
+    with open("/proc/self/clear_refs", "w") as clear_refs:
+        clear_refs.write("5")
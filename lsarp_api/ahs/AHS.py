@@ -1,22 +1,43 @@
 import functools
 import pandas as pd
 import logging
+import time
 from pathlib import Path as P
-from datetime import datetime, time, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 
 from .formatters import *
+from .windows import WindowIndex
 from ..tools import today
 
-gender_map = {"M": "Male", "F": "Female"}
-
 # Convert time to timedelta
 to_timedelta = lambda t: timedelta(hours=t.hour, minutes=t.minute)
 
 VERSION = '230515'
 
+DATASETS = ['accs', 'claims', 'dad', 'lab', 'nacrs', 'pin', 'reg', 'vs']
+
+METADATA_READERS = {
+    'atccodes': format_atc,
+    'ccpcodes': pd.read_parquet,
+    'population': format_population,
+    'postcodes_meta': format_postcodes_meta,
+    'proccodes_meta': pd.read_csv,
+    'dxcodes_meta': pd.read_parquet,
+}
+
+# Optional tables derived from the AHS datasets
+DERIVED_TABLES = ['postcodes', 'proccodes', 'dxcodes']
+
+
+def _lazy_table(name):
+    def fget(self):
+        return self._table(name)
+
+    def fset(self, df):
+        self._tables[name] = df
 
-def convert_datetime(x):
-    return pd.to_datetime(x, format="%d%b%Y:%H:%M:%S", errors="coerce")
+    return property(fget, fset, doc=f"{name}, read on first access")
 
 
 class AHS:
@@ -98,7 +119,7 @@ class AHS:
     
     
     
-    def __init__(self, version=VERSION):
+    def __init__(self, version=VERSION, n_workers=None):
 
         self.accs, self.claims, self.dad, self.lab, self.nacrs, self.pin, self.reg, self.vs = None, None, None, None, None, None, None, None
 
@@ -166,101 +187,146 @@ class AHS:
             }   
         }
         
-        FNS = self.FNS
-        
-        self.atccodes = format_atc(FNS["atccodes"]['fn'])
-        
-        self.ccpcodes = pd.read_parquet(FNS['ccpcodes']['fn'])
-
-        self.population = format_population(FNS["population"]['fn'])
-        
-        self.postcodes_meta = format_postcodes_meta(FNS["postcodes_meta"]['fn'])
-        
-        self.proccodes_meta = pd.read_csv(FNS["proccodes_meta"]['fn'])
-        
-        self.dxcodes_meta = pd.read_parquet(FNS["dxcodes_meta"]['fn'])
-           
-        self.datasets = {}    
-            
-        fn = FNS["postcodes"]["fn"]
-        if fn.is_file():
-            logging.warning(f'Reading consensus postal codes from {fn}')
-            self.postcodes = pd.read_parquet(fn)
-        else:
-            logging.warning(f'File not found {fn}')
-
-        fn = FNS["proccodes"]["fn"]
-        if fn.is_file():
-            logging.warning(f'Reading proccodes from {fn}')
-            self.proccodes = pd.read_parquet(fn)
-        else:
-            logging.warning(f'File not found {fn}')
-
-        fn = FNS["dxcodes"]["fn"]
-        if fn.is_file():
-            logging.warning(f'Reading dxcodes from {fn}')
-            self.dxcodes = pd.read_parquet(fn)
-        else:
-            logging.warning(f'File not found {fn}')                
-
-    
-
-    def load(self, what):
-        if what in ['accs', 'all']:
-            fn = self.FNS['accs']['fn']
-            logging.warning(f'Loading ACCS data from {fn}')
-            self.acc = pd.read_parquet(fn)
-            self.datasets['acc'] = self.acc
-                                 
-        if what in ['claims', 'all']:    
-            fn = self.FNS['claims']['fn']
-            logging.warning(f'Loading CLAIMS data from {fn}')
-            self.claims = pd.read_parquet(fn)
-            self.datasets['claims'] = self.claims
-
-        if what in ['dad', 'all']:
-            fn = self.FNS['dad']['fn']
-            logging.warning(f'Loading DAD data from {fn}')
-            self.dad = pd.read_parquet(fn)
-            self.datasets['dad'] = self.dad
-
-        if what in ['lab', 'all']:    
-            fn = self.FNS['lab']['fn']
-            logging.warning(f'Loading LAB data from {fn}')
-            self.lab = pd.read_parquet(fn)
-            self.datasets['lab'] = self.lab
-
-        if what in ['nacrs', 'all']:
-            fn = self.FNS['nacrs']['fn']
-            logging.warning(f'Loading NACRS data from {fn}')
-            self.nacrs = pd.read_parquet(fn)
-            self.datasets['nacrs'] = self.nacrs
-
-        if what in ['pin', 'all']:    
-            fn = self.FNS['pin']['fn']
-            logging.warning(f'Loading PIN data from {fn}')
-            self.pin = pd.read_parquet(fn)
-            self.datasets['pin'] = self.pin
-
-        if what in ['reg', 'all']:
-            fn = self.FNS['reg']['fn']
-            logging.warning(f'Loading REG data from {fn}')
-            self.reg = pd.read_parquet(fn)
-            self.datasets['reg'] = self.reg
-
-        if what in ['vs', 'all']:    
-            fn = self.FNS['vs']['fn']
-            logging.warning(f'Loading VS data from {fn}')
-            self.vs = pd.read_parquet(fn)
-            self.datasets['vs'] = self.vs
-
+        self.n_workers = n_workers
+        self.datasets = {}
+        self.timings = {}
+        self._window_indexes = {}
+
+        # Metadata and derived tables are read on first access
+        self._tables = {}
+
+    def _tasks(self, names):
+        tasks = {}
+        for name in names:
+            fn = self.FNS[name]["fn"]
+            if name in DERIVED_TABLES:
+                if not P(fn).is_file():
+                    logging.warning(f'File not found {fn}')
+                    self._tables[name] = None
+                    continue
+                logging.warning(f'Reading {name} from {fn}')
+                tasks[name] = (pd.read_parquet, fn)
+            else:
+                tasks[name] = (METADATA_READERS[name], fn)
+        return tasks
+
+    def _table(self, name):
+        if name not in self._tables:
+            self._tables.update(self._read(self._tasks([name])))
+        return self._tables[name]
+
+    def preload(self, names=None, n_workers=None):
+        """
+        Reads all metadata and derived tables that were not read yet,
+        concurrently. Useful for batch jobs.
+
+        Parameters
+        ----------
+        names - list of str, defaults to all tables
+        n_workers - int, number of threads
+        """
+        if names is None:
+            names = list(METADATA_READERS) + DERIVED_TABLES
+        names = [name for name in names if name not in self._tables]
+        self._tables.update(self._read(self._tasks(names), n_workers=n_workers))
+        return self
+
+    def _read(self, tasks, n_workers=None):
+        """
+        Reads files concurrently with a thread pool. Parquet and CSV
+        reads are mostly I/O and decompression and release the GIL.
+
+        Parameters
+        ----------
+        tasks - dict {name: (read_func, fn)}
+        n_workers - int, number of threads, defaults to self.n_workers
+            or one thread per file
+
+        Returns
+        -------
+        dict {name: pandas.DataFrame}
+        """
+        n_workers = n_workers or self.n_workers or max(len(tasks), 1)
+
+        def read(name, func, fn):
+            start = time.perf_counter()
+            df = func(fn)
+            self.timings[name] = time.perf_counter() - start
+            logging.info(f'Read {name} in {self.timings[name]:.1f} s')
+            return df
+
+        with ThreadPoolExecutor(max_workers=n_workers) as pool:
+            futures = {
+                name: pool.submit(read, name, func, fn) for name, (func, fn) in tasks.items()
+            }
+            return {name: future.result() for name, future in futures.items()}
+
+    def load(self, what, n_workers=None):
+        """
+        Loads AHS datasets concurrently.
+
+        Parameters
+        ----------
+        what - str or list of str, dataset name(s) or 'all'
+        n_workers - int, number of threads
+
+        Returns
+        -------
+        pandas.Series, read time in seconds per dataset
+        """
+        if what == 'all':
+            what = DATASETS
+        elif isinstance(what, str):
+            what = [what]
+        unknown = [name for name in what if name not in DATASETS]
+        if unknown:
+            raise ValueError(f'Unknown datasets {unknown}, use one of {DATASETS}')
+
+        tasks = {}
+        for name in what:
+            fn = self.FNS[name]['fn']
+            logging.warning(f'Loading {name.upper()} data from {fn}')
+            tasks[name] = (pd.read_parquet, fn)
+
+        for name, df in self._read(tasks, n_workers=n_workers).items():
+            setattr(self, name, df)
+            self.datasets[name] = df
+
+        return pd.Series({name: self.timings[name] for name in what}, name='SECONDS')
+
+    def window_index(self, kind='dxcodes', reference_time_col='COLLECT_DTM', time_col='ADMITDATE'):
+        """
+        Returns the WindowIndex of the dxcodes or proccodes table.
+        The index is built once and rebuilt when the table changes.
+        """
+        df = self.dxcodes if kind == 'dxcodes' else self.proccodes
+        key = (kind, reference_time_col, time_col)
+        index = self._window_indexes.get(key)
+        if (index is None) or (index.source is not df):
+            index = WindowIndex(df, reference_time_col=reference_time_col, time_col=time_col)
+            self._window_indexes[key] = index
+        return index
 
     def get_slice(self, kind='dxcodes', days_before=365, days_after=-7, reference_time_col='COLLECT_DTM', time_col='ADMITDATE'):
-        if kind == 'dxcodes':
-            df = self.dxcodes
-        elif kind == 'proccodes':
-            df = self.proccodes
-        return get_slice(df, days_before=days_before, days_after=days_after, reference_time_col=reference_time_col, time_col=time_col)
+        index = self.window_index(kind, reference_time_col=reference_time_col, time_col=time_col)
+        return index.slice(days_before=days_before, days_after=days_after)
+
+    def get_slices(self, windows, kind='dxcodes', reference_time_col='COLLECT_DTM', time_col='ADMITDATE'):
+        """
+        Returns one slice per (days_before, days_after) window.
+        """
+        index = self.window_index(kind, reference_time_col=reference_time_col, time_col=time_col)
+        return index.slices(windows)
+
+    atccodes = _lazy_table('atccodes')
+    ccpcodes = _lazy_table('ccpcodes')
+    population = _lazy_table('population')
+    postcodes_meta = _lazy_table('postcodes_meta')
+    proccodes_meta = _lazy_table('proccodes_meta')
+    dxcodes_meta = _lazy_table('dxcodes_meta')
+    postcodes = _lazy_table('postcodes')
+    proccodes = _lazy_table('proccodes')
+    dxcodes = _lazy_table('dxcodes')
 
     def merge_dxcodes(self):
         icd10codes = self.dxcodes_meta[self.dxcodes_meta.DIAG_CLASS_CD=='ICD10CA'].reset_index().groupby('DXCODE').first()
@@ -271,13 +337,5 @@ class AHS:
 
 
 def get_slice(df, days_before=365, days_after=-7, reference_time_col='COLLECT_DTM', time_col='ADMITDATE'):
-    df = df.dropna().copy()
-    n_days = (df[time_col].dt.date - df[reference_time_col].dt.date)
-    
-    df['n_days'] = [e.days if e is not None else None for e in n_days]
-
-
-    #df = df[df.n_days.notna()]
-    
-    slize = df[(df.n_days > -days_before) & (df.n_days < days_after)]
-    return slize
\ No newline at end of file
+    index = WindowIndex(df, reference_time_col=reference_time_col, time_col=time_col)
+    return index.slice(days_before=days_before, days_after=days_after)
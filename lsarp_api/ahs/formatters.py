@@ -1,10 +1,22 @@
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import logging
 
+from pathlib import Path as P
 
+from ..tools import AGE_GROUP_EDGES, age_groups
 
-def format_accs(fn):
-    df = pd.read_csv(
-        fn,
+gender_map = {"M": "Male", "F": "Female"}
+
+
+def convert_datetime(x):
+    return pd.to_datetime(x, format="%d%b%Y:%H:%M:%S", errors="coerce")
+
+
+READ_CSV_KWARGS = {
+    "accs": dict(
         low_memory=False,
         dtype={
             "MISPRIME": str,
@@ -43,49 +55,8 @@ def format_accs(fn):
             'PROCCODE10': str,
         },
         na_values=[""],
-    ).rename(columns={
-        'VISDATE': 'VISIT_DATE', 
-        'DISDATE': 'DISP_DATE', 
-        'DISTIME': 'DISP_TIME', 
-        "SEX": "GENDER", 
-        "ISOLATE_NBR": "BI_NBR",
-        "Post_code": "POSTCODE",
-        "DISP": "DISPOSITION",
-        "AHS_ZONE": 'INST_ZONE',
-        "LOS_MINUTES": "VISIT_LOS_MINUTES",
-        "MISPRIME": "MIS_CODE",
-        }
-    )
-    df['MIS_CODE'] = df['MIS_CODE'].str.pad(9, side='right', fillchar='0')
-    df["VISIT_DATE"] = pd.to_datetime(df["VISIT_DATE"], format="%Y%m%d", errors="coerce")
-    df["DISP_DATE"] = pd.to_datetime(df["DISP_DATE"], format="%Y%m%d", errors="coerce")
-    df["DISP_TIME"] = pd.to_datetime(
-        df["DISP_TIME"], format="%H%M", errors="coerce"
-    ).dt.time
-
-    drop_columns = df.filter(
-        regex="DXCODE|PROCCODE|PROVIDER_SVC|PROVTYPE|DOCSVC"
-    ).columns.to_list()
-    df["DXCODES"] = df.filter(regex="DXCODE").apply(
-        lambda x: [e for e in x if e is not None], axis=1
-    )
-    df["PROCCODES"] = df.filter(regex="PROCCODE").apply(
-        lambda x: [e for e in x if e is not None], axis=1
-    )
-    df["PROVIDER_SVCS"] = df.filter(regex="DOCSVC").apply(
-        lambda x: [e for e in x if e is not None], axis=1
-    )
-    df["PROVIDER_TYPES"] = df.filter(regex="PROVTYPE").apply(
-        lambda x: [e for e in x if e is not None], axis=1
-    )
-    df["GENDER"] = df["GENDER"].replace(gender_map)
-    df = df.drop(drop_columns, axis=1)
-    return df.set_index('BI_NBR')
-
-
-def format_nacrs(fn):
-    df = pd.read_csv(
-        fn,
+    ),
+    "nacrs": dict(
         low_memory=False,
         na_values=[""],
         dtype={
@@ -131,7 +102,214 @@ def format_nacrs(fn):
             "PROCCODE9": str,
             "PROCCODE1": str,
         },
+    ),
+    "claims": dict(
+        low_memory=False,
+        dtype={
+            "DISDATE": str,
+            "DISTIME": str,
+            "HLTH_DX_ICD9X_CODE_1": str,
+            "HLTH_DX_ICD9X_CODE_2": str,
+            "HLTH_DX_ICD9X_CODE_3": str,
+            "HLTH_SRVC_CCPX_CODE": str,
+        },
+        na_values=[""],
+    ),
+    "dad": dict(
+        low_memory=False,
+        dtype={"INST": str, "INSTFROM": str, "INSTTO": str},
+        na_values=[""],
+    ),
+    "lab": dict(low_memory=False, dtype={"TEST_CD": str}, na_values=[""]),
+    "pin": dict(low_memory=False, dtype=str, na_values=[""]),
+    "reg": dict(low_memory=False, dtype=str, na_values=[""]),
+    "vs": dict(low_memory=False, dtype=str, na_values=[""]),
+}
+
+
+def read_csv(fn, kind, **kwargs):
+    return pd.read_csv(fn, **{**READ_CSV_KWARGS[kind], **kwargs})
+
+
+def _codes(df, regex):
+    """
+    Non-missing values of the columns matching regex in row-major order,
+    with their row numbers and 0-based column positions.
+
+    String columns are stacked into one Arrow array and the missing
+    values are taken from its validity bitmap, so no Python object is
+    touched per code. Other columns (e.g. codes parsed as numbers) fall
+    back to the object path.
+
+    Returns
+    -------
+    (pyarrow.Array, numpy.ndarray, numpy.ndarray), codes, rows and positions
+    """
+    # Same columns as df.filter(regex=regex), without copying them
+    columns = df.columns[df.columns.astype(str).str.contains(regex)]
+    n_rows, n_cols = len(df), len(columns)
+    arrays = []
+    for col in columns:
+        array = pa.array(df[col], from_pandas=True)
+        if array.null_count == len(array):
+            array = pa.nulls(len(array), pa.string())
+        arrays.append(array)
+    if not all(pa.types.is_string(array.type) for array in arrays):
+        return _object_codes(df[columns])
+    if n_cols == 0:
+        stacked = pa.array([], type=pa.string())
+        valid = np.zeros((n_rows, 0), dtype=bool)
+    else:
+        stacked = pa.concat_arrays(arrays)
+        valid = stacked.is_valid().to_numpy(zero_copy_only=False)
+        valid = valid.reshape(n_cols, n_rows).T
+    rows, positions = np.nonzero(valid)
+    codes = stacked.take(pa.array(positions * n_rows + rows))
+    return codes, rows, positions
+
+
+def _object_codes(wide):
+    values = wide.to_numpy(dtype=object)
+    rows, positions = np.nonzero(pd.notna(values))
+    codes = values[rows, positions]
+    if len(codes) == 0:
+        return pa.array([], type=pa.string()), rows, positions
+    try:
+        codes = pa.array(codes, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        codes = pa.array(codes.astype(str))
+    return codes, rows, positions
+
+
+def code_lists(df, regex):
+    """
+    Collects the non-missing values of the columns matching regex
+    (e.g. DXCODE1, DXCODE2, ...) into one list per row.
+
+    The lists are built as an Arrow list array and converted to
+    numpy arrays in one call, the same representation as list
+    columns read from parquet.
+
+    About 5-7x faster than the row-wise apply, not 10x. Most of the
+    remaining time converts the object columns of read_csv to Arrow
+    and the lists back to numpy arrays. Reading the extracts with
+    Arrow string columns and keeping Arrow list columns (pandas 2.0
+    cannot read those back from parquet) would remove both.
+
+    Returns
+    -------
+    pandas.Series of numpy arrays, aligned to df.index
+    """
+    codes, rows, _ = _codes(df, regex)
+    offsets = np.zeros(len(df) + 1, dtype="int32")
+    np.cumsum(np.bincount(rows, minlength=len(df)), out=offsets[1:])
+    lists = pa.ListArray.from_arrays(pa.array(offsets), codes)
+    return pd.Series(lists.to_pandas().to_numpy(), index=df.index)
+
+
+def codes_long(df, regex, name, keep=None):
+    """
+    Long table of the non-missing values of the columns matching
+    regex, one row per code, like the *_AHS-derived__dxcodes_long
+    tables.
+
+    Parameters
+    ----------
+    df - pandas.DataFrame, raw or formatted AHS dataset
+    regex - str, e.g. 'DXCODE'
+    name - str, name of the code column, e.g. 'DXCODES'
+    keep - list of str, additional columns to repeat for each code
+
+    Returns
+    -------
+    pandas.DataFrame with the index of df and the columns
+        POSITION (1-based position among the matching columns), name
+        and keep.
+    """
+    codes, rows, positions = _codes(df, regex)
+    long = pd.DataFrame(
+        {
+            "POSITION": (positions + 1).astype("int16"),
+            name: codes.to_numpy(zero_copy_only=False).astype(object),
+        },
+        index=df.index[rows],
     )
+    for col in keep or []:
+        long[col] = df[col].to_numpy()[rows]
+    return long
+
+
+# Long code tables per dataset: {name: (regex, date column)}
+LONG_CODES = {
+    "accs": {"dxcodes": ("DXCODE", "VISIT_DATE"), "proccodes": ("PROCCODE", "VISIT_DATE")},
+    "nacrs": {"dxcodes": ("DXCODE", "VISIT_DATE"), "proccodes": ("PROCCODE", "VISIT_DATE")},
+    "dad": {"dxcodes": ("DXCODE", "ADMITDATE"), "proccodes": ("PROCCODE", "ADMITDATE")},
+}
+
+
+def long_codes(df, kind):
+    """
+    Long code tables of a dataset that is being formatted, before the
+    wide code columns are dropped. One row per code, indexed by BI_NBR
+    like the formatted dataset.
+
+    Returns
+    -------
+    dict {name: pandas.DataFrame}, e.g. {'dxcodes': ..., 'proccodes': ...}
+        with the columns POSITION, DXCODES or PROCCODES and the date column
+    """
+    return {
+        name: codes_long(df, regex, name.upper(), keep=["BI_NBR", date_col]).set_index(
+            "BI_NBR"
+        )
+        for name, (regex, date_col) in LONG_CODES[kind].items()
+    }
+
+
+def format_accs(fn):
+    return transform_accs(read_csv(fn, "accs"))
+
+
+def transform_accs(df, long_tables=None):
+    df = df.rename(columns={
+        'VISDATE': 'VISIT_DATE', 
+        'DISDATE': 'DISP_DATE', 
+        'DISTIME': 'DISP_TIME', 
+        "SEX": "GENDER", 
+        "ISOLATE_NBR": "BI_NBR",
+        "Post_code": "POSTCODE",
+        "DISP": "DISPOSITION",
+        "AHS_ZONE": 'INST_ZONE',
+        "LOS_MINUTES": "VISIT_LOS_MINUTES",
+        "MISPRIME": "MIS_CODE",
+        }
+    )
+    df['MIS_CODE'] = df['MIS_CODE'].str.pad(9, side='right', fillchar='0')
+    df["VISIT_DATE"] = pd.to_datetime(df["VISIT_DATE"], format="%Y%m%d", errors="coerce")
+    df["DISP_DATE"] = pd.to_datetime(df["DISP_DATE"], format="%Y%m%d", errors="coerce")
+    df["DISP_TIME"] = pd.to_datetime(
+        df["DISP_TIME"], format="%H%M", errors="coerce"
+    ).dt.time
+
+    drop_columns = df.filter(
+        regex="DXCODE|PROCCODE|PROVIDER_SVC|PROVTYPE|DOCSVC"
+    ).columns.to_list()
+    if long_tables is not None:
+        long_tables.update(long_codes(df, "accs"))
+    df["DXCODES"] = code_lists(df, "DXCODE")
+    df["PROCCODES"] = code_lists(df, "PROCCODE")
+    df["PROVIDER_SVCS"] = code_lists(df, "DOCSVC")
+    df["PROVIDER_TYPES"] = code_lists(df, "PROVTYPE")
+    df["GENDER"] = df["GENDER"].replace(gender_map)
+    df = df.drop(drop_columns, axis=1)
+    return df.set_index('BI_NBR')
+
+
+def format_nacrs(fn):
+    return transform_nacrs(read_csv(fn, "nacrs"))
+
+
+def transform_nacrs(df, long_tables=None):
     df["VISIT_DATE"] = pd.to_datetime(
         df["VISIT_DATE"], format="%Y%m%d", errors="coerce"
     )
@@ -153,39 +331,22 @@ def format_nacrs(fn):
     drop_columns = df.filter(
         regex="DXCODE|PROCCODE|PROVIDER_SVC|PROVIDER_TYPE"
     ).columns.to_list()
-    df["DXCODES"] = df.filter(regex="DXCODE").apply(
-        lambda x: [e for e in x if e is not None], axis=1
-    )
-    df["PROCCODES"] = df.filter(regex="PROCCODE").apply(
-        lambda x: [e for e in x if e is not None], axis=1
-    )
-    df["PROVIDER_SVCS"] = df.filter(regex="PROVIDER_SVC").apply(
-        lambda x: [e for e in x if e is not None], axis=1
-    )
-    df["PROVIDER_TYPES"] = df.filter(regex="PROVIDER_TYPE").apply(
-        lambda x: [e for e in x if e is not None], axis=1
-    )
+    if long_tables is not None:
+        long_tables.update(long_codes(df, "nacrs"))
+    df["DXCODES"] = code_lists(df, "DXCODE")
+    df["PROCCODES"] = code_lists(df, "PROCCODE")
+    df["PROVIDER_SVCS"] = code_lists(df, "PROVIDER_SVC")
+    df["PROVIDER_TYPES"] = code_lists(df, "PROVIDER_TYPE")
     df = df.drop(drop_columns, axis=1)
     return df.set_index("BI_NBR")
 
 
 def format_claims(fn):
-    df = pd.read_csv(
-        fn,
-        low_memory=False,
-        dtype={
-            "DISDATE": str,
-            "DISTIME": str,
-            "HLTH_DX_ICD9X_CODE_1": str,
-            "HLTH_DX_ICD9X_CODE_2": str,
-            "HLTH_DX_ICD9X_CODE_3": str,
-            "HLTH_SRVC_CCPX_CODE": str,
-        },
-        na_values=[""],
-    )
-    df["HLTH_DX_ICD9X_CODES"] = df.filter(regex="ICD9X").apply(
-        lambda x: [e for e in x if e is not None], axis=1
-    )
+    return transform_claims(read_csv(fn, "claims"))
+
+
+def transform_claims(df):
+    df["HLTH_DX_ICD9X_CODES"] = code_lists(df, "ICD9X")
     df = df.drop(
         ["HLTH_DX_ICD9X_CODE_1", "HLTH_DX_ICD9X_CODE_2", "HLTH_DX_ICD9X_CODE_3"], axis=1
     )
@@ -197,12 +358,10 @@ def format_claims(fn):
 
 
 def format_dad(fn):
-    df = pd.read_csv(
-        fn,
-        low_memory=False,
-        dtype={"INST": str, "INSTFROM": str, "INSTTO": str},
-        na_values=[""],
-    )
+    return transform_dad(read_csv(fn, "dad"))
+
+
+def transform_dad(df, long_tables=None):
     df["ADMITDATE"] = pd.to_datetime(df["ADMITDATE"], format="%Y%m%d", errors="coerce")
     df["DISDATE"] = pd.to_datetime(df["DISDATE"], format="%Y%m%d", errors="coerce")
     df["ADMITTIME"] = pd.to_datetime(
@@ -214,30 +373,30 @@ def format_dad(fn):
     df = df.rename(columns={"SEX": "GENDER", "ISOLATE_NBR": "BI_NBR"})
     df["GENDER"] = df["GENDER"].replace(gender_map)
     drop_columns = df.filter(regex="DXCODE|DXTYPE|PROCCODE").columns.to_list()
-    df["DXCODES"] = df.filter(regex="DXCODE").apply(
-        lambda x: [e for e in x if e is not None], axis=1
-    )
-    df["PROCCODES"] = df.filter(regex="PROCCODE").apply(
-        lambda x: [e for e in x if e is not None], axis=1
-    )
+    if long_tables is not None:
+        long_tables.update(long_codes(df, "dad"))
+    df["DXCODES"] = code_lists(df, "DXCODE")
+    df["PROCCODES"] = code_lists(df, "PROCCODE")
     df = df.drop(drop_columns, axis=1)
     df = df.rename(columns={"Post_code": "POSTCODE"})
     return df.set_index("BI_NBR")
 
 
 def format_lab(fn):
-    df = pd.read_csv(
-        fn, low_memory=False, dtype={"TEST_CD": str}, na_values=[""]
-    )
+    return transform_lab(read_csv(fn, "lab"))
+
+
+def transform_lab(df):
     df = df.rename(columns={"ISOLATE_NBR": "BI_NBR"})
     df["TEST_VRFY_DTTM"] = convert_datetime(df["TEST_VRFY_DTTM"])
     return df.set_index("BI_NBR")
 
 
 def format_pin(fn):
-    df = pd.read_csv(
-        fn, low_memory=False, dtype=str, na_values=[""]
-    )
+    return transform_pin(read_csv(fn, "pin"))
+
+
+def transform_pin(df):
     df["DSPN_DATE"] = convert_datetime(df["DSPN_DATE"])
     for col in ["DSPN_AMT_QTY", "DSPN_DAY_SUPPLY_QTY"]:
         df[col] = df[col].astype(float)
@@ -247,9 +406,10 @@ def format_pin(fn):
 
 
 def format_reg(fn):
-    df = pd.read_csv(
-        fn, low_memory=False, dtype=str, na_values=[""]
-    )
+    return transform_reg(read_csv(fn, "reg"))
+
+
+def transform_reg(df):
     df["PERS_REAP_END_DATE"] = convert_datetime(df["PERS_REAP_END_DATE"])
     for col in [
         "ACTIVE_COVERAGE",
@@ -269,9 +429,10 @@ def format_reg(fn):
 
 
 def format_vs(fn):
-    df = pd.read_csv(
-        fn, low_memory=False, dtype=str, na_values=[""]
-    )
+    return transform_vs(read_csv(fn, "vs"))
+
+
+def transform_vs(df):
     df["DETHDATE"] = convert_datetime(df["DETHDATE"])
     df = df.rename(
         columns={"SEX": "GENDER", "DETHDATE": "DEATH_DATE", "ISOLATE_NBR": "BI_NBR"}
@@ -282,6 +443,153 @@ def format_vs(fn):
     return df.set_index("BI_NBR")
 
 
+TRANSFORMS = {
+    "accs": transform_accs,
+    "nacrs": transform_nacrs,
+    "claims": transform_claims,
+    "dad": transform_dad,
+    "lab": transform_lab,
+    "pin": transform_pin,
+    "reg": transform_reg,
+    "vs": transform_vs,
+}
+
+
+def convert_to_parquet(fn, fn_out, kind, chunksize=500_000, long_tables=False):
+    """
+    Formats a raw AHS extract and writes it to parquet in chunks.
+    Peak memory is bounded by the chunk size instead of the file size.
+    The output is read by AHS.load like the output of
+    format_{kind}(fn).to_parquet(fn_out).
+
+    The file is read twice. The first pass infers the dtype of each
+    column over the whole file, like read_csv would, so that all
+    chunks are read with the same dtypes and written with one schema.
+
+    Rows are only sorted within each chunk, e.g. for CLAIMS.
+
+    Parameters
+    ----------
+    fn - str, raw AHS csv file
+    fn_out - str, output parquet file
+    kind - str, one of 'accs', 'nacrs', 'claims', 'dad', 'lab', 'pin', 'reg', 'vs'
+    chunksize - int, number of csv rows per chunk and parquet row group
+    long_tables - bool, also write the long code tables of ACCS, NACRS
+        and DAD (see long_codes) to {fn_out stem}__dxcodes_long.parquet
+        and {fn_out stem}__proccodes_long.parquet
+
+    Returns
+    -------
+    int, number of rows written
+    """
+    transform = TRANSFORMS[kind]
+    if long_tables and kind not in LONG_CODES:
+        raise ValueError(f"No long code tables for {kind}, use one of {list(LONG_CODES)}")
+    fns = {None: P(fn_out)}
+    if long_tables:
+        for name in LONG_CODES[kind]:
+            fns[name] = P(fn_out).with_name(f"{P(fn_out).stem}__{name}_long.parquet")
+    dtypes, sample = csv_dtypes(fn, kind, chunksize=chunksize)
+    schemas = format_chunk(transform, sample, long_tables)
+    schemas = {name: arrow_schema(df) for name, df in schemas.items()}
+    writers, n_rows = {}, 0
+    try:
+        for chunk in read_csv(fn, kind, chunksize=chunksize, dtype=dtypes):
+            tables = format_chunk(transform, chunk, long_tables)
+            for name, df in tables.items():
+                if name not in writers:
+                    writers[name] = pq.ParquetWriter(fns[name], schemas[name])
+                writers[name].write_table(to_arrow(df, schemas[name]))
+            n_rows += len(tables[None])
+            logging.info(f"Converted {n_rows} rows of {fn}")
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return n_rows
+
+
+def format_chunk(transform, chunk, long_tables=False):
+    """
+    Returns dict {None: formatted chunk, name: long code table, ...}.
+    """
+    tables = {} if long_tables else None
+    df = transform(chunk) if tables is None else transform(chunk, long_tables=tables)
+    return {None: df, **(tables or {})}
+
+
+def csv_dtypes(fn, kind, chunksize=500_000):
+    """
+    Infers the dtype of each column of a raw AHS extract over the whole
+    file, like read_csv(fn, kind) without chunks. Columns with a fixed
+    dtype in READ_CSV_KWARGS keep it, the others are int64 if all
+    values are integers, float64 if all values are numbers or missing,
+    otherwise str.
+
+    Returns
+    -------
+    (dict {column: dtype}, pandas.DataFrame)
+        the dtypes and a one-row sample with the first non-missing
+        value of each column, read with these dtypes
+    """
+    fixed = READ_CSV_KWARGS[kind].get("dtype", {})
+    numeric, integer, examples = {}, {}, {}
+    for chunk in read_csv(fn, kind, chunksize=chunksize, dtype=str):
+        for col, values in chunk.items():
+            notna = values.notna()
+            if col not in examples or pd.isna(examples[col]):
+                examples[col] = values[notna].iloc[0] if notna.any() else None
+            if isinstance(fixed, dict) and col not in fixed:
+                numbers = pd.to_numeric(values[notna], errors="coerce")
+                numeric[col] = numeric.get(col, True) and numbers.notna().all()
+                integer[col] = (
+                    integer.get(col, True)
+                    and notna.all()
+                    and not values[notna].str.contains(r"[.eE]").any()
+                )
+    if not isinstance(fixed, dict):
+        dtypes = {col: fixed for col in examples}
+    else:
+        dtypes = {}
+        for col in examples:
+            if col in fixed:
+                dtypes[col] = fixed[col]
+            elif numeric[col] and integer[col]:
+                dtypes[col] = "int64"
+            elif numeric[col]:
+                dtypes[col] = "float64"
+            else:
+                dtypes[col] = str
+    sample = pd.DataFrame({col: [value] for col, value in examples.items()})
+    # Missing values stay None in str columns
+    sample = sample.astype({col: dtype for col, dtype in dtypes.items() if dtype is not str})
+    return dtypes, sample
+
+
+def arrow_schema(df):
+    """
+    Arrow schema of a formatted dataset. Columns without a type
+    (always empty) are stored as strings, also inside lists.
+    """
+    schema = pa.Schema.from_pandas(df, preserve_index=True)
+    for i, field in enumerate(schema):
+        if pa.types.is_null(field.type):
+            schema = schema.set(i, field.with_type(pa.string()))
+        elif pa.types.is_list(field.type) and pa.types.is_null(field.type.value_type):
+            schema = schema.set(i, field.with_type(pa.list_(pa.string())))
+    return schema
+
+
+def to_arrow(df, schema):
+    """
+    Converts a chunk to the fixed schema. Columns that are empty in
+    this chunk may have been formatted with another dtype.
+    """
+    for field in schema:
+        if field.name in df.columns and df[field.name].isna().all():
+            df[field.name] = pd.Series(None, index=df.index, dtype=object)
+    table = pa.Table.from_pandas(df, schema=schema, preserve_index=True)
+    return table.replace_schema_metadata(schema.metadata)
+
 
 def format_atc(fn):
     df = pd.read_parquet(fn)
@@ -322,3 +630,32 @@ def format_population(fn):
         .sort_index(axis=1)
     )
     return dense
+
+
+def population_by_age_group(population, edges=AGE_GROUP_EDGES):
+    """
+    Sums the population table of format_population by the age groups
+    that are used for the APL data (AGE_GRP), so that both can be joined.
+
+    Parameters
+    ----------
+    population - pandas.DataFrame, output of format_population
+    edges - list of int, lower edges of the age groups
+
+    Returns
+    -------
+    pandas.DataFrame, index YEAR, columns (POPULATION, GENDER, AGE_GRP)
+    """
+    df = population.stack(["GENDER", "AGE"]).reset_index()
+    # Ages are labels like '5' or '90+'
+    ages = pd.to_numeric(df["AGE"].astype(str).str.extract(r"(\d+)")[0])
+    df["AGE_GRP"] = age_groups(ages, edges)
+    return (
+        df.groupby(["YEAR", "GENDER", "AGE_GRP"], observed=True)["POPULATION"]
+        .sum()
+        .unstack(["GENDER", "AGE_GRP"])
+        .fillna(0)
+        .astype(int)
+        .sort_index(axis=1)
+        .pipe(lambda df: pd.concat({"POPULATION": df}, axis=1))
+    )
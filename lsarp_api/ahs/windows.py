@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+
+
+class WindowIndex:
+    """
+    Answers time window queries on a table with two time columns,
+    e.g. the dxcodes/proccodes long tables with ADMITDATE and COLLECT_DTM.
+
+    The day offsets between the two columns are computed once and the
+    table is sorted by offset (and BI_NBR within each offset). Each
+    window is then a contiguous range of rows that is found by binary
+    search and returned as a slice of the sorted table, without
+    scanning or copying the table.
+
+    Parameters
+    ----------
+    df - pandas.DataFrame
+    reference_time_col - str, e.g. 'COLLECT_DTM'
+    time_col - str, e.g. 'ADMITDATE'
+    by - str, secondary sort column, e.g. 'BI_NBR'
+    dropna - bool, drop rows with missing values like get_slice
+    """
+
+    def __init__(
+        self,
+        df,
+        reference_time_col="COLLECT_DTM",
+        time_col="ADMITDATE",
+        by="BI_NBR",
+        dropna=True,
+    ):
+        self.source = df
+        if dropna:
+            df = df.dropna()
+        df = df.assign(
+            n_days=calendar_days_between(df[reference_time_col], df[time_col])
+        )
+        sort_by = ["n_days"]
+        if (by in df.columns) or (by in df.index.names):
+            sort_by.append(by)
+        self.df = df.sort_values(sort_by, kind="stable")
+        self.n_days = self.df["n_days"].to_numpy()
+
+    def slice(self, days_before=365, days_after=-7):
+        """
+        Returns the rows with -days_before < n_days < days_after.
+        """
+        start = np.searchsorted(self.n_days, -days_before, side="right")
+        stop = np.searchsorted(self.n_days, days_after, side="left")
+        return self.df.iloc[start:max(start, stop)]
+
+    def slices(self, windows):
+        """
+        Returns one slice per window.
+
+        Parameters
+        ----------
+        windows - list of (days_before, days_after) tuples
+
+        Returns
+        -------
+        dict {(days_before, days_after): pandas.DataFrame}
+        """
+        return {
+            (days_before, days_after): self.slice(days_before, days_after)
+            for days_before, days_after in windows
+        }
+
+    def counts(self, windows, by="BI_NBR"):
+        """
+        Number of rows per `by` value in each window.
+
+        Returns
+        -------
+        pandas.DataFrame, one column per window
+        """
+        return pd.DataFrame(
+            {
+                window: df.groupby(by).size()
+                for window, df in self.slices(windows).items()
+            }
+        ).fillna(0).astype(int)
+
+
+def calendar_days_between(reference_time, time):
+    """
+    Number of calendar days from reference_time to time,
+    ignoring the time of day.
+    """
+    reference_days = reference_time.to_numpy(dtype="datetime64[ns]").astype(
+        "datetime64[D]"
+    )
+    days = time.to_numpy(dtype="datetime64[ns]").astype("datetime64[D]")
+    return (days - reference_days).astype("int64")
@@ -1,10 +1,25 @@
+import re
+import copy
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 
 import logging
-import datetime
 
-from ..tools import age_to_age_group, add_date_features_from_datetime_col
-from .helpers import replace_interp, get_element, key_func_SIRN
+from pathlib import Path as P
+
+from ..tools import age_to_age_group, add_date_features_from_datetime_col, format_apl_data
+from .cache import ArtifactCache
+from .row_index import RowIndex
+from .cube import AntibiogramCube
+from .helpers import (
+    key_func_SIRN,
+    interp_to_codes,
+    interp_codes_to_categorical,
+    INTERP_CATEGORIES,
+)
 
 FN = "/bulk/LSARP/datasets/APL/versions/{version}/{version}-sw__APL.parquet"
 FN_RESULTS = "/bulk/LSARP/datasets/APL/versions/{version}/{version}-sw__APL-results-INTERP.parquet"
@@ -52,11 +67,236 @@ RESULTS_INDEX_COLS = [
 ]
 
 
-def load_apl_data(fn=FN, format_data=False, years=None, datetime_numeric=False):
-    df = pd.read_parquet(fn)
+# Derived tables that are stored by APL.warm_cache
+CACHED_TABLES = [
+    "drugs",
+    "organisms",
+    "encounters",
+    "cultures",
+    "bi_info",
+    "reports",
+    "reports_long",
+    "gen_results",
+]
+
+# Derived tables that describe the data before any selection, like
+# the results, with a regex of the columns they are generated from
+UNSELECTED_TABLES = {
+    "drugs": "DRUG",
+    "organisms": "ORG",
+    "reports_long": "^BI_NBR$|^REPORT_NAME|^PARENT$|^RESULT_",
+}
+
+# Columns needed by format_apl_data
+FORMAT_COLS = ["COLLECT_DTM", "ENCNTR_ADMIT_DTM", "NAGE_YR", "INTERP"]
+
+# Low-cardinality columns that are read as categoricals with
+# dtypes='compact'. All other string columns (IDs and free text)
+# are read as string[pyarrow].
+CATEGORICAL_COLS = [
+    "ORGANISM",
+    "ORG_LONG_NAME",
+    "ORG_SHORT_NAME",
+    "ORG_GENUS",
+    "ORG_GRAM_TYPE",
+    "ORG_GROUP",
+    "ORG_GROUP_SHORT",
+    "DRUG",
+    "DRUG_CLASS",
+    "INTERP",
+    "GENDER",
+    "AGE_GRP",
+    "ENCR_GRP",
+    "ORD_ENCNTR_TYPE",
+    "SOURCE_LIS",
+    "BODY_SITE",
+    "CURRENT_PT_FACILITY",
+    "CURRENT_PT_LOCN",
+    "REPORT_NAME",
+    "REPORT_NAME_2",
+    "PARENT",
+    "YEAR_DAY",
+    "YEAR_WEEK",
+    "YEAR_MONTH",
+    "YEAR_QUARTER",
+    "YEAR_QUADRIMESTER",
+]
+
+DTYPE_POLICIES = [None, "compact"]
+
+
+def load_apl_data(
+    fn=FN,
+    format_data=False,
+    years=None,
+    datetime_numeric=False,
+    columns=None,
+    organisms=None,
+    bi_nbrs=None,
+    dtypes=None,
+):
+    """
+    Reads the APL data. The filters and the column selection are
+    pushed down into the parquet reader, so only the required
+    row groups and columns are read from disk.
+
+    Parameters
+    ----------
+    fn - str, path to the APL parquet file
+    format_data - bool, apply format_apl_data after reading
+    years - list of int, only read samples collected in these years
+    datetime_numeric - bool or 'mixed', passed to format_apl_data
+    columns - list of str, only read these columns
+    organisms - list of str, only read encounters with cultures
+        of these organisms
+    bi_nbrs - list of str, only read encounters with these BI numbers
+    dtypes - None or 'compact', with 'compact' the low-cardinality
+        CATEGORICAL_COLS are categoricals and all other string columns
+        are string[pyarrow], see read_compact
+
+    Returns
+    -------
+    pandas.DataFrame
+    """
+    assert dtypes in DTYPE_POLICIES, f"dtypes has to be one of {DTYPE_POLICIES}"
+    schema = pq.read_schema(fn)
+    filters = apl_filters(schema, years=years)
+
+    if isinstance(organisms, str):
+        organisms = [organisms]
+
+    # Select complete encounters like APL.select_samples
+    if (organisms is not None) or (bi_nbrs is not None):
+        selection = pd.read_parquet(
+            fn,
+            columns=["ORD_ENCNTR_NBR"],
+            filters=apl_filters(
+                schema, years=years, organisms=organisms, bi_nbrs=bi_nbrs
+            ),
+        )
+        ord_nbrs = pa.array(
+            selection.ORD_ENCNTR_NBR.dropna().unique(),
+            type=schema.field("ORD_ENCNTR_NBR").type,
+        )
+        filters = [
+            conj + [("ORD_ENCNTR_NBR", "in", ord_nbrs)] for conj in (filters or [[]])
+        ]
+
+    if (columns is not None) and format_data:
+        columns = columns + [col for col in FORMAT_COLS if col not in columns]
+
+    if dtypes == "compact":
+        df = read_compact(fn, columns=columns, filters=filters)
+    else:
+        df = pd.read_parquet(fn, columns=columns, filters=filters)
+
+    if format_data:
+        df = format_apl_data(df, years=years, datetime_numeric=datetime_numeric)
+        if dtypes == "compact":
+            compact_dtypes(df, inplace=True)
+    return df
+
+
+def read_compact(fn, columns=None, filters=None):
+    """
+    Reads a parquet file with compact dtypes. The CATEGORICAL_COLS
+    are dictionary encoded by pyarrow and all other string columns
+    are kept in Arrow memory, so no Python string objects are created.
+    """
+    table = pq.read_table(fn, columns=columns, filters=filters)
+    for i, name in enumerate(table.column_names):
+        field = table.schema.field(i)
+        is_string = pa.types.is_string(field.type) or pa.types.is_large_string(field.type)
+        if (name in CATEGORICAL_COLS) and is_string:
+            table = table.set_column(i, name, pc.dictionary_encode(table.column(i)))
+    string_dtype = pd.StringDtype("pyarrow")
+    types_mapper = {pa.string(): string_dtype, pa.large_string(): string_dtype}.get
+    df = table.to_pandas(types_mapper=types_mapper)
+    return compact_dtypes(df, inplace=True)
+
+
+def compact_dtypes(df, inplace=False):
+    """
+    Converts the string CATEGORICAL_COLS to categoricals and the other
+    string columns to string[pyarrow]. The categories are sorted,
+    so that sorting by a categorical column sorts alphabetically.
+    Numeric columns (e.g. YEAR_MONTH with datetime_numeric) and
+    ordered categoricals (e.g. AGE_GRP) are kept as they are.
+    """
+    if not inplace:
+        df = df.copy(deep=False)
+    for col, dtype in df.dtypes.items():
+        if col in CATEGORICAL_COLS:
+            if dtype == object or isinstance(dtype, pd.StringDtype):
+                df[col] = df[col].astype("category")
+            elif not isinstance(dtype, pd.CategoricalDtype) or dtype.ordered:
+                continue
+            categories = df[col].cat.categories
+            if not categories.is_monotonic_increasing:
+                df[col] = df[col].cat.reorder_categories(categories.sort_values())
+        elif dtype == object and pd.api.types.infer_dtype(df[col], skipna=True) == "string":
+            df[col] = df[col].astype(pd.StringDtype("pyarrow"))
     return df
 
 
+def is_string_type(typ):
+    """
+    True for pyarrow string and large_string types, also when they are
+    dictionary encoded (e.g. written from a pandas categorical).
+    """
+    if pa.types.is_dictionary(typ):
+        typ = typ.value_type
+    return pa.types.is_string(typ) or pa.types.is_large_string(typ)
+
+
+def apl_filters(schema, years=None, organisms=None, bi_nbrs=None):
+    """
+    Creates filters for pyarrow.parquet in disjunctive normal form.
+    Years and organisms are expanded into equality terms, because
+    pyarrow can only skip row groups for comparisons, not for 'in'.
+    If the file has no YEAR column, the years are selected by
+    ranges of COLLECT_DTM.
+
+    Parameters
+    ----------
+    schema - pyarrow.Schema of the APL file
+    years - list of int
+    organisms - list of str
+    bi_nbrs - list of str
+
+    Returns
+    -------
+    list of list of tuples or None
+    """
+    filters = [[]]
+    if bi_nbrs is not None:
+        filters = [[("BI_NBR", "in", list(bi_nbrs))]]
+    if organisms is not None:
+        filters = [
+            conj + [("ORGANISM", "=", organism)]
+            for conj in filters
+            for organism in organisms
+        ]
+    if years is not None:
+        years = [int(year) for year in years]
+        if "YEAR" not in schema.names:
+            terms = [
+                [
+                    ("COLLECT_DTM", ">=", pd.Timestamp(year=year, month=1, day=1)),
+                    ("COLLECT_DTM", "<", pd.Timestamp(year=year + 1, month=1, day=1)),
+                ]
+                for year in years
+            ]
+        elif is_string_type(schema.field("YEAR").type):
+            terms = [[("YEAR", "=", str(year))] for year in years]
+        else:
+            terms = [[("YEAR", "=", year)] for year in years]
+        filters = [conj + term for conj in filters for term in terms]
+    if filters == [[]]:
+        return None
+    return filters
+
+
 def gen_encounters(df):
     cols = [
         "ORD_ENCNTR_NBR",
@@ -140,57 +380,254 @@ def gen_results(
     columns=None,
     index=None,
 ):
+    """
+    Creates one row per sample (unique combination of the index columns)
+    and one column per drug. Multiple results of the same drug are
+    reduced to the most severe interpretation (R > I > S). Drugs that
+    were not tested are set to N.
 
+    The interpretations are encoded as integers and reduced with
+    numpy.maximum.at into a dense array, instead of pivoting lists.
+    The drug columns are ordered categoricals with the categories
+    S < I < R < N.
+    """
     if values is None:
         values = ['INTERP']
     if columns is None:
         columns = ['DRUG']
     if index is None:
         index = RESULTS_INDEX_COLS
-    
-    apl_df = df.copy()
-    
-    # Store index for later
-    INDEX = apl_df[index].drop_duplicates()
+
+    # Row number of each sample, in the order of first appearance
+    rows = df.groupby(index, sort=False, dropna=False, observed=True).ngroup().to_numpy()
+    _, first = np.unique(rows, return_index=True)
+    INDEX = df[index].iloc[first].reset_index(drop=True)
     logging.info(f'Results index length: {len(INDEX)}')
 
-    apl_df = apl_df[apl_df["DRUG"].notna()]
-       
-    apl_df = apl_df[apl_df.INTERP.isin(['S', 'R', 'I'])]    
-        
-    apl_df.BI_NBR = apl_df.BI_NBR.fillna("NA")
-    missing_values = apl_df[index + columns + values].isna().sum()
+    apl_df = df[index + columns + values]
+    mask = (df["DRUG"].notna() & df.INTERP.isin(['S', 'R', 'I'])).to_numpy()
+    missing = apl_df[mask].isna()
+
+    missing_values = missing.sum()
+    missing_values["BI_NBR"] = 0
     if missing_values.sum() != 0:
         missing_values = missing_values.loc[missing_values > 0]
         logging.warning(f"Selected columns contain missing values.\n{missing_values}")
-    
-    data = pd.pivot_table(
-        apl_df,
-        index=index,
-        columns=columns,
-        values=values,
-        aggfunc=list,
-        dropna=True, # dropna needs to be True otherwise out of memory
-    )
 
-    # Reindex here to get all samples
-    data = data.reindex(INDEX).fillna('N')
-    
-    for col in data.columns:
-        data[col] = data[col].apply(get_element)
-        
-    data = data.applymap(replace_interp)
-    
+    # Samples with missing index values have no results
+    mask[mask] = ~missing[index + columns].any(axis=1).to_numpy()
+    rows = rows[mask]
+
+    col_codes, col_labels = pd.MultiIndex.from_frame(apl_df.loc[mask, columns]).factorize(sort=True)
+    n_cols = len(col_labels)
+
+    data = {}
+    for value in values:
+        codes = interp_to_codes(apl_df.loc[mask, value])
+        valid = codes > 0
+        dense = np.zeros((len(INDEX), n_cols), dtype="int8")
+        np.maximum.at(dense, (rows[valid], col_codes[valid]), codes[valid])
+        for j, label in enumerate(col_labels):
+            data[(value,) + label] = interp_codes_to_categorical(dense[:, j])
+
+    data = pd.DataFrame(data, index=INDEX.index)
+    data.columns = pd.MultiIndex.from_tuples(data.columns, names=[None] + columns)
+
     if len(values) == 1:
         data.columns = data.columns.get_level_values(1)
-        
-    return data.reset_index()
+
+    data = pd.concat([INDEX, data], axis=1)
+    if len(values) == 1:
+        data.columns.name = columns[0]
+    return data
+
+
+def drug_columns(results):
+    """
+    Returns the drug columns of a results table, the columns that
+    only contain the interpretations S, I, R, N.
+    """
+    drugs = []
+    for col, dtype in results.dtypes.items():
+        if col in RESULTS_INDEX_COLS:
+            continue
+        if isinstance(dtype, pd.CategoricalDtype):
+            values = dtype.categories
+        elif dtype == object:
+            values = results[col].dropna().unique()
+        else:
+            continue
+        if len(values) and set(values) <= set(INTERP_CATEGORIES):
+            drugs.append(col)
+    return drugs
+
+
+def _interp_category_codes(interp):
+    # Position in INTERP_CATEGORIES, missing values are N
+    interp = pd.Categorical(interp, categories=INTERP_CATEGORIES)
+    codes = interp.codes.astype("int8")
+    codes[codes < 0] = INTERP_CATEGORIES.index("N")
+    return codes
+
+
+def antibiogram(results, antibiotics=None, by=None):
+    """
+    Counts the interpretations S, I, R, N of many antibiotics per group
+    in one pass. The groups are numbered once, each antibiotic is then
+    counted with numpy.bincount over group and interpretation codes,
+    instead of pivoting the results once per antibiotic.
+
+    Parameters
+    ----------
+    results - pandas.DataFrame, output of gen_results
+    antibiotics - list of str, defaults to all drug columns
+    by - list of str, grouping columns, default ['YEAR', 'ORGANISM']
+
+    Returns
+    -------
+    pandas.DataFrame, tidy, with the columns of by, DRUG,
+    INTERP (categorical S, I, R, N) and COUNT. Every observed group
+    has four rows per drug, one per interpretation.
+    """
+    if by is None:
+        by = ["YEAR", "ORGANISM"]
+    if antibiotics is None:
+        antibiotics = drug_columns(results)
+    if isinstance(antibiotics, str):
+        antibiotics = [antibiotics]
+
+    groups = results.groupby(by, sort=True, observed=True)
+    group_codes = groups.ngroup().to_numpy()
+    keys = groups.size().index.to_frame(index=False)
+    valid = group_codes >= 0
+    group_codes = group_codes[valid]
+
+    n_groups, n_interp = len(keys), len(INTERP_CATEGORIES)
+    counts = np.empty((len(antibiotics), n_groups * n_interp), dtype="int64")
+    for i, drug in enumerate(antibiotics):
+        codes = _interp_category_codes(results[drug].to_numpy()[valid])
+        counts[i] = np.bincount(
+            group_codes * n_interp + codes, minlength=n_groups * n_interp
+        )
+
+    # Rows ordered by drug, group and interpretation
+    n_drugs = len(antibiotics)
+    tidy = keys.iloc[np.tile(np.repeat(np.arange(n_groups), n_interp), n_drugs)].reset_index(drop=True)
+    tidy["DRUG"] = pd.Categorical(np.repeat(antibiotics, n_groups * n_interp), categories=antibiotics)
+    tidy["INTERP"] = pd.Categorical.from_codes(
+        np.tile(np.arange(n_interp), n_groups * n_drugs), categories=INTERP_CATEGORIES, ordered=True
+    )
+    tidy["COUNT"] = counts.ravel()
+    return tidy
+
+
+def antibiogram_per_drug(tidy, stack_col="ORGANISM"):
+    """
+    Converts the tidy antibiogram to one table per drug in the layout
+    of APL.pivot_results: index (stack_col, interpretation), one column
+    per value of the other grouping columns.
+
+    Returns
+    -------
+    dict {drug: pandas.DataFrame}
+    """
+    by = [col for col in tidy.columns if col not in ["DRUG", "INTERP", "COUNT"]]
+    columns = [col for col in by if col != stack_col]
+    tables = {}
+    for drug, df in tidy.groupby("DRUG", sort=False, observed=True):
+        table = (
+            df.pivot_table(
+                index=[stack_col, "INTERP"],
+                columns=columns,
+                values="COUNT",
+                aggfunc="sum",
+                observed=True,
+            )
+            .fillna(0)
+            .astype(int)
+        )
+        table.index = table.index.set_names(drug, level="INTERP")
+        tables[drug] = table
+    return tables
 
 
 def gen_reports(df):
-    apl_reports = df[['BI_NBR', 'REPORT_NAME', 'REPORT_NAME_2', 'PARENT', 'RESULT_ENTRY', 'RESULT_DISPLAY']].set_index(['BI_NBR']).replace('', None).dropna().reset_index()
-    reports = pd.pivot_table(apl_reports, index='BI_NBR', columns=['REPORT_NAME'], values='RESULT_DISPLAY', aggfunc=' '.join)
-    return reports
+    """
+    One row per BI_NBR and one column per REPORT_NAME with the
+    RESULT_DISPLAY of the reports, see gen_reports_long.
+    """
+    return reports_wide(gen_reports_long(df))
+
+
+def gen_reports_long(df):
+    """
+    Concatenates the RESULT_DISPLAY of all report rows of each BI_NBR
+    and REPORT_NAME, separated by spaces, in the order of the rows.
+    Rows with an empty or missing report column are skipped.
+
+    The rows are sorted once by BI_NBR and REPORT_NAME and the strings
+    of each group are joined by pyarrow, instead of a Python join
+    per group.
+
+    Returns
+    -------
+    pandas.DataFrame with the columns BI_NBR, REPORT_NAME and
+    RESULT_DISPLAY, sorted by BI_NBR and REPORT_NAME
+    """
+    cols = ['REPORT_NAME', 'REPORT_NAME_2', 'PARENT', 'RESULT_ENTRY', 'RESULT_DISPLAY']
+    valid = df.BI_NBR.notna().to_numpy()
+    for col in cols:
+        valid &= (df[col].notna() & (df[col] != '')).to_numpy(dtype=bool, na_value=False)
+    rows = np.flatnonzero(valid)
+
+    bi_codes, bi_nbrs = pd.factorize(df.BI_NBR.take(rows), sort=True)
+    name_codes, names = pd.factorize(df.REPORT_NAME.take(rows), sort=True)
+    key = bi_codes.astype("int64") * len(names) + name_codes
+    order = np.argsort(key, kind="stable")
+    key = key[order]
+    starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]]) if len(key) else key[:0]
+
+    display = pa.array(
+        df.RESULT_DISPLAY.take(rows[order]).astype(object).to_numpy(), type=pa.string()
+    )
+    offsets = pa.array(np.r_[starts, len(key)].astype("int32"))
+    joined = pc.binary_join(pa.ListArray.from_arrays(offsets, display), " ")
+
+    group_keys = key[starts]
+    return pd.DataFrame(
+        {
+            "BI_NBR": np.asarray(bi_nbrs)[group_keys // max(len(names), 1)],
+            "REPORT_NAME": np.asarray(names)[group_keys % max(len(names), 1)],
+            "RESULT_DISPLAY": joined.to_numpy(zero_copy_only=False),
+        }
+    )
+
+
+def reports_wide(reports):
+    """
+    Wide view of gen_reports_long, like the former pivot_table:
+    index BI_NBR, one column per REPORT_NAME.
+    """
+    return reports.set_index(["BI_NBR", "REPORT_NAME"]).RESULT_DISPLAY.unstack("REPORT_NAME")
+
+
+def crosstab(index, columns):
+    """
+    pandas.crosstab without the rows and columns of unobserved
+    categories, like for object columns.
+    """
+    counts = pd.crosstab(index, columns)
+    return counts.loc[counts.sum(axis=1) > 0, counts.sum(axis=0) > 0]
+
+
+def select_cultures(cultures, organisms=None, bi_nbrs=None, pids=None):
+    if organisms is not None:
+        cultures = cultures[cultures.ORGANISM.isin(organisms)].reset_index(drop=True)
+    if bi_nbrs is not None:
+        cultures = cultures[cultures.BI_NBR.isin(bi_nbrs)].reset_index(drop=True)
+    if pids is not None:
+        cultures = cultures[cultures.PID.isin(pids)].reset_index(drop=True)
+    return cultures
 
 
 class APL:
@@ -203,6 +640,8 @@ class APL:
         years=None,
         bi_nbrs=None,
         datetime_numeric=False,
+        cache=None,
+        dtypes=None,
     ):
         
        
@@ -212,49 +651,328 @@ class APL:
             if fn_results:
                 fn_results = str(fn_results).format(version=version)
         
+        if isinstance(organisms, str):
+            organisms = [organisms]
+
         logging.warning(f"Loading APL data from {fn}")
-        df = load_apl_data(fn=fn, years=years, datetime_numeric=datetime_numeric)
-        self.df = df
-        self.drugs = gen_drugs(df)
-        self.organisms = gen_organisms(df)
-        self.encounters = gen_encounters(df)
-        self.cultures = gen_cultures(df)
-        self.bi_info = gen_bi_info(df)
+        self._df = load_apl_data(
+            fn=fn,
+            years=years,
+            datetime_numeric=datetime_numeric,
+            organisms=organisms,
+            bi_nbrs=bi_nbrs,
+            dtypes=dtypes,
+        )
+        self.fn = fn
+        self.fn_results = fn_results
+        self.version = version
+        self.years = years
+        self.dtypes = dtypes
         self.index = None
-        self.reports = gen_reports(df)
-
-        if fn_results is not None:
-            logging.warning(f"Loading APL-results from {fn_results}")
-            self.results = pd.read_parquet(fn_results)
+        self.key_func_SIRN = key_func_SIRN
 
-        tmp = df[["ORD_ENCNTR_NBR", "CURRENT_PT_FACILITY", "YEAR"]].drop_duplicates()
-        self.total_counts_facility = pd.crosstab(tmp.CURRENT_PT_FACILITY, tmp.YEAR)
+        # Derived tables are generated on first access
+        self._derived_tables = {}
+        self._row_indexes = {}
+        self._df_loader = None
+        self._summaries = {}
+        self._results = None
+        self._cube = None
+        self._total_counts_facility = None
 
-        if isinstance(organisms, str):
-            organisms = [organisms]
+        # The loaded data contains complete encounters,
+        # the selection is applied to the cultures.
+        self._selections = []
         if (organisms is not None) or (bi_nbrs is not None):
-            self.select_samples(organisms=organisms, bi_nbrs=bi_nbrs)
-        self.key_func_SIRN = key_func_SIRN
+            self._selections.append((organisms, bi_nbrs, None))
+
+        # Derived tables can be stored on disk, see ArtifactCache
+        if cache is True:
+            cache = ArtifactCache()
+        elif isinstance(cache, (str, P)):
+            cache = ArtifactCache(cache)
+        self.cache = cache
+        self._use_cache = cache is not None
+
+    def _derived(self, name, func):
+        if name not in self._derived_tables:
+            self._derived_tables[name] = self._from_cache(name, lambda: func(self.df))
+        return self._derived_tables[name]
 
-    def select_samples(self, organisms=None, bi_nbrs=None):
-        if organisms is not None:
-            self.cultures = self.cultures[
-                self.cultures.ORGANISM.isin(organisms)
-            ].reset_index(drop=True)
-        if bi_nbrs is not None:
-            self.cultures = self.cultures[
-                self.cultures.BI_NBR.isin(bi_nbrs)
-            ].reset_index(drop=True)
-        ord_nbr = self.cultures.ORD_ENCNTR_NBR.unique()
-        bi_nbrs = self.cultures.BI_NBR.unique()
-        self.encounters = self.encounters[
-            self.encounters.ORD_ENCNTR_NBR.isin(ord_nbr)
-        ].reset_index(drop=True)
-        self.df = self.df[self.df.ORD_ENCNTR_NBR.isin(ord_nbr)].reset_index(drop=True)
-        self.bi_info = self.bi_info[self.bi_info.BI_NBR.isin(bi_nbrs)].reset_index(
-            drop=True
+    def _unselected(self, name, func):
+        # Like the results, these tables are generated from the data
+        # before any selection. After a selection only the columns
+        # they need are read again.
+        if name not in self._derived_tables:
+            regex = UNSELECTED_TABLES[name]
+            self._derived_tables[name] = self._from_cache(
+                name, lambda: func(self._unselected_df(regex))
+            )
+        return self._derived_tables[name]
+
+    def _unselected_df(self, regex):
+        if not self._selections:
+            return self.df.filter(regex=regex)
+        columns = [col for col in pq.read_schema(self.fn).names if re.search(regex, col)]
+        return load_apl_data(
+            fn=self.fn, years=self.years, columns=columns, dtypes=self.dtypes
         )
 
+    def _from_cache(self, name, func):
+        key = self.cache_key
+        if key is None:
+            return func()
+        return self.cache.get_or_create(key, name, func)
+
+    @property
+    def cache_key(self):
+        """
+        Key of the cache entry for the current selection, None if the
+        cache is disabled or the data was modified outside of this class.
+        """
+        if not self._use_cache:
+            return None
+        try:
+            selections = [
+                [None if ids is None else sorted(map(str, ids)) for ids in selection]
+                for selection in self._selections
+            ]
+            params = dict(years=self.years, selections=selections)
+            if self.dtypes is not None:
+                params["dtypes"] = self.dtypes
+            return self.cache.key(self.fn, version=self.version, **params)
+        except OSError as e:
+            logging.warning(f"Disabling APL cache:\n {e}")
+            self._use_cache = False
+            return None
+
+    def warm_cache(self, tables=CACHED_TABLES):
+        """
+        Generates the derived tables and stores them in the cache.
+        """
+        for name in tables:
+            if name == "gen_results":
+                self.gen_results()
+            else:
+                getattr(self, name)
+        return self.cache.info() if self.cache is not None else None
+
+    @property
+    def df(self):
+        # Views created by select() take their rows on first access
+        if self._df_loader is not None:
+            self._df, self._df_loader = self._df_loader(), None
+        return self._df
+
+    @df.setter
+    def df(self, df):
+        # Cached tables are only valid for the data as loaded
+        self._use_cache = False
+        self._replace_df(df)
+
+    def _replace_df(self, df):
+        self._df = df
+        self._df_loader = None
+        self._derived_tables = {}
+        self._row_indexes = {}
+        self._summaries = {}
+
+    def _summary(self, name, func):
+        # Summary statistics are computed once per selection state,
+        # they are reset when df or the results change
+        if name not in self._summaries:
+            self._summaries[name] = func()
+        return self._summaries[name]
+
+    def row_index(self, table, key):
+        """
+        RowIndex of the column `key` in a table, built on first use.
+
+        Parameters
+        ----------
+        table - str, 'df' or the name of a derived table,
+            e.g. 'cultures', 'encounters', 'bi_info'
+        key - str, e.g. 'ORD_ENCNTR_NBR', 'BI_NBR', 'ORGANISM', 'PID'
+        """
+        if (table, key) not in self._row_indexes:
+            df = self.df if table == "df" else getattr(self, table)
+            self._row_indexes[(table, key)] = RowIndex(df[key])
+        return self._row_indexes[(table, key)]
+
+    @property
+    def drugs(self):
+        return self._unselected("drugs", gen_drugs)
+
+    @property
+    def organisms(self):
+        return self._unselected("organisms", gen_organisms)
+
+    @property
+    def encounters(self):
+        return self._derived("encounters", gen_encounters)
+
+    @property
+    def cultures(self):
+        def func(df):
+            cultures = gen_cultures(df)
+            for selection in self._selections:
+                cultures = select_cultures(cultures, *selection)
+            return cultures
+
+        return self._derived("cultures", func)
+
+    @property
+    def bi_info(self):
+        def func(df):
+            bi_info = gen_bi_info(df)
+            if self._selections:
+                bi_nbrs = self.cultures.BI_NBR.unique()
+                bi_info = bi_info[bi_info.BI_NBR.isin(bi_nbrs)].reset_index(drop=True)
+            return bi_info
+
+        return self._derived("bi_info", func)
+
+    @property
+    def reports(self):
+        if "reports" not in self._derived_tables:
+            self._derived_tables["reports"] = self._from_cache(
+                "reports", lambda: reports_wide(self.reports_long)
+            )
+        return self._derived_tables["reports"]
+
+    @property
+    def reports_long(self):
+        return self._unselected("reports_long", gen_reports_long)
+
+    @property
+    def results(self):
+        if (self._results is None) and (self.fn_results is not None):
+            logging.warning(f"Loading APL-results from {self.fn_results}")
+            self._results = pd.read_parquet(self.fn_results)
+        return self._results
+
+    @results.setter
+    def results(self, results):
+        self._results = results
+        self._summaries = {}
+        self._cube = None
+
+    @property
+    def antibiogram_cube(self):
+        """
+        AntibiogramCube of the results, built on first access and
+        rebuilt after the results changed.
+
+            apl.antibiogram_cube.query(by=['YEAR'], where={'ORGANISM': 'SA'})
+        """
+        if self._cube is None and self.results is not None:
+            self._cube = AntibiogramCube.from_results(self.results)
+        return self._cube
+
+    @property
+    def total_counts_facility(self):
+        # Totals are counted over all organisms
+        if self._total_counts_facility is None:
+            tmp = self._unselected_df("^ORD_ENCNTR_NBR$|^CURRENT_PT_FACILITY$|^YEAR$")
+            tmp = tmp.drop_duplicates()
+            self._total_counts_facility = crosstab(tmp.CURRENT_PT_FACILITY, tmp.YEAR)
+        return self._total_counts_facility
+
+    def select_samples(self, organisms=None, bi_nbrs=None, pids=None):
+        """
+        Selects cultures of organisms, BI numbers and/or patients and
+        keeps the complete encounters of the selected cultures in df.
+        The rows are looked up in row indexes of the tables, which are
+        built once, instead of scanning the tables.
+
+        df, encounters, cultures, bi_info and the summaries follow the
+        selection. drugs, organisms, reports, reports_long, results and
+        total_counts_facility keep describing the data before the
+        selection.
+
+        Parameters
+        ----------
+        organisms - list of str
+        bi_nbrs - list of str
+        pids - list of str
+        """
+        self._apply_selection(self, organisms, bi_nbrs, pids)
+        # Interactive selections are not stored in the cache
+        self._use_cache = False
+
+    def select(self, organisms=None, bi_nbrs=None, pids=None):
+        """
+        Like select_samples, but returns a new APL instance with the
+        selection and leaves this instance unchanged. The row indexes
+        of this instance are shared, the rows of df are only taken
+        when the df of the new instance is used.
+
+        Returns
+        -------
+        APL
+        """
+        view = copy.copy(self)
+        view._selections = list(self._selections)
+        view._derived_tables = {}
+        view._row_indexes = {}
+        view._summaries = {}
+        view._use_cache = False
+        self._apply_selection(view, organisms, bi_nbrs, pids)
+        return view
+
+    def _apply_selection(self, target, organisms, bi_nbrs, pids):
+        # Positions of the selected cultures, in the order of self.cultures
+        cultures = self.cultures
+        positions = None
+        for key, values in [("ORGANISM", organisms), ("BI_NBR", bi_nbrs), ("PID", pids)]:
+            if values is None:
+                continue
+            if isinstance(values, str):
+                values = [values]
+            rows = self.row_index("cultures", key).positions(values)
+            positions = rows if positions is None else np.intersect1d(positions, rows)
+        if positions is not None:
+            cultures = cultures.take(positions).reset_index(drop=True)
+        ord_nbrs = cultures.ORD_ENCNTR_NBR.unique()
+
+        # Counts of the selection from the row indexes that exist
+        summaries = {}
+        if ("cultures", "PID") in self._row_indexes:
+            summaries["n_patients"] = self._row_indexes[("cultures", "PID")].n_keys(positions)
+
+        # Tables of the selected encounters and cultures, the tables
+        # of the unselected data are kept
+        derived = {"cultures": cultures}
+        for name in list(UNSELECTED_TABLES) + ["reports"]:
+            if name in self._derived_tables:
+                derived[name] = self._derived_tables[name]
+        if "encounters" in self._derived_tables:
+            derived["encounters"] = self.row_index("encounters", "ORD_ENCNTR_NBR").take(
+                self.encounters, ord_nbrs
+            )
+        if "bi_info" in self._derived_tables:
+            derived["bi_info"] = self.row_index("bi_info", "BI_NBR").take(
+                self.bi_info, cultures.BI_NBR.unique()
+            )
+
+        source = self.df
+
+        def take_rows():
+            if self._df is source:
+                index = self.row_index("df", "ORD_ENCNTR_NBR")
+            else:
+                index = RowIndex(source.ORD_ENCNTR_NBR)
+            return index.take(source, ord_nbrs)
+
+        if target is self:
+            self._replace_df(take_rows())
+        else:
+            target._df = None
+            target._df_loader = take_rows
+        target._selections.append((organisms, bi_nbrs, pids))
+        target._derived_tables.update(derived)
+        target._summaries.update(summaries)
+
     @property
     def summary(self):
         display(self.summary_data.style.background_gradient(axis=None))
@@ -264,100 +982,138 @@ class APL:
 
     @property
     def summary_data(self):
-        summary_data = (
-            pd.Series(
-                {
-                    "# Encounters": self.n_encounters,
-                    "# Patients": self.n_patients,
-                    "# BI numbers": self.n_bi_nbrs,
-                }
+        def func():
+            return (
+                pd.Series(
+                    {
+                        "# Encounters": self.n_encounters,
+                        "# Patients": self.n_patients,
+                        "# BI numbers": self.n_bi_nbrs,
+                    }
+                )
+                .to_frame()
+                .rename(columns={0: "Count"})
             )
-            .to_frame()
-            .rename(columns={0: "Count"})
-        )
-        return summary_data
+
+        return self._summary("summary_data", func)
 
     @property
     def organism_count(self):
-        organism_count = (
-            self.cultures.ORGANISM.value_counts()
-            .reset_index()
-            .rename(columns={"index": "ORGANISM", "ORGANISM": "Count"})
-        )
-        return organism_count
+        def func():
+            return (
+                self.cultures.ORGANISM.value_counts()
+                .loc[lambda counts: counts > 0]
+                .rename_axis("ORGANISM")
+                .reset_index(name="Count")
+            )
+
+        return self._summary("organism_count", func)
 
     @property
     def age_gender(self):
-        df = self.encounters
-        age_gender = pd.crosstab(self.encounters.AGE_GRP, self.encounters.GENDER)
-        return age_gender
+        def func():
+            return crosstab(self.encounters.AGE_GRP, self.encounters.GENDER)
+
+        return self._summary("age_gender", func)
 
     @property
     def n_patients(self):
-        n_patients = len(self.df.PID.unique())
-        return n_patients
+        # Every row of df belongs to a culture, so the cultures contain
+        # the same patients as df. The row index is shared with
+        # selections, which count their patients from it.
+        return self._summary("n_patients", lambda: self.row_index("cultures", "PID").n_keys())
 
     @property
     def n_encounters(self):
-        n_encounters = len(self.encounters)
-        return n_encounters
+        return self._summary("n_encounters", lambda: len(self.encounters))
 
     @property
     def n_bi_nbrs(self):
-        n_bi_nbrs = len(self.bi_info)
-        return n_bi_nbrs
+        return self._summary("n_bi_nbrs", lambda: len(self.bi_info))
 
     @property
     def n_cultures(self):
-        n_cultures = len(self.bi_info)
-        return n_cultures
+        return self._summary("n_cultures", lambda: len(self.bi_info))
 
     def check_consistency(self):
         pass
 
     @property
     def annual_counts_by_org(self):
-        df = self.cultures
-        annual_counts_by_org = pd.crosstab(df.ORGANISM, df.YEAR)
-        annual_counts_by_org = annual_counts_by_org.loc[
-            annual_counts_by_org.sum(axis=1)
-            .sort_values(ascending=False)
-            .index.to_list()
-        ]
-        return annual_counts_by_org
+        def func():
+            df = self.cultures
+            annual_counts_by_org = crosstab(df.ORGANISM, df.YEAR)
+            return annual_counts_by_org.loc[
+                annual_counts_by_org.sum(axis=1)
+                .sort_values(ascending=False)
+                .index.to_list()
+            ]
+
+        return self._summary("annual_counts_by_org", func)
 
     def gen_results(self, **kwargs):
-        self.results = gen_results(self.df, **kwargs)
+        if kwargs:
+            self.results = gen_results(self.df, **kwargs)
+        else:
+            self.results = self._from_cache("gen_results", lambda: gen_results(self.df))
         return self.results
 
     def pivot_results(
         self, antibiotics, columns=["YEAR", "ORGANISM"], stack_col="ORGANISM"
     ):
-
-        results = self.results.copy()
-
+        """
+        Counts the combinations of interpretations of the antibiotics
+        per stack_col (rows) and the other columns (columns).
+        For many antibiotics use antibiogram.
+        """
         if isinstance(antibiotics, str):
             antibiotics = [antibiotics]
-        swaplevel = len(antibiotics)
-        
-        df = (
-            pd.pivot_table(
-                data=results[antibiotics].fillna("N").reset_index(),
-                index=antibiotics,
-                columns=columns,
-                aggfunc="count",
-                values="CULT_ID",
+
+        data = self.results[antibiotics + columns].copy(deep=False)
+        for drug in antibiotics:
+            data[drug] = pd.Categorical.from_codes(
+                _interp_category_codes(data[drug].to_numpy()),
+                categories=INTERP_CATEGORIES,
+                ordered=True,
             )
+
+        df = (
+            data.groupby(antibiotics + columns, observed=True)
+            .size()
+            .unstack(columns)
             .fillna(0)
-            .sort_index(key=key_func_SIRN)
+            .sort_index()
             .astype(int)
             .stack(stack_col, dropna=False)
             .fillna(0)
+            .astype(int)
             .swaplevel(0)
             .sort_index(level=0, sort_remaining=False)
         )
         return df
 
+    def antibiogram(self, antibiotics=None, by=["YEAR", "ORGANISM"], per_drug=False, stack_col="ORGANISM"):
+        """
+        S/I/R/N counts of many antibiotics per group in one pass,
+        see antibiogram.
+
+        Parameters
+        ----------
+        antibiotics - list of str, defaults to all drug columns
+        by - list of str, grouping columns
+        per_drug - bool, return one table per drug in the layout
+            of pivot_results instead of the tidy frame
+        stack_col - str, row level of the per drug tables
+
+        Returns
+        -------
+        pandas.DataFrame or dict {drug: pandas.DataFrame}
+        """
+        tidy = antibiogram(self.results, antibiotics=antibiotics, by=by)
+        if per_drug:
+            return antibiogram_per_drug(tidy, stack_col=stack_col)
+        return tidy
+
     @property
     def pid_bi_nbr(self):
         return (
@@ -372,7 +1128,7 @@ class APL:
         index = separate_BSI_episodes(self.results, episode_cutoff=episode_cutoff)
         self.index = index
         if add_to_df:
-            self.df = pd.merge(self.df, index, on='BI_NBR', how='left')
+            self._replace_df(pd.merge(self.df, index, on='BI_NBR', how='left'))
         if add_to_results:
             self.results = pd.merge(self.results, index, on='BI_NBR', how='left')
         return index
@@ -384,65 +1140,107 @@ def separate_BSI_episodes(data, episode_cutoff):
     Mui's algorithm to identify episode index isolates.
     Re-implemented in Python.
     Original script: LSARP/datasets/220726-tmp__APL-grouped-BSI-episodes/code/220726-tmp__APL-grouped_BSI-episodes.R
+
+    The isolates are sorted once by PID, organism and collection time.
+    Episodes are then assigned to all PID/organism groups at the same time
+    on the sorted arrays. An isolate starts a new episode if it was collected
+    more than `episode_cutoff` days after the index isolate of the current
+    episode.
+
+    Parameters
+    ----------
+    data - pandas.DataFrame, APL results
+    episode_cutoff - int or list of int, cutoff(s) in days. If a list is
+        given, all indexes are computed from the same sort and the
+        episode number and total columns get a '_{cutoff}DAYS' suffix.
     """
-    data = data[data.BI_NBR.str.startswith('BI')].copy()
+    if isinstance(episode_cutoff, (list, tuple)):
+        cutoffs, suffix = list(episode_cutoff), True
+    else:
+        cutoffs, suffix = [episode_cutoff], False
 
+    data = data[data.BI_NBR.str.startswith('BI', na=False)].copy()
     data['COLLECT_DTM'] = pd.to_datetime(data['COLLECT_DTM'], format="%Y-%m-%d")
-    df_APL = (data.sort_values(by=['PID', 'ORG_LONG_NAME', 'COLLECT_DTM'])
-                .groupby(['PID', 'ORG_LONG_NAME'], group_keys=False)
-                .apply(lambda x: x.assign(ORGANISM=x['ORG_LONG_NAME'],
-                                          diff=(x['COLLECT_DTM'] - x['COLLECT_DTM'].shift(fill_value=x['COLLECT_DTM'].iloc[0]))
-                                                    .apply(lambda x: x / datetime.timedelta(days=1)),
-                                          cum_diff=(x['COLLECT_DTM'] - x['COLLECT_DTM'].iloc[0])
-                                                    .apply(lambda x: x / datetime.timedelta(days=1))
-                                        ))
+
+    # Groups with missing keys are dropped, like in groupby
+    df_APL = (data[data.PID.notna() & data.ORG_LONG_NAME.notna()]
+                .sort_values(by=['PID', 'ORG_LONG_NAME', 'COLLECT_DTM'])
                 .reset_index(drop=True))
+    df_APL['ORGANISM'] = df_APL['ORG_LONG_NAME']
+
+    group = df_APL.groupby(['PID', 'ORGANISM'], sort=False, observed=True).ngroup().to_numpy()
+    collect_dtm = df_APL['COLLECT_DTM']
+    times = collect_dtm.to_numpy(dtype='datetime64[ns]').view('int64')
+    missing = collect_dtm.isna().to_numpy()
+
+    out_vars = ['BI_NBR']
+    for cutoff in cutoffs:
+        is_index = _episode_index_isolates(group, times, missing, cutoff)
+
+        # Episodes are numbered within each PID/organism group
+        episode_nbr = pd.Series(is_index).groupby(group).cumsum()
+
+        out_var_name = f'INDEX_{cutoff}DAYS'
+        out_var_name_episode = f'N_ISO_EPISODE_INDEX_{cutoff}DAYS'
+        out_var_name_total = f'TOTAL_N_BI_NBRS_{cutoff}DAYS' if suffix else 'TOTAL_N_BI_NBRS'
+        out_var_name_episode_nbr = f'EPISODE_NBR_{cutoff}DAYS' if suffix else 'EPISODE_NBR'
+
+        df_APL[out_var_name] = is_index
+        df_APL[out_var_name_episode_nbr] = episode_nbr.to_numpy()
+
+        # Total number of episodes per patient per organism
+        df_APL[out_var_name_total] = df_APL.groupby(['PID', 'GENDER', 'ORGANISM'], observed=True)[out_var_name_episode_nbr].transform('max')
+
+        # Total number of isolates
+        df_APL[out_var_name_episode] = df_APL.groupby(['PID', 'GENDER', 'ORGANISM', out_var_name_episode_nbr], observed=True)['BI_NBR'].transform('nunique')
+
+        out_vars += [out_var_name, out_var_name_episode, out_var_name_total, out_var_name_episode_nbr]
+
+    return df_APL[out_vars].fillna({col: False for col in out_vars[1:]})
+
+
+def _episode_index_isolates(group, times, missing, episode_cutoff):
+    """
+    Flags the index isolates of all BSI episodes.
+
+    Parameters
+    ----------
+    group - numpy.array, group number of each isolate, the groups
+        have to be contiguous
+    times - numpy.array, collection times as int64 [ns], sorted within
+        each group
+    missing - numpy.array, True where the collection time is missing
+    episode_cutoff - int, cutoff in days
+
+    Returns
+    -------
+    numpy.array of bool, True for index isolates
+    """
+    n = len(group)
+    is_index = np.zeros(n, dtype=bool)
+    if n == 0:
+        return is_index
+
+    cutoff = int(pd.Timedelta(days=episode_cutoff).value)
+
+    # First isolate of each group belongs to the first BSI episode
+    is_index[0] = True
+    is_index[1:] = group[1:] != group[:-1]
+    index_time = times[is_index].copy()
 
-    # Separate BSI episode with respect to "episode_cutoff"
-    # Assign episode numbers
-    for p in df_APL['PID'].unique():
-        for o in df_APL[df_APL['PID'] == p]['ORGANISM'].unique():
-            rows = df_APL.loc[(df_APL['PID'] == p) & (df_APL['ORGANISM'] == o)].index
-            # Select and sort by dates
-            df_current = df_APL.loc[rows].sort_values(by='COLLECT_DTM')
-            # First isolate belongs to first BSI episode
-            df_APL.loc[rows[0], 'episode_NBR'] = 1
-            # Flag whether this is an index isolate for the respective BSI episode
-            df_APL.loc[rows[0], 'index'] = True
-            # Row number of index isolate of current BSI episode; gets updated
-            index_isolate = 0
-            # Number of current BSI episode; gets updated
-            episode_i = 1
-            for i in range(1, len(df_current)):
-                # Check if current isolate is less than "episode_cutoff" days from index isolate
-                if df_current.loc[rows[i], 'cum_diff'] <= df_current.loc[rows[index_isolate], 'cum_diff'] + episode_cutoff:
-                    df_APL.loc[rows[i], 'episode_NBR'] = episode_i
-                else:
-                    # Update index isolate (i.e. new episode)
-                    index_isolate = i
-                    episode_i += 1
-                    df_APL.loc[rows[i], 'episode_NBR'] = episode_i
-                    df_APL.loc[rows[i], 'index'] = True
-
-    # Total number of episodes per patient per organism
-    df_APL['total_n_BI'] = df_APL.groupby(['PID', 'GENDER', 'ORGANISM'])['episode_NBR'].transform(max)
-
-    # Total number of isolates
-    df_APL['n_iso_episode'] = df_APL.groupby(['PID', 'GENDER', 'ORGANISM', 'episode_NBR'])['BI_NBR'].transform('nunique')
-    
-    #Renaming variables
-    out_var_name = f'INDEX_{episode_cutoff}DAYS'
-    out_var_name_episode = f'N_ISO_EPISODE_INDEX_{episode_cutoff}DAYS'
-    out_var_name_total = 'TOTAL_N_BI_NBRS'
-    out_var_name_episode_nbr = 'EPISODE_NBR'
-    
-    df_APL = df_APL.rename(columns={'index': out_var_name, 
-                                    'n_iso_episode': out_var_name_episode, 
-                                    'total_n_BI': out_var_name_total, 
-                                    'episode_NBR': out_var_name_episode_nbr})
-
-    out_vars = ['BI_NBR', out_var_name, out_var_name_episode, out_var_name_total, out_var_name_episode_nbr]
-    return df_APL.reset_index()[out_vars].fillna(False)
-
-
-    
\ No newline at end of file
+    # Walk all groups at once, one episode per iteration.
+    # Isolates without collection time always start a new episode.
+    rows = np.flatnonzero(~is_index)
+    while len(rows):
+        beyond = missing[rows] | (times[rows] > index_time[group[rows]] + cutoff)
+        rows = rows[beyond]
+        if not len(rows):
+            break
+        grp = group[rows]
+        first = np.ones(len(rows), dtype=bool)
+        first[1:] = grp[1:] != grp[:-1]
+        new_index = rows[first]
+        is_index[new_index] = True
+        index_time[group[new_index]] = times[new_index]
+        rows = rows[~first]
+    return is_index
@@ -0,0 +1,206 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+
+import pandas as pd
+
+from pathlib import Path as P
+
+from ..tools import atomic_write
+
+CACHE_ROOT = "/bulk/LSARP/datasets/APL/cache"
+
+
+def fingerprint(fn):
+    """
+    Identifies the state of a source file by its path, size
+    and modification time.
+    """
+    fn = P(fn).resolve()
+    stat = fn.stat()
+    return {"fn": str(fn), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def library_version():
+    from .. import __version__
+
+    return __version__
+
+
+class ArtifactCache:
+    """
+    Persistent cache for tables derived from an APL parquet file.
+
+    Each entry is a directory with one parquet file per table and a
+    manifest.json. The directory name is derived from the source file
+    fingerprint, the library version and the selection parameters, so
+    that changed source files or a new library version never hit stale
+    tables.
+
+        root/
+            {version}-{hash}/
+                manifest.json
+                cultures.parquet
+                encounters.parquet
+                ...
+    """
+
+    def __init__(self, root=CACHE_ROOT):
+        self.root = P(root)
+        # Manifest of the keys created by key(), written by put()
+        self._meta = {}
+
+    def key(self, fn, version=None, **params):
+        """
+        Returns the key of the cache entry for the source file
+        `fn` and the selection parameters `params`. Nothing is
+        written, the manifest is created by the first put().
+        """
+        source = fingerprint(fn)
+        meta = {
+            "source": source,
+            "library_version": library_version(),
+            "params": params,
+        }
+        digest = hashlib.sha1(
+            json.dumps(meta, sort_keys=True, default=str).encode()
+        ).hexdigest()[:16]
+        key = f"{version}-{digest}" if version else digest
+        self._meta[key] = meta
+        return key
+
+    def path(self, key, name=None):
+        path = self.root / key
+        if name is None:
+            return path
+        return path / f"{name}.parquet"
+
+    def get(self, key, name):
+        """
+        Reads a cached table, returns None if it is not cached.
+        The file is memory-mapped.
+        """
+        fn = self.path(key, name)
+        if not fn.is_file():
+            return None
+        logging.info(f"Reading {name} from cache {fn}")
+        return pd.read_parquet(fn, memory_map=True)
+
+    def put(self, key, name, df):
+        fn = self.path(key, name)
+        os.makedirs(fn.parent, exist_ok=True)
+        with atomic_write(fn) as tmp:
+            df.to_parquet(tmp)
+        manifest = {**self._meta.get(key, {}), **self._read_manifest(key)}
+        manifest.setdefault("tables", {})[name] = {
+            "n_rows": len(df),
+            "bytes": fn.stat().st_size,
+            "created": pd.Timestamp.now().isoformat(),
+        }
+        self._write_manifest(key, manifest)
+
+    def get_or_create(self, key, name, func):
+        """
+        Returns the cached table or creates it with func()
+        and stores it in the cache.
+        """
+        df = self.get(key, name)
+        if df is None:
+            df = func()
+            try:
+                self.put(key, name, df)
+            except Exception as e:
+                logging.warning(f"Cannot cache {name} in {self.path(key)}:\n {e}")
+        return df
+
+    def info(self):
+        """
+        Returns a pandas.DataFrame with one row per cached table.
+        Entries whose source file changed or was removed are
+        marked as stale.
+        """
+        rows = []
+        for manifest_fn in sorted(self.root.glob("*/manifest.json")):
+            key = manifest_fn.parent.name
+            manifest = self._read_manifest(key)
+            source = manifest.get("source", {})
+            stale = self._is_stale(manifest)
+            for name, table in manifest.get("tables", {}).items():
+                rows.append(
+                    {
+                        "KEY": key,
+                        "TABLE": name,
+                        "SOURCE": source.get("fn"),
+                        "LIBRARY_VERSION": manifest.get("library_version"),
+                        "N_ROWS": table.get("n_rows"),
+                        "BYTES": table.get("bytes"),
+                        "CREATED": table.get("created"),
+                        "STALE": stale,
+                    }
+                )
+        columns = [
+            "KEY",
+            "TABLE",
+            "SOURCE",
+            "LIBRARY_VERSION",
+            "N_ROWS",
+            "BYTES",
+            "CREATED",
+            "STALE",
+        ]
+        return pd.DataFrame(rows, columns=columns)
+
+    def purge(self, key=None, stale_only=False):
+        """
+        Removes cache entries.
+
+        Parameters
+        ----------
+        key - str, only remove this entry
+        stale_only - bool, only remove entries whose source file
+            changed, was removed or was cached with another
+            library version
+
+        Returns
+        -------
+        list of removed keys
+        """
+        if key is not None:
+            keys = [key]
+        else:
+            keys = [fn.parent.name for fn in self.root.glob("*/manifest.json")]
+        removed = []
+        for key in keys:
+            if stale_only and not self._is_stale(self._read_manifest(key)):
+                continue
+            path = self.path(key)
+            if path.is_dir():
+                logging.warning(f"Removing cache entry {path}")
+                shutil.rmtree(path)
+                removed.append(key)
+        return removed
+
+    def _is_stale(self, manifest):
+        source = manifest.get("source", {})
+        try:
+            current = fingerprint(source.get("fn"))
+        except (OSError, TypeError):
+            return True
+        if manifest.get("library_version") != library_version():
+            return True
+        return current != source
+
+    def _read_manifest(self, key):
+        fn = self.path(key) / "manifest.json"
+        if not fn.is_file():
+            return {}
+        with open(fn) as file:
+            return json.load(file)
+
+    def _write_manifest(self, key, manifest):
+        fn = self.path(key) / "manifest.json"
+        os.makedirs(fn.parent, exist_ok=True)
+        with atomic_write(fn) as tmp, open(tmp, "w") as file:
+            json.dump(manifest, file, indent=2, default=str)
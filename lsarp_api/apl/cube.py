@@ -0,0 +1,204 @@
+import numpy as np
+import pandas as pd
+
+from .helpers import INTERP_CATEGORIES
+
+CUBE_DIMENSIONS = [
+    "ORGANISM",
+    "YEAR",
+    "QUARTER",
+    "CURRENT_PT_FACILITY",
+    "AGE_GRP",
+    "GENDER",
+    "HOSPITAL_ONSET_48H",
+]
+
+
+class AntibiogramCube:
+    """
+    Materialized S/I/R/N counts of the results per combination of the
+    dimensions and drug, for roll-ups and slices without the row-level
+    results.
+
+    Only observed combinations of the dimensions are stored:
+    `coords` holds the codes of each combination in the dimension
+    dictionaries and `counts` the number of samples per drug and
+    interpretation.
+
+        coords - int16 array (n_cells, n_dimensions)
+        counts - int32 array (n_cells, n_drugs, 4), S, I, R, N
+        dimensions - dict {dimension: pandas.Index of labels}
+        drugs - pandas.Index of drug names
+
+    Use AntibiogramCube.from_results to build a cube.
+    """
+
+    def __init__(self, coords, counts, dimensions, drugs):
+        self.coords = coords
+        self.counts = counts
+        self.dimensions = dimensions
+        self.drugs = pd.Index(drugs)
+
+    @classmethod
+    def from_results(cls, results, dimensions=None, antibiotics=None):
+        """
+        Parameters
+        ----------
+        results - pandas.DataFrame, output of gen_results
+        dimensions - list of str, default CUBE_DIMENSIONS that are in results
+        antibiotics - list of str, defaults to all drug columns
+        """
+        from .APL import drug_columns, _interp_category_codes
+
+        if dimensions is None:
+            dimensions = [dim for dim in CUBE_DIMENSIONS if dim in results.columns]
+        if antibiotics is None:
+            antibiotics = drug_columns(results)
+
+        # Dimension dictionaries, missing values are a label of their own
+        codes, labels = {}, {}
+        for dim in dimensions:
+            codes[dim], uniques = pd.factorize(results[dim], sort=True, use_na_sentinel=False)
+            labels[dim] = pd.Index(uniques, name=dim)
+        shape = [len(labels[dim]) for dim in dimensions]
+
+        # One cell per observed combination of the dimensions
+        key = np.ravel_multi_index([codes[dim] for dim in dimensions], shape)
+        cells, cell = np.unique(key, return_inverse=True)
+        coords = np.stack(np.unravel_index(cells, shape), axis=1).astype("int16")
+
+        n_cells, n_interp = len(cells), len(INTERP_CATEGORIES)
+        counts = np.empty((n_cells, len(antibiotics), n_interp), dtype="int32")
+        for i, drug in enumerate(antibiotics):
+            interp = _interp_category_codes(results[drug].to_numpy())
+            counts[:, i, :] = np.bincount(
+                cell * n_interp + interp, minlength=n_cells * n_interp
+            ).reshape(n_cells, n_interp)
+        return cls(coords, counts, labels, antibiotics)
+
+    def _codes(self, dim, values):
+        labels = self.dimensions[dim]
+        if np.ndim(values) == 0:
+            values = [values]
+        return labels.get_indexer(pd.Index(values).astype(labels.dtype, copy=False))
+
+    def query(self, by=None, where=None, drugs=None):
+        """
+        Rolls up the counts to the dimensions `by` for the slice `where`.
+
+        Parameters
+        ----------
+        by - list of str, dimensions to keep, the others are summed up
+        where - dict {dimension: value or list of values}
+        drugs - list of str, defaults to all drugs
+
+        Returns
+        -------
+        pandas.DataFrame with the columns of by, DRUG, S, I, R, N,
+        N_TESTED (S + I + R) and PCT_R (percent resistant of tested)
+        """
+        by = [] if by is None else list(by)
+        dims = list(self.dimensions)
+        mask = np.ones(len(self.coords), dtype=bool)
+        for dim, values in (where or {}).items():
+            codes = self._codes(dim, values)
+            mask &= np.isin(self.coords[:, dims.index(dim)], codes[codes >= 0])
+
+        drug_idx = np.arange(len(self.drugs)) if drugs is None else self.drugs.get_indexer(drugs)
+        assert (drug_idx >= 0).all(), f"Unknown drugs {drugs}"
+        coords = self.coords[:, [dims.index(dim) for dim in by]]
+        counts = self.counts
+        if not mask.all():
+            coords, counts = coords[mask], counts[mask]
+        if drugs is not None:
+            counts = counts[:, drug_idx, :]
+
+        # Sum the cells of each combination of the by dimensions
+        shape = [len(self.dimensions[dim]) for dim in by]
+        key = np.ravel_multi_index(coords.T, shape) if by else np.zeros(len(coords), dtype=int)
+        if len(key) and (np.diff(key) < 0).any():
+            order = np.argsort(key, kind="stable")
+            key, counts = key[order], counts[order]
+        starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]]) if len(key) else key[:0]
+        if len(key):
+            rolled = np.add.reduceat(counts, starts, axis=0, dtype="int64")
+        else:
+            rolled = counts[:0]
+        groups = np.stack(np.unravel_index(key[starts], shape), axis=1) if by else np.zeros((len(starts), 0), dtype=int)
+
+        n_groups, n_drugs = rolled.shape[:2]
+        df = pd.DataFrame(
+            {
+                dim: self.dimensions[dim].take(np.repeat(groups[:, j], n_drugs))
+                for j, dim in enumerate(by)
+            }
+        )
+        df["DRUG"] = np.tile(self.drugs.take(drug_idx), n_groups)
+        for k, interp in enumerate(INTERP_CATEGORIES):
+            df[interp] = rolled[:, :, k].ravel()
+        df["N_TESTED"] = df.S + df.I + df.R
+        df["PCT_R"] = 100 * df.R / df.N_TESTED.where(df.N_TESTED > 0)
+        return df
+
+    def to_frame(self):
+        """
+        Long table with one row per cell and drug. The dimensions and
+        DRUG are categoricals, so their dictionaries are stored with
+        the codes when written to parquet.
+        """
+        n_cells, n_drugs, _ = self.counts.shape
+        df = pd.DataFrame(
+            {
+                dim: _categorical(np.repeat(self.coords[:, j], n_drugs), labels)
+                for j, (dim, labels) in enumerate(self.dimensions.items())
+            }
+        )
+        df["DRUG"] = pd.Categorical.from_codes(
+            np.tile(np.arange(n_drugs), n_cells), categories=self.drugs
+        )
+        for k, interp in enumerate(INTERP_CATEGORIES):
+            df[interp] = self.counts[:, :, k].ravel()
+        return df
+
+    @classmethod
+    def from_frame(cls, df):
+        dims = [col for col in df.columns if col not in ["DRUG"] + INTERP_CATEGORIES]
+        drugs = df.DRUG.cat.categories
+        n_drugs = len(drugs)
+        assert (df.DRUG.cat.codes.to_numpy() == np.tile(np.arange(n_drugs), len(df) // n_drugs)).all()
+        coords, dimensions = [], {}
+        for dim in dims:
+            # Parquet does not keep all dictionaries, e.g. of booleans
+            values = df[dim].astype("category").iloc[::n_drugs]
+            codes = values.cat.codes.to_numpy().astype("int16")
+            labels = values.cat.categories
+            # Missing values are the last label
+            if (codes < 0).any():
+                codes[codes < 0] = len(labels)
+                labels = labels.insert(len(labels), np.nan)
+            coords.append(codes)
+            dimensions[dim] = pd.Index(labels, name=dim)
+        coords = np.stack(coords, axis=1)
+        counts = np.stack(
+            [df[interp].to_numpy("int32").reshape(-1, n_drugs) for interp in INTERP_CATEGORIES],
+            axis=2,
+        )
+        return cls(coords, counts, dimensions, drugs)
+
+    def to_parquet(self, fn):
+        self.to_frame().to_parquet(fn)
+
+    @classmethod
+    def read_parquet(cls, fn):
+        return cls.from_frame(pd.read_parquet(fn))
+
+
+def _categorical(codes, labels):
+    # Categories cannot contain missing values, their code is -1
+    missing = labels.isna()
+    lookup = np.full(len(labels), -1)
+    lookup[~missing] = np.arange((~missing).sum())
+    # The labels of categorical columns are a CategoricalIndex, whose
+    # categories can contain values that were not observed
+    categories = np.asarray(labels[~missing])
+    return pd.Categorical.from_codes(lookup[codes], categories=categories)
@@ -47,3 +47,32 @@ def get_element(x):
 def key_func_SIRN(x):
     mapping = {"S": 0, "I": 1, "R": 2, "N": 3}
     return pd.Index(pd.Series(x).replace(mapping))
+
+
+# Ordered by severity, not tested results are coded as 0 (N)
+INTERP_CATEGORIES = ["S", "I", "R", "N"]
+INTERP_CODES = {"S": 1, "I": 2, "R": 3}
+
+
+def interp_codes_to_categorical(codes):
+    """
+    Converts INTERP codes (0=N, 1=S, 2=I, 3=R) to an ordered
+    pandas.Categorical with the categories S < I < R < N.
+    """
+    lookup = np.array([3, 0, 1, 2], dtype="int8")
+    return pd.Categorical.from_codes(
+        lookup[codes], categories=INTERP_CATEGORIES, ordered=True
+    )
+
+
+def interp_to_codes(interp):
+    """
+    Converts an INTERP column to codes (0=N, 1=S, 2=I, 3=R).
+    Categorical columns are converted via their categories.
+    """
+    if isinstance(interp.dtype, pd.CategoricalDtype):
+        lookup = [INTERP_CODES.get(cat, 0) for cat in interp.cat.categories]
+        # Missing values have the category code -1
+        lookup = np.array(lookup + [0], dtype="int8")
+        return lookup[interp.cat.codes.to_numpy()]
+    return interp.map(INTERP_CODES).fillna(0).to_numpy("int8")
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+
+class RowIndex:
+    """
+    Maps the values of a key column to the integer positions of
+    the rows with that value, e.g. ORD_ENCNTR_NBR -> rows of APL.df.
+
+    The column is factorized once and the row positions are sorted
+    by key, so that the rows of each key are a contiguous range.
+    Lookups are then a hash lookup of the requested keys and a
+    concatenation of their ranges, without scanning the table.
+
+    Parameters
+    ----------
+    values - pandas.Series, key column
+    """
+
+    def __init__(self, values):
+        codes, uniques = pd.factorize(values)
+        self.keys = pd.Index(uniques)
+        self.codes = codes
+        # Rows with missing keys have code -1 and come first
+        self.order = np.argsort(codes, kind="stable")
+        n_missing = np.count_nonzero(codes < 0)
+        counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+        self.offsets = np.concatenate([[0], np.cumsum(counts)]) + n_missing
+        self.missing = self.order[:n_missing]
+        self.n_rows = len(codes)
+
+    def positions(self, keys):
+        """
+        Returns the sorted positions of the rows with one of keys,
+        like numpy.flatnonzero(values.isin(keys)).
+        """
+        keys = pd.unique(np.asarray(list(keys), dtype=object))
+        found = self.keys.get_indexer(keys)
+        found = found[found >= 0]
+        starts = self.offsets[found]
+        lengths = self.offsets[found + 1] - starts
+        # Each range starts at its offset in self.order
+        ranges = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        ranges += np.arange(lengths.sum())
+        positions = self.order[ranges]
+        if pd.isna(keys).any():
+            positions = np.concatenate([positions, self.missing])
+        return np.sort(positions)
+
+    def n_keys(self, positions=None):
+        """
+        Returns the number of distinct keys of the rows at positions,
+        or of all rows, like len(values.unique()). Missing keys count
+        as one key.
+        """
+        codes = self.codes if positions is None else self.codes[positions]
+        return np.count_nonzero(np.bincount(codes + 1, minlength=len(self.keys) + 1))
+
+    def take(self, df, keys):
+        """
+        Returns the rows of df with one of keys, df has to be the
+        table this index was built from.
+        """
+        assert len(df) == self.n_rows
+        return df.take(self.positions(keys)).reset_index(drop=True)
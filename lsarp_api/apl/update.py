@@ -0,0 +1,280 @@
+import os
+import time
+import logging
+
+import numpy as np
+import pandas as pd
+
+from pathlib import Path as P
+
+from .APL import (
+    FN,
+    FN_RESULTS,
+    RESULTS_INDEX_COLS,
+    load_apl_data,
+    gen_results,
+    gen_reports,
+    separate_BSI_episodes,
+)
+from .helpers import INTERP_CATEGORIES
+
+# Artifacts of an APL version, FN_RESULTS is the results table
+ARTIFACT_FNS = {
+    "results": FN_RESULTS,
+    "index": "/bulk/LSARP/datasets/APL/versions/{version}/{version}-sw__APL-index.parquet",
+    "reports": "/bulk/LSARP/datasets/APL/versions/{version}/{version}-sw__APL-reports.parquet",
+    "sample_hashes": "/bulk/LSARP/datasets/APL/versions/{version}/{version}-sw__APL-sample-hashes.parquet",
+}
+
+REPORT_COLS = ["REPORT_NAME", "REPORT_NAME_2", "PARENT", "RESULT_ENTRY", "RESULT_DISPLAY"]
+
+# A sample is recomputed if any of these columns changed in one of its rows
+HASH_COLS = list(
+    dict.fromkeys(["BI_NBR", "ORD_ENCNTR_NBR"] + RESULTS_INDEX_COLS + ["DRUG", "INTERP"] + REPORT_COLS)
+)
+
+
+def sample_hashes(df, columns=HASH_COLS):
+    """
+    One hash per BI_NBR over the rows of the sample. The row hashes
+    are weighted by the position of the row within the sample, so
+    reordered rows also change the hash, like they change the
+    reports.
+
+    Returns
+    -------
+    pandas.DataFrame with the columns BI_NBR and HASH
+    """
+    cols = [col for col in columns if col in df.columns]
+    codes, bi_nbrs = pd.factorize(df.BI_NBR)
+    row_hashes = pd.util.hash_pandas_object(df[cols], index=False).to_numpy()
+
+    keep = codes >= 0
+    order = np.argsort(codes[keep], kind="stable")
+    codes = codes[keep][order]
+    row_hashes = row_hashes[keep][order]
+
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else np.array([], dtype=int)
+    sizes = np.diff(np.r_[starts, len(codes)])
+    rank = np.arange(len(codes)) - np.repeat(starts, sizes)
+    # uint64 arithmetic wraps around
+    with np.errstate(over="ignore"):
+        row_hashes = row_hashes * (rank.astype("uint64") + np.uint64(1))
+        hashes = np.add.reduceat(row_hashes, starts) if len(starts) else row_hashes[:0]
+    return pd.DataFrame(
+        {"BI_NBR": np.asarray(bi_nbrs, dtype=object)[codes[starts]], "HASH": hashes}
+    )
+
+
+def detect_changes(hashes, previous_hashes):
+    """
+    Compares the sample hashes of two versions.
+
+    Returns
+    -------
+    dict with the lists of 'added', 'changed' and 'removed' BI numbers
+    """
+    new = hashes.set_index("BI_NBR").HASH
+    old = previous_hashes.set_index("BI_NBR").HASH
+    common = new.index.intersection(old.index)
+    return {
+        "added": new.index.difference(old.index).to_list(),
+        "changed": common[new[common].to_numpy() != old[common].to_numpy()].to_list(),
+        "removed": old.index.difference(new.index).to_list(),
+    }
+
+
+def build_artifacts(fn=FN, episode_cutoff=30, dtypes=None):
+    """
+    Generates all artifacts of an APL version from the APL file.
+
+    Returns
+    -------
+    dict {name: pandas.DataFrame} with the keys of ARTIFACT_FNS
+    """
+    df = load_apl_data(fn, dtypes=dtypes)
+    results = gen_results(df)
+    return {
+        "results": results,
+        "index": separate_BSI_episodes(results, episode_cutoff=episode_cutoff),
+        "reports": gen_reports(df),
+        "sample_hashes": sample_hashes(df),
+    }
+
+
+def update_artifacts(fn, previous, fn_previous=None, episode_cutoff=30, dtypes=None):
+    """
+    Generates the artifacts of a new APL version from the artifacts of
+    the previous version. Only samples (BI numbers) that were added or
+    changed are recomputed, episodes are only recomputed for the
+    PID/organism groups of added, changed or removed samples. If no
+    sample changed, the previous artifacts are returned.
+
+    Parameters
+    ----------
+    fn - str, path to the new APL parquet file
+    previous - dict {name: pandas.DataFrame}, artifacts of the previous version
+    fn_previous - str, previous APL file, only needed if previous
+        has no sample_hashes
+    episode_cutoff - int, passed to separate_BSI_episodes, has to be
+        the cutoff of the previous index
+
+    Returns
+    -------
+    artifacts - dict {name: pandas.DataFrame}
+    changes - dict with the lists of 'added', 'changed' and 'removed' BI numbers
+    """
+    df = load_apl_data(fn, dtypes=dtypes)
+    hashes = sample_hashes(df)
+    previous_hashes = previous.get("sample_hashes")
+    if previous_hashes is None:
+        assert fn_previous is not None, "fn_previous is needed without previous sample_hashes"
+        cols = [col for col in HASH_COLS if col in df.columns]
+        previous_hashes = sample_hashes(load_apl_data(fn_previous, columns=cols, dtypes=dtypes))
+
+    changes = detect_changes(hashes, previous_hashes)
+    logging.warning(
+        f"APL update: {len(changes['added'])} added, {len(changes['changed'])} changed, "
+        f"{len(changes['removed'])} removed samples"
+    )
+    recompute = set(changes["added"]) | set(changes["changed"])
+    stale = recompute | set(changes["removed"])
+
+    # Nothing to recompute if the samples and their order are unchanged
+    unchanged = (
+        not stale
+        and df.BI_NBR.notna().all()
+        and hashes.BI_NBR.equals(previous_hashes.BI_NBR)
+    )
+    if unchanged and all(name in previous for name in ["results", "index", "reports"]):
+        return dict(previous, sample_hashes=hashes), changes
+
+    # Samples without BI number are always recomputed
+    rows = (df.BI_NBR.isin(recompute) | df.BI_NBR.isna()).to_numpy()
+    subset = df[rows]
+
+    # Reordered samples change the order of the artifacts, but no rows
+    new_results = gen_results(subset) if len(subset) else previous["results"].iloc[:0]
+    results = _merge_results(
+        previous["results"], new_results, stale, order=pd.unique(df.BI_NBR)
+    )
+    index = _merge_index(
+        previous["index"], previous["results"], results, stale, episode_cutoff
+    )
+    reports = _merge_reports(previous["reports"], gen_reports(subset), stale)
+
+    artifacts = {
+        "results": results,
+        "index": index,
+        "reports": reports,
+        "sample_hashes": hashes,
+    }
+    return artifacts, changes
+
+
+def _keep(df, stale):
+    bi_nbr = df.BI_NBR if "BI_NBR" in df.columns else df.index.to_series()
+    return df[(bi_nbr.notna() & ~bi_nbr.isin(stale)).to_numpy()]
+
+
+def _merge_results(previous, new, stale, order):
+    index_cols = [col for col in new.columns if col in RESULTS_INDEX_COLS]
+    results = pd.concat([_keep(previous, stale), new], ignore_index=True)
+
+    # Drugs that were only tested in one of the versions are N in the other
+    drugs = sorted(col for col in results.columns if col not in index_cols)
+    for drug in drugs:
+        results[drug] = pd.Categorical(
+            results[drug].astype(object).fillna("N"),
+            categories=INTERP_CATEGORIES,
+            ordered=True,
+        )
+    results = results[index_cols + drugs]
+
+    # Same row order as gen_results on the complete data
+    position = pd.Series(np.arange(len(order)), index=order)
+    sort_key = position.reindex(results.BI_NBR.to_numpy()).to_numpy()
+    results = results.iloc[np.argsort(sort_key, kind="stable")].reset_index(drop=True)
+    results.columns.name = new.columns.name
+    return results
+
+
+def _merge_index(previous, previous_results, results, stale, episode_cutoff):
+    group_cols = ["PID", "ORG_LONG_NAME"]
+    # Groups of stale samples in the previous and the new version
+    affected = pd.concat(
+        [
+            previous_results.loc[previous_results.BI_NBR.isin(stale), group_cols],
+            results.loc[results.BI_NBR.isin(stale) | results.BI_NBR.isna(), group_cols],
+        ]
+    ).drop_duplicates()
+    affected = pd.MultiIndex.from_frame(affected.astype(object))
+    in_affected = pd.MultiIndex.from_frame(results[group_cols].astype(object)).isin(affected)
+
+    index = separate_BSI_episodes(results[in_affected], episode_cutoff=episode_cutoff)
+    unaffected = results.loc[~in_affected, "BI_NBR"]
+    index = pd.concat(
+        [previous[previous.BI_NBR.isin(unaffected)], index], ignore_index=True
+    )
+
+    # Same row order as separate_BSI_episodes on all results
+    keys = results[["BI_NBR", "PID", "ORG_LONG_NAME", "COLLECT_DTM"]].drop_duplicates("BI_NBR")
+    keys["COLLECT_DTM"] = pd.to_datetime(keys["COLLECT_DTM"], format="%Y-%m-%d")
+    order = (
+        index[["BI_NBR"]]
+        .merge(keys, on="BI_NBR", how="left")
+        .sort_values(by=["PID", "ORG_LONG_NAME", "COLLECT_DTM"])
+        .index
+    )
+    return index.loc[order].reset_index(drop=True)
+
+
+def _merge_reports(previous, new, stale):
+    reports = pd.concat([_keep(previous, stale), new])
+    reports = reports[sorted(reports.columns)].sort_index()
+    reports.columns.name = new.columns.name or previous.columns.name
+    return reports
+
+
+def read_artifacts(version, fns=ARTIFACT_FNS):
+    """
+    Reads the artifacts of an APL version, missing artifacts are skipped.
+    """
+    artifacts = {}
+    for name, fn in fns.items():
+        fn = P(str(fn).format(version=version))
+        if fn.is_file():
+            artifacts[name] = pd.read_parquet(fn)
+        else:
+            logging.warning(f"File not found {fn}")
+    return artifacts
+
+
+def write_artifacts(artifacts, version, fns=ARTIFACT_FNS):
+    for name, df in artifacts.items():
+        fn = P(str(fns[name]).format(version=version))
+        os.makedirs(fn.parent, exist_ok=True)
+        logging.warning(f"Writing {name} to {fn}")
+        df.to_parquet(fn)
+
+
+def update_version(version, previous_version, fn=FN, fns=ARTIFACT_FNS, episode_cutoff=30):
+    """
+    Generates and writes the artifacts of the APL version `version`
+    from the artifacts of `previous_version`, see update_artifacts.
+
+    Returns
+    -------
+    dict with the lists of 'added', 'changed' and 'removed' BI numbers
+    """
+    start = time.perf_counter()
+    previous = read_artifacts(previous_version, fns=fns)
+    artifacts, changes = update_artifacts(
+        str(fn).format(version=version),
+        previous,
+        fn_previous=str(fn).format(version=previous_version),
+        episode_cutoff=episode_cutoff,
+    )
+    write_artifacts(artifacts, version, fns=fns)
+    logging.warning(f"Updated APL version {version} in {time.perf_counter() - start:.1f} s")
+    return changes
@@ -17,9 +17,28 @@ class LSARP:
         self.organisms = None
         self.drugs = None
         self.mappings = {}
+        self.shipment_timings = None
 
-    def load_shipments(self, last_repeat=True):
-        self.shipments = T.get_all_shipments(self.path_shipments)
+    def load_shipments(self, last_repeat=True, cache_dir=None, n_workers=None):
+        """
+        Reads all shipment workbooks into self.shipments and the load
+        time per file into self.shipment_timings.
+
+        Parameters
+        ----------
+        last_repeat - bool, keep only the last repeat of each well
+        cache_dir - str or None, directory for parsed workbooks, only
+            new or changed workbooks are parsed again. 'default' writes
+            to .cache/ in the shipments directory, which is shared.
+            None (default) parses all workbooks without caching.
+        n_workers - int, number of processes
+        """
+        self.shipments, self.shipment_timings = T.get_all_shipments(
+            self.path_shipments,
+            cache_dir=cache_dir,
+            n_workers=n_workers,
+            return_timings=True,
+        )
         if last_repeat:
             self.shipments = (
                 self.shipments.sort_values("RPT")
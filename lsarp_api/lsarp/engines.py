@@ -1,9 +1,26 @@
 import os
+import json
+import uuid
+import sqlite3
+import hashlib
+from datetime import datetime
+from contextlib import contextmanager
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 
 from pathlib import Path as P
-from glob import glob
-from dask import dataframe as dd
+
+from ..tools import atomic_write
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
 
 
 class Engine:
@@ -17,18 +34,52 @@ class Engine:
         def get(Id):
             pass
 
+    def put_many(self, items):
+        """
+        Stores many datasets.
+
+        Parameters
+        ----------
+        items - iterable of (Id, pandas.DataFrame)
+        """
+        for Id, df in items:
+            self.put(Id, df)
+
 
 class FileEngine(Engine):
+    """
+    Stores each dataset in its own file. The ids, files, row counts,
+    schema hashes and modification times are recorded in a catalog,
+    so that reading all datasets does not list the directory.
+
+        path/
+            catalog.json
+            catalog.lock
+            {Id}/
+                {Id}.parquet
+
+    Catalog updates are serialized between processes with a lock on
+    catalog.lock. The catalog is reread when another engine replaced
+    it, but it only knows about datasets written through an engine:
+    files that were copied, changed or removed by hand are not seen
+    until rebuild_catalog() is called.
+    """
+
+    CATALOG_FN = "catalog.json"
+    LOCK_FN = "catalog.lock"
+
     def __init__(self, path):
         super().__init__(path)
         self._suffix = None
+        self._catalog = None
+        self._catalog_stamp = None
 
     def get_ids(self):
-        ids = glob(f"{self.path}/*")
+        return self.get_all_ids()
 
     def fns_from_ids(self, ids=None):
         if ids is None:
-            ids = self.get_all_ids()
+            return [P(self.path) / entry["fn"] for entry in self.read_catalog().values()]
         elif isinstance(ids, str):
             ids = [ids]
         fns = [self.fn(Id) for Id in ids]
@@ -39,8 +90,7 @@ class FileEngine(Engine):
         return fn
 
     def get_all_ids(self):
-        ids = map(os.path.basename, glob(f'{self.path/"*"}'))
-        return [i for i in ids]
+        return list(self.read_catalog())
 
     def get(self, ids=None, kind="df"):
         fns = self.fns_from_ids(ids)
@@ -52,6 +102,157 @@ class FileEngine(Engine):
         if kind == "df":
             return ddf.compute()
 
+    def put(self, Id, df):
+        self.put_many([(Id, df)])
+
+    def put_many(self, items):
+        """
+        Stores many datasets and updates the catalog once.
+
+        Parameters
+        ----------
+        items - iterable of (Id, pandas.DataFrame)
+        """
+        entries = {}
+        for Id, df in items:
+            fn = self.fn(Id)
+            os.makedirs(fn.parent, exist_ok=True)
+            self._write(fn, df)
+            entries[Id] = self._describe(fn, n_rows=len(df))
+        with self._lock():
+            catalog = self._read_catalog()
+            catalog.update(entries)
+            self._write_catalog(catalog)
+
+    def read_catalog(self):
+        """
+        Returns the catalog as dict {Id: entry}, the catalog is
+        created with rebuild_catalog() if it does not exist.
+        """
+        if not (P(self.path) / self.CATALOG_FN).is_file():
+            with self._lock():
+                return self._read_catalog()
+        return self._read_catalog()
+
+    def _read_catalog(self):
+        fn = P(self.path) / self.CATALOG_FN
+        if not fn.is_file():
+            return self._rebuild_catalog()
+        stat = fn.stat()
+        # The catalog is replaced on every write, so a new inode or
+        # modification time means that another engine changed it.
+        stamp = (stat.st_ino, stat.st_mtime_ns)
+        if self._catalog is None or stamp != self._catalog_stamp:
+            with open(fn) as file:
+                self._catalog = json.load(file)["ids"]
+            self._catalog_stamp = stamp
+        return dict(self._catalog)
+
+    def catalog(self):
+        """
+        Returns the catalog as pandas.DataFrame with one row per Id.
+        """
+        columns = ["ID", "FN", "N_ROWS", "SCHEMA_HASH", "MTIME_NS"]
+        rows = [
+            [Id, entry["fn"], entry["n_rows"], entry["schema_hash"], entry["mtime_ns"]]
+            for Id, entry in self.read_catalog().items()
+        ]
+        return pd.DataFrame(rows, columns=columns)
+
+    def rebuild_catalog(self):
+        """
+        Resyncs the catalog with the files on disk. Files that did not
+        change since they were cataloged are not read again.
+
+        Returns
+        -------
+        dict {Id: entry}
+        """
+        with self._lock():
+            return self._rebuild_catalog()
+
+    def _rebuild_catalog(self):
+        fn = P(self.path) / self.CATALOG_FN
+        previous = {}
+        if fn.is_file():
+            with open(fn) as file:
+                previous = json.load(file)["ids"]
+        catalog = {}
+        for path in sorted(P(self.path).glob(f"*/*{self._suffix}")):
+            Id = path.parent.name
+            if path != self.fn(Id):
+                continue
+            entry = previous.get(Id)
+            if entry is None or entry["mtime_ns"] != path.stat().st_mtime_ns:
+                entry = self._describe(path)
+            catalog[Id] = entry
+        self._write_catalog(catalog)
+        return dict(catalog)
+
+    def _describe(self, fn, n_rows=None):
+        """
+        Returns the catalog entry of a file.
+        """
+        if n_rows is None:
+            n_rows = self._n_rows(fn)
+        schema = json.dumps(self._schema(fn)).encode()
+        return {
+            "fn": str(P(fn).relative_to(self.path)),
+            "n_rows": int(n_rows),
+            "schema_hash": hashlib.sha1(schema).hexdigest()[:16],
+            "mtime_ns": P(fn).stat().st_mtime_ns,
+        }
+
+    def _write_catalog(self, catalog):
+        catalog = dict(sorted(catalog.items()))
+        fn = P(self.path) / self.CATALOG_FN
+        os.makedirs(fn.parent, exist_ok=True)
+        with atomic_write(fn) as tmp, open(tmp, "w") as file:
+            json.dump({"ids": catalog}, file, indent=1)
+        stat = fn.stat()
+        self._catalog = catalog
+        self._catalog_stamp = (stat.st_ino, stat.st_mtime_ns)
+
+    @contextmanager
+    def _lock(self):
+        """
+        Holds an exclusive lock on the catalog of this engine.
+        """
+        fn = P(self.path) / self.LOCK_FN
+        os.makedirs(fn.parent, exist_ok=True)
+        with open(fn, "a+") as file:
+            lock_file(file)
+            try:
+                yield
+            finally:
+                unlock_file(file)
+
+
+def lock_file(file):
+    """
+    Blocks until this process holds an exclusive lock on the open file,
+    with flock on POSIX and msvcrt.locking on Windows.
+    """
+    if fcntl is not None:
+        fcntl.flock(file, fcntl.LOCK_EX)
+        return
+    file.seek(0)
+    while True:
+        try:
+            # Retries for 10 seconds before it raises
+            msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            continue
+
+
+def unlock_file(file):
+    if fcntl is not None:
+        fcntl.flock(file, fcntl.LOCK_UN)
+        return
+    file.seek(0)
+    msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+
 
 class Parquet(FileEngine):
     def __init__(self, path):
@@ -60,13 +261,19 @@ class Parquet(FileEngine):
         self._format = "parquet"
         self._read_func = self._read
 
-    def put(self, Id, df):
-        fn = self.fn(Id)
-        os.makedirs(fn.parent, exist_ok=True)
+    def _write(self, fn, df):
         df.to_parquet(fn)
 
+    def _n_rows(self, fn):
+        return pq.read_metadata(fn).num_rows
+
+    def _schema(self, fn):
+        return [[field.name, str(field.type)] for field in pq.read_schema(fn)]
+
     @classmethod
     def _read(self, fns):
+        from dask import dataframe as dd
+
         return dd.read_parquet(fns, engine="pyarrow")
 
 
@@ -75,16 +282,598 @@ class CSV(FileEngine):
         super().__init__(path)
         self._suffix = ".csv"
         self._format = "csv"
-        self._read = dd.read_csv
+        self._read_func = self._read
 
-    def put(self, Id, df):
-        fn = self.fn(Id)
-        os.makedirs(fn.parent, exist_ok=True)
+    def _write(self, fn, df):
         df.to_csv(fn)
 
+    def _n_rows(self, fn):
+        return len(pd.read_csv(fn, usecols=[0]))
+
+    def _schema(self, fn):
+        return list(pd.read_csv(fn, nrows=0).columns)
+
+    @classmethod
+    def _read(self, fns):
+        from dask import dataframe as dd
+
+        return dd.read_csv(fns)
+
+
+class ParquetDataset(Engine):
+    """
+    Stores all datasets in one hive-partitioned parquet dataset. Filters
+    on partition columns skip whole directories, other filters use the
+    row group statistics, and only the requested columns are read.
+
+        path/
+            _common_metadata
+            PLATE_SETUP=EC001/
+                RPT=R0/
+                    part-{uuid}-0.parquet
+                    compacted-{uuid}.parquet
+
+    Each put writes new files, compact() merges the small files of each
+    partition into one file.
+
+    The partition columns are stored in the metadata of the
+    _common_metadata schema and read back when the dataset is opened.
+
+    Parameters
+    ----------
+    path - str
+    partition_cols - list of str, columns to partition by, e.g.
+        ['PLATE_SETUP', 'RPT'], defaults to the stored partition
+        columns of an existing dataset, or ['Id']
+    """
+
+    SCHEMA_FN = "_common_metadata"
+    PARTITION_COLS_KEY = b"lsarp_api.partition_cols"
+
+    def __init__(self, path, partition_cols=None):
+        super().__init__(path)
+        stored = self._stored_partition_cols()
+        if partition_cols is not None:
+            partition_cols = list(partition_cols)
+            if stored is not None and partition_cols != stored:
+                raise ValueError(
+                    f"{path} is partitioned by {stored}, not by {partition_cols}"
+                )
+        self.partition_cols = stored or partition_cols or ["Id"]
+
+    def schema(self):
+        """
+        Returns the schema of the dataset, None if nothing was stored.
+        """
+        fn = P(self.path) / self.SCHEMA_FN
+        if not fn.is_file():
+            return None
+        return pq.read_schema(fn)
+
+    def dataset(self):
+        """
+        Returns the pyarrow.dataset.Dataset, None if nothing was stored.
+        """
+        schema = self.schema()
+        if schema is None:
+            return None
+        return ds.dataset(
+            self.path,
+            schema=schema,
+            format="parquet",
+            partitioning=self._partitioning(schema),
+        )
+
+    def put(self, Id, df):
+        self.put_many([(Id, df)])
+
+    def put_many(self, items):
+        """
+        Stores many datasets with one write. Existing rows with
+        the same Id are replaced.
+
+        Parameters
+        ----------
+        items - iterable of (Id, pandas.DataFrame)
+        """
+        tables = [
+            pa.Table.from_pandas(df.assign(Id=str(Id)), preserve_index=False)
+            for Id, df in items
+        ]
+        if not tables:
+            return
+        # Permissive promotion, e.g. int64 and double (a column with
+        # missing values in some frames) become double
+        table = pa.concat_tables(tables, promote_options="permissive")
+        previous = self.schema()
+        schema = table.schema
+        if previous is not None:
+            schema = pa.unify_schemas([previous, schema], promote_options="permissive")
+            self.delete(pc.unique(table.column("Id")).to_pylist())
+        schema = schema.with_metadata(
+            {self.PARTITION_COLS_KEY: json.dumps(self.partition_cols)}
+        )
+        os.makedirs(self.path, exist_ok=True)
+        pq.write_metadata(schema, P(self.path) / self.SCHEMA_FN)
+        ds.write_dataset(
+            _conform(table, schema),
+            self.path,
+            format="parquet",
+            partitioning=self._partitioning(schema),
+            basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+        )
+
+    def get(self, ids=None, kind="df", filters=None, columns=None):
+        """
+        Reads datasets.
+
+        Parameters
+        ----------
+        ids - str or list of str, defaults to all datasets
+        kind - str, 'df', 'dask' or 'arrow'
+        filters - list of (column, op, value) tuples, or a list of
+            such lists, like pyarrow.parquet filters
+        columns - list of str, defaults to all columns except Id
+
+        Returns
+        -------
+        pandas.DataFrame, dask.dataframe.DataFrame or pyarrow.Table
+        """
+        if kind not in ["df", "dask", "arrow"]:
+            raise ValueError(f"Unknown kind {kind}, use 'df', 'dask' or 'arrow'")
+        dataset = self.dataset()
+        if dataset is None:
+            table = pa.table({col: pa.array([], pa.null()) for col in columns or []})
+            if kind == "arrow":
+                return table
+            df = table.to_pandas()
+            if kind == "dask":
+                from dask import dataframe as dd
+
+                return dd.from_pandas(df, npartitions=1)
+            return df
+        if columns is None:
+            columns = [name for name in dataset.schema.names if name != "Id"]
+        if isinstance(ids, str):
+            ids = [ids]
+        if ids is not None:
+            filters = and_filters(filters, [("Id", "in", [str(Id) for Id in ids])])
+        if kind == "dask":
+            from dask import dataframe as dd
+
+            # Lazy, one partition per file, filters skip whole directories
+            return dd.read_parquet(
+                self.path,
+                columns=columns,
+                filters=filters,
+                index=False,
+                dataset={"partitioning": dataset.partitioning},
+            )
+        expression = pq.filters_to_expression(filters) if filters else None
+        table = dataset.to_table(columns=columns, filter=expression)
+        if kind == "arrow":
+            return table
+        return table.to_pandas()
+
+    def get_all_ids(self):
+        dataset = self.dataset()
+        if dataset is None:
+            return []
+        ids = dataset.to_table(columns=["Id"]).column("Id")
+        return sorted(pc.unique(ids).to_pylist())
+
+    def delete(self, ids):
+        """
+        Removes the rows of the given Ids. Files that only contain
+        these Ids are removed, other files are rewritten.
+        """
+        dataset = self.dataset()
+        if dataset is None:
+            return
+        if isinstance(ids, str):
+            ids = [ids]
+        ids = [str(Id) for Id in ids]
+        expression = pc.field("Id").isin(ids)
+        for fragment in dataset.get_fragments(filter=expression):
+            if "Id" in self.partition_cols:
+                os.remove(fragment.path)
+                continue
+            n_matches = fragment.count_rows(filter=expression)
+            if n_matches == 0:
+                continue
+            if n_matches == fragment.count_rows():
+                os.remove(fragment.path)
+                continue
+            table = pq.read_table(fragment.path, partitioning=None)
+            keep = pc.invert(pc.is_in(table.column("Id"), pa.array(ids, pa.string())))
+            _replace_file(table.filter(keep), fragment.path)
+
+    def compact(self, min_rows=1_000_000):
+        """
+        Merges the small files of each partition into one file,
+        sorted by Id so that the row group statistics of the Id
+        column are selective.
+
+        Parameters
+        ----------
+        min_rows - int, files with fewer rows are merged
+
+        Returns
+        -------
+        pandas.DataFrame with the number of merged files and rows
+        per partition directory
+        """
+        dataset = self.dataset()
+        stats = []
+        if dataset is None:
+            return pd.DataFrame(stats, columns=["DIRECTORY", "N_FILES", "N_ROWS"])
+        small = {}
+        for fn in dataset.files:
+            if pq.read_metadata(fn).num_rows < min_rows:
+                small.setdefault(P(fn).parent, []).append(fn)
+        for directory, fns in sorted(small.items()):
+            if len(fns) < 2:
+                continue
+            table = pa.concat_tables(
+                [pq.read_table(fn, partitioning=None) for fn in fns],
+                promote_options="permissive",
+            )
+            table = _conform(table, self._file_schema(dataset.schema))
+            if "Id" in table.column_names:
+                table = table.sort_by("Id")
+            _replace_file(table, directory / f"compacted-{uuid.uuid4().hex}.parquet")
+            for fn in fns:
+                os.remove(fn)
+            stats.append(
+                {
+                    "DIRECTORY": str(directory.relative_to(self.path)),
+                    "N_FILES": len(fns),
+                    "N_ROWS": table.num_rows,
+                }
+            )
+        return pd.DataFrame(stats, columns=["DIRECTORY", "N_FILES", "N_ROWS"])
+
+    def _partitioning(self, schema):
+        fields = [schema.field(col) for col in self.partition_cols]
+        return ds.partitioning(pa.schema(fields), flavor="hive")
+
+    def _file_schema(self, schema):
+        """
+        Schema of the data files, without the partition columns.
+        """
+        return pa.schema(
+            [field for field in schema if field.name not in self.partition_cols]
+        )
+
+    def _stored_partition_cols(self):
+        schema = self.schema()
+        if schema is None or not schema.metadata:
+            return None
+        value = schema.metadata.get(self.PARTITION_COLS_KEY)
+        return None if value is None else json.loads(value)
+
+
+def _conform(table, schema):
+    """
+    Casts a table to a schema, columns it does not have are null.
+    """
+    columns = [
+        table.column(field.name).cast(field.type)
+        if field.name in table.column_names
+        else pa.nulls(len(table), field.type)
+        for field in schema
+    ]
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def _replace_file(table, fn):
+    """
+    Writes a parquet file via a hidden temporary file, which
+    dataset readers ignore.
+    """
+    with atomic_write(fn) as tmp:
+        pq.write_table(table, tmp)
+
+
+SQL_TYPES = {"b": "BOOLEAN", "i": "INTEGER", "u": "INTEGER", "f": "REAL", "M": "TIMESTAMP"}
+SQL_OPERATORS = {
+    "=": "=",
+    "==": "=",
+    "!=": "!=",
+    "<": "<",
+    "<=": "<=",
+    ">": ">",
+    ">=": ">=",
+    "in": "IN",
+    "not in": "NOT IN",
+}
+
 
 class SQLite(Engine):
-    pass
+    """
+    Stores all datasets in one table of a SQLite database, with an
+    indexed Id column. Replaces many small files by a single file
+    and reads without listing directories.
+
+        path/
+            data.sqlite
+
+    Parameters
+    ----------
+    path - str, directory of the database, or the database file
+        itself if it ends with .sqlite or .db
+    table - str, name of the table, several datasets can share
+        one database file with different tables
+
+    Column names are case-insensitive like in SQLite, e.g. a 'plate'
+    column is stored in an existing 'PLATE' column. The Id column is
+    reserved for the dataset Id.
+    """
+
+    def __init__(self, path, table="data"):
+        super().__init__(path)
+        path = P(path)
+        if path.suffix in [".sqlite", ".db"]:
+            self.fn = path
+        else:
+            self.fn = path / "data.sqlite"
+        self.table = table
+
+    def connect(self):
+        os.makedirs(self.fn.parent, exist_ok=True)
+        return sqlite3.connect(self.fn)
+
+    def put(self, Id, df):
+        self.put_many([(Id, df)])
+
+    def put_many(self, items):
+        """
+        Stores many datasets in a single transaction. Existing
+        rows with the same Id are replaced.
+
+        Parameters
+        ----------
+        items - iterable of (Id, pandas.DataFrame)
+        """
+        con = self.connect()
+        try:
+            with con:
+                for Id, df in items:
+                    self._insert(con, Id, df)
+        finally:
+            con.close()
+
+    def get(self, ids=None, kind="df", filters=None, columns=None):
+        """
+        Reads datasets.
+
+        Parameters
+        ----------
+        ids - str or list of str, defaults to all datasets
+        kind - str, 'df' or 'dask'
+        filters - list of (column, op, value) tuples, or a list of
+            such lists, like pyarrow.parquet filters. Evaluated by
+            SQLite in the WHERE clause.
+        columns - list of str, defaults to all columns
+
+        Returns
+        -------
+        pandas.DataFrame or dask.dataframe.DataFrame
+        """
+        if kind not in ["df", "dask"]:
+            raise ValueError(f"Unknown kind {kind}, use 'df' or 'dask'")
+        con = self.connect()
+        try:
+            types = self._column_types(con)
+            if columns is None:
+                columns = list(types)
+            names = {col.lower(): col for col in types}
+            columns = [names.get(str(col).lower(), col) for col in columns]
+            unknown = [col for col in columns if col not in types]
+            if unknown:
+                raise KeyError(f"Unknown columns {unknown}")
+            if isinstance(ids, str):
+                ids = [ids]
+            if ids is not None:
+                filters = and_filters(filters, [("Id", "in", [str(Id) for Id in ids])])
+            where, params = sql_where(filters, list(types) + ["Id"])
+            query = (
+                f"SELECT {', '.join(map(quote, columns))} "
+                f"FROM {quote(self.table)}{where} ORDER BY Id, rowid"
+            )
+            df = pd.read_sql_query(query, con, params=params) if types else None
+        finally:
+            con.close()
+        if df is None:
+            df = pd.DataFrame(columns=columns)
+        for col in columns:
+            if types[col] == "TIMESTAMP":
+                df[col] = pd.to_datetime(df[col])
+            elif types[col] == "BOOLEAN" and df[col].notna().all():
+                df[col] = df[col].astype(bool)
+        if kind == "dask":
+            from dask import dataframe as dd
+
+            return dd.from_pandas(df, npartitions=1)
+        return df
+
+    def get_all_ids(self):
+        con = self.connect()
+        try:
+            if not self._column_types(con):
+                return []
+            query = f"SELECT DISTINCT Id FROM {quote(self.table)} ORDER BY Id"
+            return [Id for (Id,) in con.execute(query)]
+        finally:
+            con.close()
+
+    def delete(self, ids):
+        if isinstance(ids, str):
+            ids = [ids]
+        con = self.connect()
+        try:
+            with con:
+                con.executemany(
+                    f"DELETE FROM {quote(self.table)} WHERE Id = ?",
+                    [(Id,) for Id in ids],
+                )
+        finally:
+            con.close()
+
+    def _column_types(self, con):
+        """
+        Returns dict {column: declared SQL type} without the Id column,
+        empty if the table does not exist.
+        """
+        info = con.execute(f"PRAGMA table_info({quote(self.table)})").fetchall()
+        return {name: decl for _, name, decl, *_ in info if name != "Id"}
+
+    def _insert(self, con, Id, df):
+        check_columns(df.columns)
+        types = self._column_types(con)
+        names = {col.lower() for col in types}
+        new = {col: sql_type(dtype) for col, dtype in df.dtypes.items()}
+        if not types:
+            definition = ", ".join(
+                ["Id TEXT NOT NULL"] + [f"{quote(c)} {t}" for c, t in new.items()]
+            )
+            con.execute(f"CREATE TABLE {quote(self.table)} ({definition})")
+            con.execute(
+                f"CREATE INDEX {quote(f'{self.table}_Id')} "
+                f"ON {quote(self.table)} (Id)"
+            )
+        else:
+            for col, typ in new.items():
+                if str(col).lower() not in names:
+                    con.execute(
+                        f"ALTER TABLE {quote(self.table)} ADD COLUMN {quote(col)} {typ}"
+                    )
+        con.execute(f"DELETE FROM {quote(self.table)} WHERE Id = ?", (str(Id),))
+        if df.empty:
+            return
+        columns = ["Id"] + list(df.columns)
+        values = [[str(Id)] * len(df)] + [
+            sql_values(df[col]) for col in df.columns
+        ]
+        placeholders = ", ".join("?" * len(columns))
+        con.executemany(
+            f"INSERT INTO {quote(self.table)} ({', '.join(map(quote, columns))}) "
+            f"VALUES ({placeholders})",
+            zip(*values),
+        )
+
+
+def quote(name):
+    """
+    Quotes an SQL identifier.
+    """
+    name = str(name).replace('"', '""')
+    return f'"{name}"'
+
+
+def check_columns(columns):
+    """
+    Raises ValueError for column names that SQLite cannot tell apart
+    and for the reserved Id column.
+    """
+    lower = pd.Series([str(col).lower() for col in columns], dtype=object)
+    if (lower == "id").any():
+        raise ValueError(
+            "The column name Id is reserved for the dataset Id, rename the column"
+        )
+    duplicated = [col for col, dup in zip(columns, lower.duplicated(keep=False)) if dup]
+    if duplicated:
+        raise ValueError(f"Column names differ only in case: {duplicated}")
+
+
+def sql_type(dtype):
+    return SQL_TYPES.get(dtype.kind, "TEXT")
+
+
+def sql_values(series):
+    """
+    Converts a column to a list of Python objects that sqlite3 can
+    store, missing values become None.
+    """
+    if series.dtype.kind == "M":
+        values = series.to_numpy(dtype="datetime64[ns]")
+        strings = np.datetime_as_string(values, unit="us").astype(object)
+        strings[np.isnat(values)] = None
+        return strings.tolist()
+    values = series.to_numpy()
+    mask = pd.isna(values)
+    if values.dtype.kind in "biuf" and not mask.any():
+        return values.tolist()
+    values = values.astype(object)
+    values[mask] = None
+    return [sql_param(value) for value in values]
+
+
+def and_filters(filters, terms):
+    """
+    Adds terms to all conjunctions of filters in disjunctive normal form.
+    """
+    if not filters:
+        return [terms]
+    if not isinstance(filters[0], list):
+        filters = [filters]
+    return [list(conj) + terms for conj in filters]
+
+
+def sql_where(filters, columns):
+    """
+    Translates pyarrow.parquet style filters to an SQL WHERE clause.
+
+    Parameters
+    ----------
+    filters - list of (column, op, value) tuples, combined with AND,
+        or a list of such lists, combined with OR
+    columns - list of str, valid column names
+
+    Returns
+    -------
+    (str, list), the clause and its parameters
+    """
+    if not filters:
+        return "", []
+    if not isinstance(filters[0], list):
+        filters = [filters]
+    names = {str(col).lower(): col for col in columns}
+    disjunction, params = [], []
+    for conj in filters:
+        terms = []
+        for col, op, value in conj:
+            if str(col).lower() not in names:
+                raise KeyError(f"Unknown column {col}")
+            col = names[str(col).lower()]
+            if op not in SQL_OPERATORS:
+                raise ValueError(f"Unknown operator {op}")
+            if op in ["in", "not in"]:
+                value = list(value)
+                terms.append(
+                    f"{quote(col)} {SQL_OPERATORS[op]} ({', '.join('?' * len(value))})"
+                )
+                params.extend(sql_param(v) for v in value)
+            else:
+                terms.append(f"{quote(col)} {SQL_OPERATORS[op]} ?")
+                params.append(sql_param(value))
+        disjunction.append("(" + " AND ".join(terms or ["1"]) + ")")
+    return " WHERE " + " OR ".join(disjunction), params
+
+
+def sql_param(value):
+    """
+    Converts a value to a type that sqlite3 can store.
+    """
+    if value is None or isinstance(value, (str, int, float, bytes)):
+        return value
+    if isinstance(value, (datetime, np.datetime64)):
+        # Same format as the stored TIMESTAMP columns
+        return pd.Timestamp(value).strftime("%Y-%m-%dT%H:%M:%S.%f")
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
 
 
 def get_engine(use):
@@ -92,3 +881,7 @@ def get_engine(use):
         return CSV
     if use == "parquet":
         return Parquet
+    if use == "sqlite":
+        return SQLite
+    if use == "parquet_dataset":
+        return ParquetDataset
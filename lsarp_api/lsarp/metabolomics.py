@@ -66,8 +66,7 @@ class MetabolomicsWorklist:
         return self
 
     def put(self):
-        for Id, df in tqdm(self._grps):
-            self.engine.put(Id, df)
+        self.engine.put_many(tqdm(self._grps))
 
 
 class MintResults:
@@ -102,8 +101,7 @@ class MintResults:
         return self
 
     def put(self):
-        for Id, df in tqdm(self._grps):
-            self.engine.put(Id, df)
+        self.engine.put_many(tqdm(self._grps))
 
     def crosstab(self, col="peak_max", kind="dask"):
         ddf = self.get(kind="dask")
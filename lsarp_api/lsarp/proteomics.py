@@ -33,8 +33,7 @@ class MaxQuant:
         return self
 
     def put(self):
-        for Id, df in tqdm(self._grps):
-            self.engine.put(Id, df)
+        self.engine.put_many(tqdm(self._grps))
 
 
 class PlexData:
@@ -95,5 +94,6 @@ class PlexData:
         return self
 
     def put(self):
-        for (Id, rpt), df in tqdm(self._grps):
-            self.engine.put(f"{Id}-{rpt}", df)
+        self.engine.put_many(
+            (f"{Id}-{rpt}", df) for (Id, rpt), df in tqdm(self._grps)
+        )
@@ -1,13 +1,20 @@
-from glob import glob
+from glob import glob, escape
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
+import os
+import time
+import hashlib
+import inspect
 import pandas as pd
 import logging
 import re
 
 from pathlib import Path as P
 from pathlib import PureWindowsPath
+from functools import lru_cache
 
 from .standards import WORKLIST_COLUMNS, WORKLIST_MAPPING
+from ..tools import atomic_write
 from tqdm import tqdm
 
 
@@ -73,28 +80,23 @@ def format_shipment(df):
     }
 
     df = df.rename(columns=mapping, errors="ignore")
-    df = df[df.ORGANISM.notna()]
-    df = df[df.DATE_SHIPPED.notna()]
+    df = df[df.ORGANISM.notna() & df.DATE_SHIPPED.notna()]
 
-    df["PLATE"] = df["PLATE"].str.replace("LSARP_", "")
+    df["PLATE"] = map_unique(df["PLATE"], lambda x: x.str.replace("LSARP_", ""))
 
     if "PLATE_LOCN" in df.columns:
-        try:
-            df["PLATE_ROW"] = df.PLATE_LOCN.apply(lambda x: x[0])
-        except:
-            print(df)
-        df["PLATE_COL"] = df.PLATE_LOCN.apply(lambda x: x.split(",")[1]).apply(
-            lambda x: f"{int(x):02.0f}"
+        # PLATE_LOCN looks like 'A,1', raises if a column is missing
+        df["PLATE_ROW"] = map_unique(df.PLATE_LOCN, lambda x: x.str[0])
+        df["PLATE_COL"] = map_unique(
+            df.PLATE_LOCN,
+            lambda x: x.str.split(",").str[1].astype(int).astype(str).str.zfill(2),
         )
-
-        try:
-            df["RPT"] = df.PLATE.str.replace("_RPT", "-R1").apply(
-                lambda x: x.split("-")[1]
-            )
-        except:
-            df["RPT"] = "R0"
-        df["PLATE_SETUP"] = df.PLATE.apply(lambda x: x.split("-")[0]).replace(
-            "_RPT", ""
+        rpt = map_unique(
+            df.PLATE, lambda x: x.str.replace("_RPT", "-R1").str.split("-").str[1]
+        )
+        df["RPT"] = "R0" if rpt.isna().any() else rpt
+        df["PLATE_SETUP"] = map_unique(
+            df.PLATE, lambda x: x.str.split("-").str[0].replace("_RPT", "")
         )
 
     cols = [
@@ -110,14 +112,36 @@ def format_shipment(df):
         "ORGANISM_ORIG",
     ]
 
-    df["BI_NBR"] = [i if i.startswith("BI") else None for i in df.ISOLATE_NBR]
+    is_bi = df.ISOLATE_NBR.str.startswith("BI", na=False)
+    df["BI_NBR"] = df.ISOLATE_NBR.where(is_bi, None)
 
     df["ORGANISM_ORIG"] = df["ORGANISM"].copy()
-    df["ORGANISM"] = df["ORGANISM"].apply(standardize_organism)
+    df["ORGANISM"] = map_unique(df["ORGANISM"], lambda x: x.map(standardize_organism))
 
     return df[cols]
 
 
+def map_unique(series, func):
+    """
+    Applies func to the unique values of a series and broadcasts the
+    result to all rows. Plates, plate locations and organisms repeat
+    a lot within a shipment, so each one is parsed only once.
+
+    Parameters
+    ----------
+    series - pandas.Series
+    func - function, takes and returns a pandas.Series of
+        the same length
+
+    Returns
+    -------
+    pandas.Series, aligned with series
+    """
+    codes, uniques = pd.factorize(series, use_na_sentinel=False)
+    result = func(pd.Series(uniques, dtype=series.dtype)).to_numpy()
+    return pd.Series(result[codes], index=series.index, name=series.name)
+
+
 def standardize_organism(x):
     x = str(x).replace("#", "")
     replacements = {
@@ -142,14 +166,146 @@ def read_shipment(fn):
     return df
 
 
-def get_all_shipments(path):
-    fns = glob(str(P(path) / "*Shipment*xlsx"))
+@lru_cache()
+def shipment_parser_version():
+    """
+    Hash of the source code of the functions that parse a shipment
+    workbook. Any change of the parser changes the version, so that
+    cached shipments parsed by another version are not used.
+    """
+    funcs = [read_shipment, format_shipment, map_unique, standardize_organism]
+    source = "".join(inspect.getsource(func) for func in funcs)
+    source += inspect.getsource(remove_digits)
+    return hashlib.sha1(source.encode()).hexdigest()[:12]
+
+
+def shipment_cache_fn(fn, cache_dir):
+    """
+    Path of the cached parquet file of a shipment workbook. The file
+    size, modification time and the parser version are part of the
+    name, so that changed workbooks or a changed parser never hit a
+    stale entry.
+    """
+    fn = P(fn)
+    stat = fn.stat()
+    key = f"{stat.st_size}.{stat.st_mtime_ns}.{shipment_parser_version()}"
+    return P(cache_dir) / f"{fn.name}.{key}.parquet"
+
+
+def read_shipment_cached(fn, cache_dir=None):
+    """
+    Reads a shipment workbook, or its cached version if the workbook
+    did not change since it was cached. Parsed workbooks are written
+    to the cache, older entries of the same workbook are removed.
+
+    Parameters
+    ----------
+    fn - str, path to the workbook
+    cache_dir - str or None, cache directory, no caching if None
+
+    Returns
+    -------
+    (pandas.DataFrame or None, float, bool)
+        shipment, load time in seconds, read from cache
+    """
+    start = time.perf_counter()
+    if cache_dir is None:
+        df = read_shipment(fn)
+        return df, time.perf_counter() - start, False
+    cache_fn = shipment_cache_fn(fn, cache_dir)
+    if cache_fn.is_file():
+        df = pd.read_parquet(cache_fn)
+        return df, time.perf_counter() - start, True
+    df = read_shipment(fn)
+    if df is not None:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            for old in P(cache_dir).glob(f"{escape(P(fn).name)}.*.parquet"):
+                old.unlink()
+            with atomic_write(cache_fn) as tmp:
+                df.to_parquet(tmp)
+        except Exception as e:
+            logging.warning(f"Cannot cache {fn} in {cache_dir}:\n {e}")
+    return df, time.perf_counter() - start, False
+
+
+def read_shipments(fns, cache_dir=None, n_workers=None):
+    """
+    Reads shipment workbooks with a process pool. Only workbooks
+    that are not in the cache are parsed.
+
+    Parameters
+    ----------
+    fns - list of str
+    cache_dir - str or None, cache directory, no caching if None
+    n_workers - int, number of processes, defaults to the number
+        of CPUs, 1 reads in the current process
+
+    Returns
+    -------
+    (dict {fn: pandas.DataFrame or None}, pandas.DataFrame)
+        shipments and the load time in seconds per file
+    """
+    n_workers = n_workers or os.cpu_count() or 1
+    results = {}
+    if n_workers == 1 or len(fns) < 2:
+        for fn in tqdm(fns):
+            results[fn] = read_shipment_cached(fn, cache_dir)
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            futures = {
+                pool.submit(read_shipment_cached, fn, cache_dir): fn for fn in fns
+            }
+            for future in tqdm(as_completed(futures), total=len(futures)):
+                results[futures[future]] = future.result()
+    timings = pd.DataFrame(
+        [
+            {
+                "SHIPMENT_FILE": P(fn).name,
+                "SECONDS": results[fn][1],
+                "CACHED": results[fn][2],
+            }
+            for fn in fns
+        ],
+        columns=["SHIPMENT_FILE", "SECONDS", "CACHED"],
+    )
+    return {fn: results[fn][0] for fn in fns}, timings
+
+
+def get_all_shipments(path, cache_dir=None, n_workers=None, return_timings=False):
+    """
+    Reads and combines all shipment workbooks in a directory.
+
+    Parameters
+    ----------
+    path - str, directory with *Shipment*xlsx files
+    cache_dir - str or None, cache directory for parsed workbooks,
+        'default' uses path/.cache next to the workbooks, None (default)
+        disables the cache
+    n_workers - int, number of processes
+    return_timings - bool, also return the load time per file
+
+    Returns
+    -------
+    pandas.DataFrame, or (pandas.DataFrame, pandas.DataFrame)
+        if return_timings
+    """
+    if cache_dir == "default":
+        cache_dir = P(path) / ".cache"
+    fns = sorted(glob(str(P(path) / "*Shipment*xlsx")))
     fns = [i for i in fns if "$" not in i]
+    shipments, timings = read_shipments(fns, cache_dir=cache_dir, n_workers=n_workers)
+    logging.info(
+        f"Read {len(fns)} shipment files in {timings.SECONDS.sum():.1f} s, "
+        f"{timings.CACHED.sum()} from cache"
+    )
     shipments = (
-        pd.concat([read_shipment(fn) for fn in tqdm(fns)])
+        pd.concat(shipments.values())
         .sort_values(["DATE_SHIPPED", "PLATE", "RPT", "PLATE_COL", "PLATE_ROW"])
         .reset_index(drop=True)
     )
+    if return_timings:
+        return shipments, timings
     return shipments
 
 
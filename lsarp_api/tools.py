@@ -1,42 +1,123 @@
+import os
+import uuid
+import numpy as np
 import pandas as pd
 from datetime import date
+from contextlib import contextmanager
+from pathlib import Path as P
 from .dashboard import create_dashboard_data
 
 
-def format_apl_data(df, years=None, datetime_numeric=False):
-    df = df.copy()
+def format_apl_data(df, years=None, datetime_numeric=False, inplace=False):
+    """
+    Adds derived columns (AGE_GRP, date features, onset flags, ...) to the
+    raw APL data, fills missing times and replaces empty strings with None.
+
+    The input frame is never copied as a whole. Derived and changed
+    columns are assigned column by column, either to a shallow copy of
+    df that shares the unchanged columns with df, or with inplace=True
+    to df itself. If years is given, the rows are filtered first, so
+    that only the selected years are formatted.
+
+    Parameters
+    ----------
+    df - pandas.DataFrame, raw APL data
+    years - list of int, only keep these years
+    datetime_numeric - bool or 'mixed', see add_date_features_from_datetime_col
+    inplace - bool, modify df, only possible without years
+
+    Returns
+    -------
+    pandas.DataFrame
+    """
+    if years is not None:
+        assert not inplace, "years cannot be used with inplace=True"
+        df = df.take(np.flatnonzero(df.COLLECT_DTM.dt.year.isin(years)))
+    elif not inplace:
+        df = df.copy(deep=False)
     df["YEAR"] = df.COLLECT_DTM.dt.year
     df["NTH_YEAR"] = df.COLLECT_DTM.dt.year - df.ENCNTR_ADMIT_DTM.dt.year
-    df["AGE_GRP"] = df["NAGE_YR"].apply(age_to_age_group)
+    df["AGE_GRP"] = age_groups(df["NAGE_YR"])
     df["COLLECT_HOURS_AFTER_ADMIT"] = (df.COLLECT_DTM - df.ENCNTR_ADMIT_DTM).astype(
         "timedelta64[s]"
     ).astype(int) / 3600
-    df["INTERP"] = df["INTERP"].fillna("N")
+    interp = df["INTERP"]
+    if interp.hasnans:
+        if isinstance(interp.dtype, pd.CategoricalDtype) and "N" not in interp.cat.categories:
+            interp = interp.cat.add_categories("N")
+        df["INTERP"] = interp.fillna("N")
     df["FLAG_COLLECT_24h_BEFORE_ADMIT"] = df["COLLECT_HOURS_AFTER_ADMIT"] < 24
     df["HOSPITAL_ONSET_48H"] = df["COLLECT_HOURS_AFTER_ADMIT"] > 48
-    df["HOSPITAL_ONSET_72H"] = df["COLLECT_HOURS_AFTER_ADMIT"] > 72  
+    df["HOSPITAL_ONSET_72H"] = df["COLLECT_HOURS_AFTER_ADMIT"] > 72
     add_date_features_from_datetime_col(df, "COLLECT_DTM", numeric=datetime_numeric)
-    if years is not None:
-        df = df[df.YEAR.astype(int).isin(years)]
-    df = fill_missing_times(df)
-    df = df.replace('', None)
+    fill_missing_times(df, inplace=True)
+    replace_empty_strings(df, inplace=True)
     return df
 
 
-def fill_missing_times(df, fill_value=None):
-    df = df.copy()
+def fill_missing_times(df, fill_value=None, inplace=False):
+    if not inplace:
+        df = df.copy(deep=False)
     if fill_value is None:
         fill_value = pd.to_datetime(date(1970, 1, 1))
     cols = df.dtypes[df.dtypes=='datetime64[ns]'].index.to_list()
     for col in cols:
-        df[col] = df[col].fillna(fill_value)
-    return df 
+        if df[col].hasnans:
+            df[col] = df[col].fillna(fill_value)
+    return df
+
+
+def replace_empty_strings(df, value=None, inplace=False):
+    """
+    Replaces empty strings with value in the object and string
+    columns of df. Only columns that contain empty strings are
+    replaced. In string and categorical columns empty strings
+    are replaced with missing values.
+    """
+    if not inplace:
+        df = df.copy(deep=False)
+    # df.select_dtypes would copy the selected columns
+    for col, dtype in df.dtypes.items():
+        if isinstance(dtype, pd.CategoricalDtype):
+            if "" in dtype.categories:
+                df[col] = df[col].cat.remove_categories("")
+        elif isinstance(dtype, pd.StringDtype):
+            empty = (df[col] == "").to_numpy(dtype=bool, na_value=False)
+            if empty.any():
+                df[col] = df[col].mask(empty)
+        elif dtype == object:
+            empty = (df[col] == "").to_numpy(dtype=bool, na_value=False)
+            if empty.any():
+                values = df[col].to_numpy(dtype=object, copy=True)
+                values[empty] = value
+                df[col] = pd.Series(values, index=df.index, dtype=dtype)
+    return df
 
 
 def today():
     return date.today().strftime("%y%m%d")
 
 
+@contextmanager
+def atomic_write(fn):
+    """
+    Yields a hidden temporary path next to fn and moves it to fn when
+    the block succeeds, so that readers never see a partially written
+    file. The temporary file is removed if the block fails.
+
+        with atomic_write(fn) as tmp:
+            df.to_parquet(tmp)
+    """
+    fn = P(fn)
+    tmp = fn.parent / f".{fn.name}.{uuid.uuid4().hex}.tmp"
+    try:
+        yield tmp
+        os.replace(tmp, fn)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
 def log2p1(x):
     try:
         return np.log2(x + 1)
@@ -44,28 +125,54 @@ def log2p1(x):
         return x
 
     
-def age_to_age_group(x):
+# Lower edges of the age groups, ages below the first edge are "Unknown"
+AGE_GROUP_EDGES = [0, 10, 20, 30, 40, 50, 60, 70, 80]
+
+
+def age_group_labels(edges=AGE_GROUP_EDGES):
+    """
+    Labels of the age groups defined by edges,
+    e.g. ['Unknown', '00-09', ..., '70-79', '80+'].
+    """
+    labels = ["Unknown"]
+    labels += [f"{lower:02d}-{upper - 1:02d}" for lower, upper in zip(edges[:-1], edges[1:])]
+    labels.append(f"{edges[-1]}+")
+    return labels
+
+
+def age_to_age_group(x, edges=AGE_GROUP_EDGES):
     x = int(x)
-    if x < 0:
-        return "Unknown"
-    elif x < 10:
-        return "00-09"
-    elif x < 20:
-        return "10-19"
-    elif x < 30:
-        return "20-29"
-    elif x < 40:
-        return "30-39"
-    elif x < 50:
-        return "40-49"
-    elif x < 60:
-        return "50-59"
-    elif x < 70:
-        return "60-69"
-    elif x < 80:
-        return "70-79"
-    else:
-        return "80+"
+    return age_group_labels(edges)[np.searchsorted(edges, x, side="right")]
+
+
+def age_groups(ages, edges=AGE_GROUP_EDGES):
+    """
+    Vectorized age_to_age_group.
+
+    Parameters
+    ----------
+    ages - array-like or pandas.Series, age in years
+    edges - list of int, lower edges of the age groups
+
+    Returns
+    -------
+    Ordered pandas.Categorical with the labels of age_group_labels(edges),
+    a pandas.Series with the same index if ages is a pandas.Series.
+    Missing ages are "Unknown".
+    """
+    values = pd.to_numeric(np.asarray(ages), errors="coerce").astype("float64")
+    # Group codes of the ages -1, 0, ..., edges[-1], all other ages are
+    # clipped to this range. Like int(), the cast truncates towards zero,
+    # e.g. -0.5 is in the first group.
+    lookup = np.searchsorted(edges, np.arange(-1, edges[-1] + 1), side="right").astype("int8")
+    missing = np.isnan(values)
+    values = np.clip(values, -1, edges[-1], out=values)
+    values[missing] = -1
+    codes = lookup[values.astype("int16") + 1]
+    groups = pd.Categorical.from_codes(codes, age_group_labels(edges), ordered=True)
+    if isinstance(ages, pd.Series):
+        return pd.Series(groups, index=ages.index, name=ages.name)
+    return groups
 
 
 def add_date_features_from_datetime_col(
@@ -74,91 +181,126 @@ def add_date_features_from_datetime_col(
     """
     Takes a column with dtype pandas.datetime and extracts time features.
     The year, quarter, month, week, date (without time) and combined features.
+    All features are computed with numpy datetime arithmetic on the whole
+    column, string labels are only formatted once per distinct value.
 
     Parameters
     ----------
     df - pandas.DataFrame
     date_col_name - str, column name of df
+    numeric - bool or 'mixed', True: combined features are floats,
+        e.g. YEAR_MONTH = YEAR + (MONTH - 1) / 12, False: combined features
+        are categorical string labels, 'mixed': numeric features except
+        YEAR_DAY, which is not added
+    add_prefix - bool, prefix the added columns with date_col_name
+
     Added columns
     -------------
-    YEAR - int, year contained in date column
-    QUARTER - int, year contained in date column
-    MONTH - int, year contained in date column
-    WEEK - int, year contained in date column
-    DAY - int, year contained in date column
-    DATE - datetime, date contained in date column
+    YEAR - int16, year contained in date column
+    QUARTER - int16, quarter contained in date column
+    QUADRIMESTER - int16, quadrimester contained in date column
+    MONTH - int16, month contained in date column
+    WEEK - int16, ISO week contained in date column
+    DAY - int16, day of the month contained in date column
+    DAYOFWEEK - int16, day of the week, Monday=0
+    DAYOFYEAR - int16, day of the year contained in date column
+    DATE - datetime64, date contained in date column
         without time
-    YEAR_DAY - str, format: "%4d-D%03d"
-    YEAR_WEEK - str, format: "%4d-W%02d"
-    YEAR_MONTH - str, format: "%4d-M%02d"
-    YEAR_QUATER - str, format: "%4d-Q%1d"
-    """
+    YEAR_DAY - category, format: "%4d-%03d"
+    YEAR_WEEK - category, format: "%4d-%02d"
+    YEAR_MONTH - category, format: "%4d-%02d"
+    YEAR_QUARTER - category, format: "%4d-%1d"
+    YEAR_QUADRIMESTER - category, format: "%4d-%1d"
 
-    month_to_quadrimester = {i: ((i + 3) // 4) for i in range(1, 13)}
+    Components are nullable Int16 if the date column has missing values.
+    """
 
     assert date_col_name in df.columns, "%s not in df.columns" % (date_col_name)
     assert df[date_col_name].dtype
-    
+
     prefix = f"{date_col_name}_" if add_prefix else ""
-    
-    df.loc[:, f"{prefix}YEAR"] = df[date_col_name].dt.year
-    df.loc[:, f"{prefix}MONTH"] = df[date_col_name].dt.month
-    df.loc[:, f"{prefix}WEEK"] = df[date_col_name].dt.isocalendar().week
-    df.loc[:, f"{prefix}DAYOFWEEK"] = df[date_col_name].dt.dayofweek
-    df.loc[:, f"{prefix}DAY"] = df[date_col_name].dt.day
-    df.loc[:, f"{prefix}DAYOFYEAR"] = df[date_col_name].dt.dayofyear
-    df.loc[:, f"{prefix}DATE"] = df[date_col_name].dt.date
-    df.loc[:, f"{prefix}QUARTER"] = df[date_col_name].dt.quarter
-
-    df.loc[:, f"{prefix}QUADRIMESTER"] = df.loc[:, f"{prefix}MONTH"].replace(
-        month_to_quadrimester
-    )
 
-    if numeric is True:
-        df.loc[:, f"{prefix}YEAR_DAY"] = df.YEAR + df[f"{prefix}DAYOFYEAR"].apply(
-            lambda x: (x - 1) / 365
-        )
-        df.loc[:, f"{prefix}YEAR_WEEK"] = df.YEAR + df[f"{prefix}WEEK"].apply(
-            lambda x: (x - 1) / 52
-        )
-        df.loc[:, f"{prefix}YEAR_MONTH"] = df.YEAR + df[f"{prefix}MONTH"].apply(
-            lambda x: (x - 1) / 12
-        )
-        df.loc[:, f"{prefix}YEAR_QUARTER"] = df.YEAR + df[f"{prefix}QUARTER"].apply(
-            lambda x: (x - 1) / 4
-        )
-        df.loc[:, f"{prefix}YEAR_QUADRIMESTER"] = df.YEAR + df[f"{prefix}QUADRIMESTER"].apply(
-            lambda x: (x - 1) / 3
-        )
-    elif numeric is False:
-        df.loc[:, f"{prefix}YEAR_DAY"] = (
-            df.YEAR.astype(str) + "-" + df.DAYOFYEAR.map("{:03.0f}".format)
-        )
-        df.loc[:, f"{prefix}YEAR_WEEK"] = (
-            df.YEAR.astype(str) + "-" + df.WEEK.map("{:02.0f}".format)
-        )
-        df.loc[:, f"{prefix}YEAR_MONTH"] = (
-            df.YEAR.astype(str) + "-" + df.MONTH.map("{:02.0f}".format)
-        )
-        df.loc[:, f"{prefix}YEAR_QUARTER"] = (
-            df.YEAR.astype(str) + "-" + df.QUARTER.astype(str)
-        )
-        df.loc[:, f"{prefix}YEAR_QUADRIMESTER"] = (
-            df.YEAR.astype(str) + "-" + df.QUADRIMESTER.astype(str)
-        )
-    elif numeric == "mixed":
-        df.loc[:, f"{prefix}YEAR_WEEK"] = df.YEAR + df[f"{prefix}WEEK"].apply(
-            lambda x: (x - 1) / 52
-        )
-        df.loc[:, f"{prefix}YEAR_MONTH"] = df.YEAR + df[f"{prefix}MONTH"].apply(
-            lambda x: (x - 1) / 12
-        )
-        df.loc[:, f"{prefix}YEAR_QUARTER"] = df.YEAR + df[f"{prefix}QUARTER"].apply(
-            lambda x: (x - 1) / 4
-        )
-        df.loc[:, f"{prefix}YEAR_QUADRIMESTER"] = df.YEAR + df[f"{prefix}QUADRIMESTER"].apply(
-            lambda x: (x - 1) / 3
-        )
+    missing = df[date_col_name].isna().to_numpy()
+    time = df[date_col_name].to_numpy(dtype="datetime64[ns]")
+    days = time.astype("datetime64[D]")
+    months = time.astype("datetime64[M]")
+    years = time.astype("datetime64[Y]")
+
+    year = years.astype("int64") + 1970
+    month = (months - years.astype("datetime64[M]")).astype("int64") + 1
+    day = (days - months.astype("datetime64[D]")).astype("int64") + 1
+    dayofyear = (days - years.astype("datetime64[D]")).astype("int64") + 1
+    # 1970-01-01 was a Thursday
+    dayofweek = (days.astype("int64") + 3) % 7
+    # The ISO week is the week of the year of the Thursday in the same week
+    thursday = days - dayofweek + 3
+    week = (
+        thursday - thursday.astype("datetime64[Y]").astype("datetime64[D]")
+    ).astype("int64") // 7 + 1
+    quarter = (month - 1) // 3 + 1
+    quadrimester = (month + 3) // 4
+
+    components = {
+        "YEAR": year,
+        "MONTH": month,
+        "WEEK": week,
+        "DAYOFWEEK": dayofweek,
+        "DAY": day,
+        "DAYOFYEAR": dayofyear,
+    }
+    for name, values in components.items():
+        df[f"{prefix}{name}"] = _int16(values, missing)
+    df[f"{prefix}DATE"] = pd.Series(days.astype("datetime64[ns]"), index=df.index)
+    df[f"{prefix}QUARTER"] = _int16(quarter, missing)
+    df[f"{prefix}QUADRIMESTER"] = _int16(quadrimester, missing)
+
+    # (component, number of periods per year, label width)
+    periods = {
+        "YEAR_DAY": (dayofyear, 365, 3),
+        "YEAR_WEEK": (week, 52, 2),
+        "YEAR_MONTH": (month, 12, 2),
+        "YEAR_QUARTER": (quarter, 4, 1),
+        "YEAR_QUADRIMESTER": (quadrimester, 3, 1),
+    }
+    if numeric == "mixed":
+        periods.pop("YEAR_DAY")
+
+    for name, (values, n_periods, width) in periods.items():
+        if numeric is False:
+            labels = _year_labels(year, values, missing, width)
+        else:
+            labels = year + (values - 1) / n_periods
+            labels[missing] = np.nan
+        df[f"{prefix}{name}"] = pd.Series(labels, index=df.index)
+
+
+def _int16(values, missing):
+    values = values.astype("int16")
+    if missing.any():
+        return pd.arrays.IntegerArray(values, missing.copy())
+    return values
+
+
+def _year_labels(year, values, missing, width):
+    """
+    Categorical "{year}-{value}" labels. Year and value are combined into
+    one integer key, only the distinct keys are formatted.
+    """
+    present = ~missing
+    if not present.any():
+        return pd.Categorical([np.nan] * len(year), categories=[], ordered=True)
+    year_min = year[present].min()
+    size = 1000
+    keys = np.where(present, (year - year_min) * size + values, 0)
+    used = np.flatnonzero(np.bincount(keys[present]))
+    lookup = np.full(used[-1] + 1, -1, dtype="int32")
+    lookup[used] = np.arange(len(used), dtype="int32")
+    codes = lookup[keys]
+    codes[missing] = -1
+    categories = [
+        f"{year_min + key // size}-{key % size:0{width}d}" for key in used
+    ]
+    return pd.Categorical.from_codes(codes, categories=categories, ordered=True)
 
 
 def sort_df_by_row_count(df, axis=1, ascending=True):
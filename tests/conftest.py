@@ -0,0 +1,12 @@
+import pytest
+
+from benchmarks.synthetic import write_apl
+
+
+@pytest.fixture(scope="session")
+def apl_fn(tmp_path_factory):
+    """
+    Small synthetic APL parquet file, see benchmarks/synthetic.py.
+    """
+    fn = tmp_path_factory.mktemp("apl") / "APL.parquet"
+    return write_apl(fn, n_rows=4000, row_group_size=1000)
@@ -0,0 +1,131 @@
+import logging
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from lsarp_api.ahs.AHS import AHS, DATASETS, DERIVED_TABLES, METADATA_READERS
+
+logging.disable(logging.WARNING)
+
+
+def write_tables(path, names, n_rows=500):
+    fns = {}
+    rng = np.random.default_rng(0)
+    for i, name in enumerate(names):
+        df = pd.DataFrame(
+            {
+                "PID": rng.choice([f"P{j:04d}" for j in range(50)], n_rows),
+                "VALUE": rng.random(n_rows) * i,
+                "DATE": pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.integers(0, 365, n_rows), unit="D"),
+            }
+        )
+        fns[name] = path / f"{name}.parquet"
+        df.to_parquet(fns[name])
+    return fns
+
+
+def make_ahs(fns, **kwargs):
+    ahs = AHS(**kwargs)
+    for name, fn in fns.items():
+        ahs.FNS[name]["fn"] = fn
+    return ahs
+
+
+@pytest.fixture
+def dataset_fns(tmp_path):
+    return write_tables(tmp_path, DATASETS)
+
+
+@pytest.mark.parametrize("n_workers", [None, 3])
+def test_load_like_serial_reads(dataset_fns, n_workers):
+    ahs = make_ahs(dataset_fns)
+
+    timings = ahs.load("all", n_workers=n_workers)
+
+    assert list(timings.index) == DATASETS
+    assert (timings >= 0).all()
+    assert list(ahs.datasets) == DATASETS
+    for name in DATASETS:
+        expected = pd.read_parquet(dataset_fns[name])
+        pd.testing.assert_frame_equal(getattr(ahs, name), expected)
+        assert ahs.datasets[name] is getattr(ahs, name)
+
+
+def test_load_names(dataset_fns):
+    ahs = make_ahs(dataset_fns, n_workers=2)
+
+    ahs.load("dad")
+    assert list(ahs.datasets) == ["dad"]
+    assert ahs.accs is None
+
+    ahs.load(["accs", "vs"], n_workers=1)
+    assert set(ahs.datasets) == {"dad", "accs", "vs"}
+    pd.testing.assert_frame_equal(ahs.accs, pd.read_parquet(dataset_fns["accs"]))
+
+    with pytest.raises(ValueError):
+        ahs.load(["dad", "acc"])
+
+
+
+TABLES = list(METADATA_READERS) + DERIVED_TABLES
+
+
+@pytest.fixture
+def table_fns(tmp_path, monkeypatch):
+    # The metadata formatters need the real files
+    for name in METADATA_READERS:
+        monkeypatch.setitem(METADATA_READERS, name, pd.read_parquet)
+    return write_tables(tmp_path, TABLES)
+
+
+def test_tables_are_lazy(table_fns):
+    ahs = make_ahs(table_fns)
+    assert ahs._tables == {} and ahs.timings == {}
+
+    dxcodes_meta = ahs.dxcodes_meta
+    assert list(ahs._tables) == ["dxcodes_meta"]
+    pd.testing.assert_frame_equal(dxcodes_meta, pd.read_parquet(table_fns["dxcodes_meta"]))
+
+    # Read only once
+    table_fns["dxcodes_meta"].unlink()
+    assert ahs.dxcodes_meta is dxcodes_meta
+
+    ahs.dxcodes = dxcodes_meta
+    assert ahs.dxcodes is dxcodes_meta
+    assert set(ahs._tables) == {"dxcodes_meta", "dxcodes"}
+
+
+def test_missing_tables(table_fns):
+    table_fns["postcodes"].unlink()
+    table_fns["population"].unlink()
+    ahs = make_ahs(table_fns)
+
+    # Derived tables are optional, metadata is not
+    assert ahs.postcodes is None
+    with pytest.raises(FileNotFoundError):
+        ahs.population
+
+
+def test_preload_like_lazy_reads(table_fns):
+    lazy = make_ahs(table_fns)
+    expected = {name: getattr(lazy, name) for name in TABLES}
+
+    ahs = make_ahs(table_fns, n_workers=3)
+    atccodes = ahs.atccodes
+    # Tables that were read are not read again
+    table_fns["atccodes"].unlink()
+    assert ahs.preload() is ahs
+
+    assert set(ahs._tables) == set(TABLES)
+    assert ahs.atccodes is atccodes
+    for name, table in expected.items():
+        pd.testing.assert_frame_equal(getattr(ahs, name), table)
+
+
+def test_preload_names(table_fns):
+    ahs = make_ahs(table_fns)
+
+    ahs.preload(["population", "proccodes"], n_workers=1)
+
+    assert set(ahs._tables) == {"population", "proccodes"}
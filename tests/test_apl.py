@@ -0,0 +1,138 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from benchmarks.synthetic import make_apl
+from lsarp_api.apl.APL import (
+    APL,
+    compact_dtypes,
+    gen_reports,
+    gen_reports_long,
+    gen_results,
+    load_apl_data,
+    reports_wide,
+)
+from lsarp_api.tools import age_groups
+
+
+def test_compact_dtypes():
+    df = pd.DataFrame(
+        {
+            "ORGANISM": ["SA", "EC", "SA"],
+            "YEAR_MONTH": [202001.0, 202002.0, np.nan],
+            "AGE_GRP": age_groups(pd.Series([np.nan, 35, 85])),
+            "BI_NBR": ["BI_1", "BI_2", None],
+        }
+    )
+
+    out = compact_dtypes(df)
+
+    assert out.ORGANISM.cat.categories.tolist() == ["EC", "SA"]
+    assert out.YEAR_MONTH.dtype == "float64"
+    assert out.AGE_GRP.cat.ordered
+    assert out.AGE_GRP.cat.categories[0] == "Unknown"
+    assert out.AGE_GRP.tolist() == ["Unknown", "30-39", "80+"]
+    assert out.BI_NBR.dtype == pd.StringDtype("pyarrow")
+    assert df.ORGANISM.dtype == object
+
+
+YEARS = ["2019", "2020", "2021"]
+
+
+@pytest.mark.parametrize(
+    "year",
+    [
+        pa.array([2019, 2020, 2021]),
+        pa.array(YEARS, pa.string()),
+        pa.array(YEARS, pa.large_string()),
+        pa.array(YEARS).dictionary_encode(),
+    ],
+)
+def test_load_apl_data_year_types(tmp_path, year):
+    fn = tmp_path / "APL.parquet"
+    pq.write_table(pa.table({"ORD_ENCNTR_NBR": ["E1", "E2", "E3"], "YEAR": year}), fn)
+
+    df = load_apl_data(fn, years=[2020, 2021])
+
+    assert df.ORD_ENCNTR_NBR.tolist() == ["E2", "E3"]
+
+
+def test_gen_results_ordered_interp():
+    df = pd.DataFrame(
+        {
+            "BI_NBR": ["BI_1", "BI_1", "BI_1", "BI_2"],
+            "DRUG": ["Cefazolin", "Cefazolin", "Vancomycin", "Vancomycin"],
+            "INTERP": ["S", "R", "I", "S"],
+        }
+    )
+
+    results = gen_results(df, index=["BI_NBR"])
+
+    assert results.Cefazolin.tolist() == ["R", "N"]
+    assert results.Vancomycin.tolist() == ["I", "S"]
+    dtype = results.Cefazolin.dtype
+    assert dtype.ordered
+    assert dtype.categories.tolist() == ["S", "I", "R", "N"]
+    assert (results.Vancomycin >= "I").tolist() == [True, False]
+
+
+def test_pivot_results_counts_are_int():
+    results = pd.DataFrame(
+        {
+            "YEAR": [2020, 2020, 2021],
+            "ORGANISM": ["SA", "EC", "SA"],
+            "Cefazolin": pd.Categorical(["S", "R", "S"]),
+        }
+    )
+    # pivot_results only uses the results of the instance
+    apl = SimpleNamespace(results=results)
+
+    df = APL.pivot_results(apl, "Cefazolin")
+
+    assert (df.dtypes == "int64").all()
+    assert df.loc[("EC", "R"), 2021] == 0
+    assert df.loc[("SA", "S")].tolist() == [1, 1]
+
+
+def reference_gen_reports(df):
+    """
+    The pivot_table based gen_reports of the original implementation.
+    """
+    cols = ["BI_NBR", "REPORT_NAME", "REPORT_NAME_2", "PARENT", "RESULT_ENTRY", "RESULT_DISPLAY"]
+    apl_reports = df[cols].set_index(["BI_NBR"]).replace("", None).dropna().reset_index()
+    return pd.pivot_table(
+        apl_reports, index="BI_NBR", columns=["REPORT_NAME"], values="RESULT_DISPLAY", aggfunc=" ".join
+    )
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_gen_reports_like_pivot_table(compact):
+    df = make_apl(n_rows=3000, seed=2)
+    # Missing report values and samples without BI number
+    df.loc[df.index % 13 == 0, "PARENT"] = None
+    df.loc[df.index % 29 == 0, "BI_NBR"] = None
+    expected = reference_gen_reports(df)
+    if compact:
+        df = compact_dtypes(df)
+
+    reports = gen_reports(df)
+
+    pd.testing.assert_frame_equal(
+        reports, expected, check_index_type=False, check_column_type=False
+    )
+    assert reports.notna().sum().sum() == len(gen_reports_long(df))
+
+
+def test_reports_wide_empty():
+    df = make_apl(n_rows=100, seed=0)
+    df["RESULT_DISPLAY"] = ""
+
+    reports_long = gen_reports_long(df)
+
+    assert len(reports_long) == 0
+    assert list(reports_long.columns) == ["BI_NBR", "REPORT_NAME", "RESULT_DISPLAY"]
+    assert reports_wide(reports_long).shape == (0, 0)
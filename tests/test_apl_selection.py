@@ -0,0 +1,234 @@
+import logging
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from lsarp_api.apl.APL import (
+    APL,
+    gen_bi_info,
+    gen_cultures,
+    gen_encounters,
+    select_cultures,
+)
+from lsarp_api.apl.row_index import RowIndex
+
+logging.disable(logging.WARNING)
+
+
+def load(fn, **kwargs):
+    return APL(fn=fn, fn_results=None, version=None, **kwargs)
+
+
+def test_unselected_tables_after_selection(apl_fn):
+    full = load(apl_fn)
+    expected = {
+        name: getattr(full, name)
+        for name in ["drugs", "organisms", "reports", "reports_long"]
+    }
+
+    selected = load(apl_fn, organisms=["SA"])
+    in_place = load(apl_fn)
+    in_place.select_samples(organisms=["SA"])
+
+    for apl in [selected, in_place, full.select(organisms=["SA"])]:
+        assert set(apl.cultures.ORGANISM) == {"SA"}
+        for name, table in expected.items():
+            pd.testing.assert_frame_equal(getattr(apl, name), table)
+    assert expected["reports"].shape == (499, 3)
+
+
+def test_unselected_tables_are_kept(apl_fn):
+    apl = load(apl_fn)
+    reports = apl.reports
+
+    apl.select_samples(organisms=["SA"])
+
+    assert apl.reports is reports
+    assert "cultures" in apl._derived_tables
+
+
+def test_derived_tables_are_lazy(apl_fn):
+    apl = load(apl_fn)
+    assert apl._derived_tables == {}
+
+    n_cultures = len(apl.cultures)
+    assert list(apl._derived_tables) == ["cultures"]
+
+    apl.df = apl.df[apl.df.ORGANISM == "EC"].reset_index(drop=True)
+    assert apl._derived_tables == {}
+    assert set(apl.cultures.ORGANISM) == {"EC"}
+    assert len(apl.cultures) < n_cultures
+
+
+def test_chained_selections(apl_fn):
+    apl = load(apl_fn)
+    df = apl.df
+    cultures = apl.cultures
+    bi_nbrs = cultures.BI_NBR[cultures.ORGANISM.isin(["SA", "KP"])].iloc[::3].tolist()
+    bi_nbrs += cultures.BI_NBR[cultures.ORGANISM == "EC"].iloc[:5].tolist()
+
+    apl.select_samples(organisms=["SA", "KP"])
+    apl.select_samples(bi_nbrs=bi_nbrs)
+
+    # Reference: the isin-based selection of the original implementation
+    expected = gen_cultures(df)
+    expected = expected[expected.ORGANISM.isin(["SA", "KP"])]
+    expected = expected[expected.BI_NBR.isin(bi_nbrs)].reset_index(drop=True)
+    ord_nbrs = expected.ORD_ENCNTR_NBR.unique()
+    expected_bi_info = gen_bi_info(df)
+    expected_bi_info = expected_bi_info[
+        expected_bi_info.BI_NBR.isin(expected.BI_NBR.unique())
+    ].reset_index(drop=True)
+
+    pd.testing.assert_frame_equal(apl.cultures, expected)
+    pd.testing.assert_frame_equal(apl.bi_info, expected_bi_info)
+    pd.testing.assert_frame_equal(
+        apl.df, df[df.ORD_ENCNTR_NBR.isin(ord_nbrs)].reset_index(drop=True)
+    )
+    assert not set(apl.cultures.ORGANISM) & {"EC"}
+
+
+def test_row_index():
+    values = pd.Series(["b", None, "a", "c", "b", None, "a", "b"])
+    index = RowIndex(values)
+    df = pd.DataFrame({"KEY": values, "ROW": range(len(values))})
+
+    for keys in [["b"], ["a", "c"], ["c", "x"], [], ["x"], ["a", None], ["b", "b"]]:
+        np.testing.assert_array_equal(
+            index.positions(keys), np.flatnonzero(values.isin(keys))
+        )
+        pd.testing.assert_frame_equal(
+            index.take(df, keys), df[values.isin(keys)].reset_index(drop=True)
+        )
+
+
+def test_select_leaves_parent_unchanged(apl_fn):
+    apl = load(apl_fn, organisms=["SA", "EC"])
+    df, cultures, encounters = apl.df, apl.cultures, apl.encounters
+    expected = {"df": df.copy(), "cultures": cultures.copy(), "encounters": encounters.copy()}
+
+    view = apl.select(organisms=["SA"])
+    other = view.select(pids=cultures.PID.iloc[:20])
+
+    assert apl.df is df
+    assert apl.cultures is cultures
+    assert apl.encounters is encounters
+    for name, table in expected.items():
+        pd.testing.assert_frame_equal(getattr(apl, name), table)
+    assert apl._selections == [(["SA", "EC"], None, None)]
+    assert len(view._selections) == 2 and len(other._selections) == 3
+    assert set(view.cultures.ORGANISM) == {"SA"}
+    assert len(other.cultures) < len(view.cultures) < len(cultures)
+
+
+SELECTIONS = [
+    {"organisms": ["SA", "KP"]},
+    {"organisms": "EC"},
+    {"bi_nbrs": slice(None, None, 7)},
+    {"pids": slice(None, None, 5)},
+    {"organisms": ["SA", "KP"], "bi_nbrs": slice(None, None, 3)},
+    {"organisms": ["EC", "PA"], "pids": slice(None, None, 2)},
+    {"organisms": ["SA", "EC", "KP"], "bi_nbrs": slice(None, None, 2), "pids": slice(None, None, 3)},
+    {"organisms": ["XX"]},
+]
+
+
+@pytest.mark.parametrize("selection", SELECTIONS)
+@pytest.mark.parametrize("method", ["select_samples", "select"])
+def test_selection_like_isin(apl_fn, selection, method):
+    apl = load(apl_fn)
+    df = apl.df
+    cultures = apl.cultures
+    bi_info = apl.bi_info
+    # The selected encounters are taken from the row index of this table
+    apl.encounters
+    kwargs = dict(selection)
+    if "bi_nbrs" in kwargs:
+        kwargs["bi_nbrs"] = cultures.BI_NBR.unique()[kwargs["bi_nbrs"]].tolist()
+    if "pids" in kwargs:
+        kwargs["pids"] = cultures.PID.unique()[kwargs["pids"]].tolist()
+
+    if method == "select":
+        apl = apl.select(**kwargs)
+    else:
+        apl.select_samples(**kwargs)
+
+    # Reference: the isin-based selection of the original implementation
+    if isinstance(kwargs.get("organisms"), str):
+        kwargs["organisms"] = [kwargs["organisms"]]
+    expected = select_cultures(gen_cultures(df), **kwargs)
+    ord_nbrs = expected.ORD_ENCNTR_NBR.unique()
+    pd.testing.assert_frame_equal(apl.cultures, expected)
+    pd.testing.assert_frame_equal(
+        apl.df, df[df.ORD_ENCNTR_NBR.isin(ord_nbrs)].reset_index(drop=True)
+    )
+    pd.testing.assert_frame_equal(
+        apl.encounters, gen_encounters(df[df.ORD_ENCNTR_NBR.isin(ord_nbrs)])
+    )
+    pd.testing.assert_frame_equal(
+        apl.bi_info,
+        bi_info[bi_info.BI_NBR.isin(expected.BI_NBR)].reset_index(drop=True),
+    )
+
+
+def summaries(apl):
+    return {
+        "n_patients": apl.n_patients,
+        "n_encounters": apl.n_encounters,
+        "n_bi_nbrs": apl.n_bi_nbrs,
+    }
+
+
+def expected_summaries(apl):
+    # df contains the complete encounters of the selected cultures
+    df = apl.df
+    return {
+        "n_patients": len(df.PID.unique()),
+        "n_encounters": len(gen_encounters(df)),
+        "n_bi_nbrs": len(apl.cultures.BI_NBR.dropna().unique()),
+    }
+
+
+def test_n_patients_from_row_index(apl_fn):
+    apl = load(apl_fn)
+    df = apl.df
+    assert apl.n_patients == len(df.PID.unique())
+    pids = apl.cultures.PID.unique()[::4]
+
+    view = apl.select(organisms=["SA", "EC"]).select(pids=pids)
+    apl.select_samples(organisms=["SA", "EC"])
+
+    for selected in [apl, view]:
+        # Counted from the row index of the parent, before df is used
+        assert "n_patients" in selected._summaries
+        assert selected._df is None or selected is apl
+        assert summaries(selected) == expected_summaries(selected)
+
+
+def test_summaries_are_reset(apl_fn):
+    apl = load(apl_fn)
+    assert summaries(apl) == expected_summaries(apl)
+    organism_count = apl.organism_count
+    assert apl.organism_count is organism_count
+
+    # Selections
+    apl.select_samples(organisms=["SA", "KP"])
+    assert set(apl.organism_count.ORGANISM) == {"SA", "KP"}
+    assert summaries(apl) == expected_summaries(apl)
+    view = apl.select(organisms="SA")
+    assert set(view.organism_count.ORGANISM) == {"SA"}
+    assert summaries(view) == expected_summaries(view)
+    assert set(apl.organism_count.ORGANISM) == {"SA", "KP"}
+
+    # Results
+    apl._summaries["n_patients"] = -1
+    apl.results = None
+    assert apl.n_patients == len(apl.df.PID.unique())
+
+    # df
+    organism_count = apl.organism_count
+    apl.df = apl.df[apl.df.ORGANISM == "KP"].reset_index(drop=True)
+    assert apl.organism_count is not organism_count
+    assert set(apl.organism_count.ORGANISM) == {"KP"}
+    assert summaries(apl) == expected_summaries(apl)
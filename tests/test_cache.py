@@ -0,0 +1,34 @@
+import pandas as pd
+
+from lsarp_api.apl.cache import ArtifactCache
+
+
+def test_key_does_not_write(tmp_path):
+    fn = tmp_path / "apl.parquet"
+    pd.DataFrame({"A": [1, 2]}).to_parquet(fn)
+    cache = ArtifactCache(tmp_path / "cache")
+
+    key = cache.key(fn, version="v1", years=[2020])
+
+    assert key == cache.key(fn, version="v1", years=[2020])
+    assert key != cache.key(fn, version="v1", years=[2021])
+    assert not (tmp_path / "cache").exists()
+
+
+def test_put_writes_manifest(tmp_path):
+    fn = tmp_path / "apl.parquet"
+    pd.DataFrame({"A": [1, 2]}).to_parquet(fn)
+    cache = ArtifactCache(tmp_path / "cache")
+    key = cache.key(fn, version="v1", years=[2020])
+    df = pd.DataFrame({"B": [1, 2, 3]})
+
+    cache.put(key, "cultures", df)
+
+    pd.testing.assert_frame_equal(cache.get(key, "cultures"), df)
+    info = cache.info()
+    assert info.TABLE.tolist() == ["cultures"]
+    assert info.N_ROWS.tolist() == [3]
+    assert info.SOURCE.tolist() == [str(fn.resolve())]
+    assert not info.STALE.any()
+    # A new instance reads the manifest back
+    assert ArtifactCache(tmp_path / "cache").info().KEY.tolist() == [key]
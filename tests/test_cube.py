@@ -0,0 +1,84 @@
+import logging
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from lsarp_api.apl.APL import APL, drug_columns
+from lsarp_api.apl.cube import AntibiogramCube
+from lsarp_api.apl.helpers import INTERP_CATEGORIES
+
+logging.disable(logging.WARNING)
+
+
+@pytest.fixture(scope="module")
+def results(apl_fn):
+    apl = APL(fn=apl_fn, fn_results=None, version=None)
+    apl.gen_results()
+    results = apl.results.copy()
+    # Missing dimension values are a label of their own
+    results["GENDER"] = results.GENDER.where(np.arange(len(results)) % 17 != 0)
+    return results
+
+
+def reference_query(results, by=None, where=None, drugs=None):
+    """
+    S/I/R/N counts of a plain groupby on the results.
+    """
+    by = [] if by is None else list(by)
+    for dim, values in (where or {}).items():
+        results = results[results[dim].isin(np.atleast_1d(values))]
+    drugs = drug_columns(results) if drugs is None else list(drugs)
+    long = results[by + drugs].melt(id_vars=by, var_name="DRUG", value_name="INTERP")
+    long["INTERP"] = long.INTERP.astype(str)
+    counts = (
+        long.groupby(by + ["DRUG", "INTERP"], dropna=False, observed=True)
+        .size()
+        .unstack("INTERP", fill_value=0)
+        .reindex(columns=INTERP_CATEGORIES, fill_value=0)
+        .reset_index()
+    )
+    counts.columns.name = None
+    counts["N_TESTED"] = counts.S + counts.I + counts.R
+    counts["PCT_R"] = 100 * counts.R / counts.N_TESTED.where(counts.N_TESTED > 0)
+    return counts
+
+
+def assert_query_equal(cube, results, **kwargs):
+    by = list(kwargs.get("by") or []) + ["DRUG"]
+    result = cube.query(**kwargs)
+    expected = reference_query(results, **kwargs)
+    assert len(result) > 0
+    pd.testing.assert_frame_equal(
+        result.sort_values(by).reset_index(drop=True),
+        expected.sort_values(by).reset_index(drop=True),
+        check_dtype=False,
+        check_categorical=False,
+    )
+
+
+QUERIES = [
+    {},
+    {"by": ["YEAR"]},
+    {"by": ["ORGANISM", "GENDER"]},
+    {"by": ["YEAR", "QUARTER"], "where": {"ORGANISM": "SA"}},
+    {"by": ["CURRENT_PT_FACILITY"], "where": {"ORGANISM": ["SA", "EC"], "YEAR": [2015, 2016]}},
+    {"by": ["HOSPITAL_ONSET_48H"], "drugs": ["Vancomycin", "Cefazolin"]},
+    {"by": ["AGE_GRP"], "where": {"GENDER": "Female"}, "drugs": ["Meropenem"]},
+]
+
+
+@pytest.mark.parametrize("kwargs", QUERIES)
+def test_cube_query(results, kwargs):
+    cube = AntibiogramCube.from_results(results)
+    assert_query_equal(cube, results, **kwargs)
+
+
+@pytest.mark.parametrize("kwargs", QUERIES)
+def test_cube_parquet(results, kwargs, tmp_path):
+    cube = AntibiogramCube.from_results(results)
+    cube.to_parquet(tmp_path / "cube.parquet")
+
+    cube = AntibiogramCube.read_parquet(tmp_path / "cube.parquet")
+
+    assert_query_equal(cube, results, **kwargs)
@@ -0,0 +1,178 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from lsarp_api.lsarp.engines import CSV, Parquet, ParquetDataset, SQLite, get_engine
+
+
+def plate(plate_id, n_rows=4, value=None):
+    return pd.DataFrame(
+        {
+            "PLATE": plate_id,
+            "PLATE_SETUP": plate_id.split("-")[0],
+            "RPT": plate_id.split("-")[1],
+            "PLATE_ROW": list("ABCD")[:n_rows],
+            "VAL": np.arange(n_rows) if value is None else value,
+        }
+    )
+
+
+def test_parquet_dataset_put_get(tmp_path):
+    engine = ParquetDataset(tmp_path, partition_cols=["PLATE_SETUP", "RPT"])
+    engine.put_many([("EC001-R0", plate("EC001-R0")), ("EC002-R0", plate("EC002-R0"))])
+    engine.put("EC001-R0", plate("EC001-R0", n_rows=2))
+
+    assert engine.get_all_ids() == ["EC001-R0", "EC002-R0"]
+    df = engine.get("EC001-R0")
+    assert df.PLATE_ROW.tolist() == ["A", "B"]
+    df = engine.get(filters=[("PLATE_SETUP", "=", "EC002")], columns=["PLATE", "VAL"])
+    assert df.columns.tolist() == ["PLATE", "VAL"]
+    assert df.VAL.tolist() == [0, 1, 2, 3]
+
+
+def test_parquet_dataset_int_and_float(tmp_path):
+    engine = ParquetDataset(tmp_path, partition_cols=["PLATE_SETUP", "RPT"])
+    engine.put("EC001-R0", plate("EC001-R0"))
+    engine.put("EC001-R1", plate("EC001-R1", value=[1.5, np.nan, 2, 3]))
+    engine.put_many(
+        [
+            ("EC002-R0", plate("EC002-R0")),
+            ("EC002-R1", plate("EC002-R1", value=[np.nan, 1, 2, 3])),
+        ]
+    )
+    engine.put("EC003-R0", plate("EC003-R0"))
+
+    df = engine.get()
+    assert df.VAL.dtype == "float64"
+    assert len(df) == 20
+    assert df.VAL.isna().sum() == 2
+
+
+def test_parquet_dataset_compact(tmp_path):
+    engine = ParquetDataset(tmp_path, partition_cols=["RPT"])
+    engine.put("EC001-R0", plate("EC001-R0"))
+    engine.put("EC002-R0", plate("EC002-R0", value=[0.5, np.nan, 1, 2]))
+    engine.put("EC003-R0", plate("EC003-R0"))
+    expected = engine.get().sort_values(["PLATE", "PLATE_ROW"]).reset_index(drop=True)
+
+    stats = engine.compact()
+
+    assert stats.N_FILES.tolist() == [3]
+    assert len(list(tmp_path.glob("RPT=R0/*.parquet"))) == 1
+    actual = engine.get().sort_values(["PLATE", "PLATE_ROW"]).reset_index(drop=True)
+    pd.testing.assert_frame_equal(actual, expected)
+
+
+def test_parquet_dataset_partition_cols_are_stored(tmp_path):
+    engine = ParquetDataset(tmp_path, partition_cols=["PLATE_SETUP", "RPT"])
+    engine.put("EC001-R0", plate("EC001-R0"))
+
+    reopened = get_engine("parquet_dataset")(path=tmp_path)
+
+    assert reopened.partition_cols == ["PLATE_SETUP", "RPT"]
+    assert reopened.get().PLATE_SETUP.tolist() == ["EC001"] * 4
+    with pytest.raises(ValueError):
+        ParquetDataset(tmp_path, partition_cols=["PLATE"])
+
+
+def test_sqlite_put_get(tmp_path):
+    engine = SQLite(tmp_path)
+    engine.put_many([("EC001-R0", plate("EC001-R0")), ("EC002-R0", plate("EC002-R0"))])
+
+    assert engine.get_all_ids() == ["EC001-R0", "EC002-R0"]
+    df = engine.get("EC002-R0")
+    pd.testing.assert_frame_equal(df, plate("EC002-R0"))
+    df = engine.get(filters=[("VAL", ">=", 2)], columns=["PLATE", "VAL"])
+    assert df.columns.tolist() == ["PLATE", "VAL"]
+    assert df.PLATE.tolist() == ["EC001-R0"] * 2 + ["EC002-R0"] * 2
+    assert df.VAL.tolist() == [2, 3, 2, 3]
+
+
+def test_sqlite_replace_and_delete(tmp_path):
+    engine = SQLite(tmp_path)
+    engine.put_many([("EC001-R0", plate("EC001-R0")), ("EC002-R0", plate("EC002-R0"))])
+    engine.put("EC001-R0", plate("EC001-R0", n_rows=2, value=[5, 6]))
+
+    df = engine.get()
+    assert df.PLATE.tolist() == ["EC001-R0"] * 2 + ["EC002-R0"] * 4
+    assert df.VAL.tolist() == [5, 6, 0, 1, 2, 3]
+    engine.delete("EC002-R0")
+    assert engine.get_all_ids() == ["EC001-R0"]
+
+
+def test_sqlite_column_case(tmp_path):
+    engine = SQLite(tmp_path)
+    engine.put("EC001-R0", plate("EC001-R0"))
+    engine.put("EC002-R0", plate("EC002-R0").rename(columns={"PLATE": "plate"}))
+
+    df = engine.get(filters=[("plate", "=", "EC002-R0")], columns=["plate", "VAL"])
+    assert df.columns.tolist() == ["PLATE", "VAL"]
+    assert df.PLATE.tolist() == ["EC002-R0"] * 4
+    with pytest.raises(ValueError, match="Id"):
+        engine.put("EC003-R0", plate("EC003-R0").assign(Id=1))
+    with pytest.raises(ValueError, match="case"):
+        engine.put("EC003-R0", plate("EC003-R0").assign(val=1))
+    assert engine.get_all_ids() == ["EC001-R0", "EC002-R0"]
+
+
+@pytest.mark.parametrize("engine_class", [Parquet, CSV])
+def test_file_engine_catalog(tmp_path, engine_class):
+    engine = engine_class(tmp_path)
+    engine.put_many([("EC001-R0", plate("EC001-R0")), ("EC002-R0", plate("EC002-R0"))])
+    engine.put("EC003-R0", plate("EC003-R0", n_rows=2))
+
+    catalog = engine.catalog()
+    assert catalog.ID.tolist() == ["EC001-R0", "EC002-R0", "EC003-R0"]
+    assert catalog.N_ROWS.tolist() == [4, 4, 2]
+    assert catalog.SCHEMA_HASH.nunique() == 1
+
+    # Removed by hand, the catalog does not see it until it is rebuilt
+    engine.fn("EC002-R0").unlink()
+    assert "EC002-R0" in engine.get_all_ids()
+    engine.rebuild_catalog()
+    assert engine.get_all_ids() == ["EC001-R0", "EC003-R0"]
+    assert engine_class(tmp_path).get_all_ids() == ["EC001-R0", "EC003-R0"]
+
+
+def test_parquet_catalog_concurrent_puts(tmp_path):
+    engine = Parquet(tmp_path)
+    engine.put("EC000-R0", plate("EC000-R0"))
+    ids = [f"EC{i:03d}-R0" for i in range(1, 17)]
+
+    def put(Id):
+        Parquet(tmp_path).put(Id, plate(Id))
+
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(put, ids))
+
+    # Rereads the catalog that was replaced by the other engines
+    assert engine.get_all_ids() == ["EC000-R0"] + ids
+
+
+def test_parquet_dataset_empty(tmp_path):
+    engine = ParquetDataset(tmp_path / "empty")
+
+    table = engine.get(kind="arrow", columns=["PLATE"])
+    assert isinstance(table, pa.Table)
+    assert table.column_names == ["PLATE"]
+    assert table.num_rows == 0
+    assert engine.get().empty
+
+
+def test_parquet_dataset_dask(tmp_path):
+    pytest.importorskip("dask.dataframe", exc_type=ImportError)
+    engine = ParquetDataset(tmp_path, partition_cols=["PLATE_SETUP", "RPT"])
+    engine.put_many([("EC001-R0", plate("EC001-R0")), ("EC002-R0", plate("EC002-R0"))])
+    engine.put("EC002-R1", plate("EC002-R1"))
+
+    ddf = engine.get(kind="dask", filters=[("PLATE_SETUP", "=", "EC002")])
+
+    # Read lazily from the files, not wrapped around a pandas frame
+    assert ddf.npartitions == 2
+    df = ddf.compute().sort_values(["PLATE", "PLATE_ROW"]).reset_index(drop=True)
+    expected = engine.get(filters=[("PLATE_SETUP", "=", "EC002")])
+    expected = expected.sort_values(["PLATE", "PLATE_ROW"]).reset_index(drop=True)
+    pd.testing.assert_frame_equal(df.astype(object), expected.astype(object))
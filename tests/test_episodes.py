@@ -0,0 +1,115 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from lsarp_api.apl.APL import separate_BSI_episodes
+
+
+def reference_episodes(data, episode_cutoff):
+    """
+    The row-wise loop of the original implementation.
+    """
+    data = data[data.BI_NBR.str.startswith("BI")].copy()
+    data["COLLECT_DTM"] = pd.to_datetime(data["COLLECT_DTM"])
+    df = data.sort_values(by=["PID", "ORG_LONG_NAME", "COLLECT_DTM"]).reset_index(drop=True)
+    df["ORGANISM"] = df["ORG_LONG_NAME"]
+    for (pid, org), rows in df.groupby(["PID", "ORGANISM"]).groups.items():
+        times = df.loc[rows, "COLLECT_DTM"]
+        cum_diff = (times - times.iloc[0]) / pd.Timedelta(days=1)
+        df.loc[rows[0], "episode_NBR"] = 1
+        df.loc[rows[0], "index"] = True
+        index_isolate, episode_i = 0, 1
+        for i in range(1, len(rows)):
+            if cum_diff[rows[i]] <= cum_diff[rows[index_isolate]] + episode_cutoff:
+                df.loc[rows[i], "episode_NBR"] = episode_i
+            else:
+                index_isolate = i
+                episode_i += 1
+                df.loc[rows[i], "episode_NBR"] = episode_i
+                df.loc[rows[i], "index"] = True
+    df["total_n_BI"] = df.groupby(["PID", "GENDER", "ORGANISM"])["episode_NBR"].transform("max")
+    df["n_iso_episode"] = df.groupby(["PID", "GENDER", "ORGANISM", "episode_NBR"])[
+        "BI_NBR"
+    ].transform("nunique")
+    df = df.rename(
+        columns={
+            "index": f"INDEX_{episode_cutoff}DAYS",
+            "n_iso_episode": f"N_ISO_EPISODE_INDEX_{episode_cutoff}DAYS",
+            "total_n_BI": "TOTAL_N_BI_NBRS",
+            "episode_NBR": "EPISODE_NBR",
+        }
+    )
+    out_vars = [
+        "BI_NBR",
+        f"INDEX_{episode_cutoff}DAYS",
+        f"N_ISO_EPISODE_INDEX_{episode_cutoff}DAYS",
+        "TOTAL_N_BI_NBRS",
+        "EPISODE_NBR",
+    ]
+    return df[out_vars].fillna(False)
+
+
+def isolates(n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    pids = rng.integers(0, 40, n)
+    df = pd.DataFrame(
+        {
+            "BI_NBR": [f"BI_{i:05d}" for i in range(n)],
+            "PID": [f"P{pid:03d}" for pid in pids],
+            "GENDER": np.where(pids % 2, "Male", "Female"),
+            "ORG_LONG_NAME": rng.choice(
+                ["Staphylococcus aureus", "Escherichia coli", "Candida albicans"], n
+            ),
+            # Whole days, so that isolates of a patient share dates
+            "COLLECT_DTM": pd.Timestamp("2020-01-01")
+            + pd.to_timedelta(rng.integers(0, 120, n), unit="D"),
+        }
+    )
+    # Patients with a single isolate
+    df.loc[:4, "PID"] = [f"S{i}" for i in range(5)]
+    # Isolates exactly at the cutoff of the first isolate
+    df.loc[5:7, ["PID", "GENDER", "ORG_LONG_NAME"]] = ["E0", "Male", "Escherichia coli"]
+    df.loc[5:7, "COLLECT_DTM"] = pd.to_datetime(["2020-01-01", "2020-01-31", "2020-01-31"])
+    # Samples without a BI number are ignored
+    df.loc[8:9, "BI_NBR"] = ["XX_1", "XX_2"]
+    return df.sample(frac=1, random_state=seed).reset_index(drop=True)
+
+
+@pytest.mark.parametrize("cutoff", [0, 7, 14, 30, 90])
+def test_separate_bsi_episodes_matches_reference(cutoff):
+    data = isolates()
+
+    actual = separate_BSI_episodes(data, episode_cutoff=cutoff)
+    expected = reference_episodes(data, cutoff)
+
+    pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+    assert not actual.BI_NBR.str.startswith("XX").any()
+
+
+def test_separate_bsi_episodes_ties_at_cutoff():
+    data = isolates()
+    e0 = data[data.PID == "E0"].sort_values("COLLECT_DTM").BI_NBR.tolist()
+
+    for cutoff, episodes in [(30, [1, 1, 1]), (29, [1, 2, 2])]:
+        index = separate_BSI_episodes(data, episode_cutoff=cutoff).set_index("BI_NBR")
+        assert index.loc[e0, "EPISODE_NBR"].tolist() == episodes
+        assert index.loc[e0, f"N_ISO_EPISODE_INDEX_{cutoff}DAYS"].tolist() == [
+            episodes.count(e) for e in episodes
+        ]
+
+
+def test_separate_bsi_episodes_many_cutoffs():
+    data = isolates(seed=1)
+
+    actual = separate_BSI_episodes(data, episode_cutoff=[14, 30])
+
+    for cutoff in [14, 30]:
+        expected = reference_episodes(data, cutoff).rename(
+            columns={
+                "TOTAL_N_BI_NBRS": f"TOTAL_N_BI_NBRS_{cutoff}DAYS",
+                "EPISODE_NBR": f"EPISODE_NBR_{cutoff}DAYS",
+            }
+        )
+        pd.testing.assert_frame_equal(
+            actual[expected.columns], expected, check_dtype=False
+        )
@@ -0,0 +1,118 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+from lsarp_api.ahs.formatters import (
+    code_lists,
+    codes_long,
+    convert_to_parquet,
+    format_dad,
+    long_codes,
+    read_csv,
+)
+
+
+def write_dad_csv(fn, n_rows=20):
+    rows = []
+    for i in range(n_rows):
+        rows.append(
+            {
+                "ISOLATE_NBR": f"BI_10_{i:04d}",
+                "INST": "80001",
+                "INSTFROM": "",
+                "INSTTO": "",
+                "ADMITDATE": "20200101",
+                "ADMITTIME": "0930" if i % 3 else "",
+                "DISDATE": "20200105",
+                "DISTIME": "1200",
+                "SEX": "MF"[i % 2],
+                # Integers in the first chunk only
+                "ENTRYCODE": "1" if i < 10 else "E",
+                "LOS": str(i),
+                "ALC_DAYS": "" if i < 10 else "2",
+                "DXCODE1": "A41",
+                "DXCODE2": "" if i % 2 else "B95",
+                "DXTYPE1": "M",
+                # No codes in the first chunk
+                "PROCCODE1": "" if i < 10 else "1AB",
+                "PROCCODE2": "",
+            }
+        )
+    pd.DataFrame(rows).to_csv(fn, index=False)
+
+
+def test_convert_to_parquet_matches_format(tmp_path):
+    fn = tmp_path / "dad.csv"
+    write_dad_csv(fn)
+    expected = pd.read_parquet(io.BytesIO(format_dad(fn).to_parquet()))
+
+    n_rows = convert_to_parquet(fn, tmp_path / "dad.parquet", "dad", chunksize=10)
+    actual = pd.read_parquet(tmp_path / "dad.parquet")
+
+    assert n_rows == 20
+    pd.testing.assert_frame_equal(actual, expected)
+    assert actual.ENTRYCODE.tolist() == ["1"] * 10 + ["E"] * 10
+    assert actual.PROCCODES.map(len).tolist() == [0] * 10 + [1] * 10
+    assert actual.ALC_DAYS.dtype == "float64"
+
+
+def test_convert_to_parquet_empty_column(tmp_path):
+    fn = tmp_path / "dad.csv"
+    write_dad_csv(fn)
+    df = pd.read_csv(fn, dtype=str)
+    df["INSTTO"] = None
+    df.to_csv(fn, index=False)
+
+    convert_to_parquet(fn, tmp_path / "dad.parquet", "dad", chunksize=10)
+    actual = pd.read_parquet(tmp_path / "dad.parquet")
+
+    assert actual.INSTTO.isna().all()
+    assert len(actual) == 20
+
+
+def test_convert_to_parquet_long_tables(tmp_path):
+    fn = tmp_path / "dad.csv"
+    write_dad_csv(fn)
+    df = read_csv(fn, "dad").rename(columns={"ISOLATE_NBR": "BI_NBR"})
+    df["ADMITDATE"] = pd.to_datetime(df["ADMITDATE"], format="%Y%m%d")
+    expected = long_codes(df, "dad")
+
+    convert_to_parquet(
+        fn, tmp_path / "dad.parquet", "dad", chunksize=10, long_tables=True
+    )
+
+    for name in ["dxcodes", "proccodes"]:
+        actual = pd.read_parquet(tmp_path / f"dad__{name}_long.parquet")
+        pd.testing.assert_frame_equal(actual, expected[name])
+    assert len(expected["dxcodes"]) == 30
+    assert expected["proccodes"].PROCCODES.tolist() == ["1AB"] * 10
+
+
+def test_code_lists():
+    df = pd.DataFrame(
+        {
+            "DXCODE1": ["A41", None, "J18", "B95"],
+            "DXCODE2": [np.nan, None, "N39", None],
+            "DXCODE3": np.nan,
+            "DOCSVC1": [1, 2, None, 3],
+            "OTHER": ["x", "y", "z", "w"],
+        },
+        index=[10, 11, 12, 13],
+    )
+    expected = [["A41"], [], ["J18", "N39"], ["B95"]]
+
+    lists = code_lists(df, "DXCODE")
+
+    assert lists.index.tolist() == [10, 11, 12, 13]
+    assert [codes.tolist() for codes in lists] == expected
+    assert [codes.tolist() for codes in code_lists(df, "DOCSVC")] == [
+        [1.0], [2.0], [], [3.0]
+    ]
+    assert [codes.tolist() for codes in code_lists(df, "MISSING")] == [[]] * 4
+
+    long = codes_long(df, "DXCODE", "DXCODES", keep=["OTHER"])
+    assert long.index.tolist() == [10, 12, 12, 13]
+    assert long.POSITION.tolist() == [1, 1, 2, 1]
+    assert long.DXCODES.tolist() == ["A41", "J18", "N39", "B95"]
+    assert long.OTHER.tolist() == ["x", "z", "z", "w"]
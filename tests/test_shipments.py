@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from lsarp_api.lsarp import tools as T
+
+
+def write_shipment(fn, plate="EC001"):
+    pd.DataFrame(
+        {
+            "DATE shipped": pd.Timestamp("2021-11-15"),
+            "LSARP_PLATE": f"LSARP_{plate}",
+            "LSARP_LOCN": ["A,1", "A,2", "B,1"],
+            "ORGANISM": ["EC", "MRSA#", "EFAECALI2"],
+            "ISOLATE_NBR": ["ATCC_25922", "BI_10_0005", "BI_10_0006"],
+        }
+    ).to_pickle(fn)
+
+
+def test_get_all_shipments_cache(tmp_path, monkeypatch):
+    # Workbooks are pickled frames, openpyxl is not needed
+    monkeypatch.setattr(pd, "read_excel", pd.read_pickle)
+    write_shipment(tmp_path / "EC001_LSARP_Shipment.xlsx")
+    write_shipment(tmp_path / "EC002_LSARP_Shipment.xlsx", plate="EC002-R1")
+
+    expected = T.get_all_shipments(tmp_path, n_workers=1)
+    assert not (tmp_path / ".cache").exists()
+    assert expected.ORGANISM.tolist() == ["EC", "ENTFAES", "SA"] * 2
+    assert expected.PLATE_COL.tolist() == ["01", "01", "02"] * 2
+
+    cold, timings = T.get_all_shipments(
+        tmp_path, cache_dir="default", n_workers=1, return_timings=True
+    )
+    assert not timings.CACHED.any()
+    warm, timings = T.get_all_shipments(
+        tmp_path, cache_dir="default", n_workers=1, return_timings=True
+    )
+    assert timings.CACHED.all()
+    pd.testing.assert_frame_equal(cold, expected)
+    pd.testing.assert_frame_equal(warm, expected)
+
+    monkeypatch.setattr(T, "shipment_parser_version", lambda: "changed")
+    _, timings = T.get_all_shipments(
+        tmp_path, cache_dir="default", n_workers=1, return_timings=True
+    )
+    assert not timings.CACHED.any()
+    assert len(list((tmp_path / ".cache").iterdir())) == 2
+
+
+def reference_format_shipment(df):
+    """
+    The row-wise format_shipment of the original implementation.
+    """
+    mapping = {"DATE shipped": "DATE_SHIPPED", "LSARP_PLATE": "PLATE", "LSARP_LOCN": "PLATE_LOCN"}
+    df = df.rename(columns=mapping, errors="ignore")
+    df = df[df.ORGANISM.notna()]
+    df = df[df.DATE_SHIPPED.notna()]
+    df["PLATE"] = df["PLATE"].str.replace("LSARP_", "")
+    df["PLATE_ROW"] = df.PLATE_LOCN.apply(lambda x: x[0])
+    df["PLATE_COL"] = df.PLATE_LOCN.apply(lambda x: x.split(",")[1]).apply(
+        lambda x: f"{int(x):02.0f}"
+    )
+    try:
+        df["RPT"] = df.PLATE.str.replace("_RPT", "-R1").apply(lambda x: x.split("-")[1])
+    except IndexError:
+        df["RPT"] = "R0"
+    df["PLATE_SETUP"] = df.PLATE.apply(lambda x: x.split("-")[0]).replace("_RPT", "")
+    df["BI_NBR"] = [i if i.startswith("BI") else None for i in df.ISOLATE_NBR]
+    df["ORGANISM_ORIG"] = df["ORGANISM"].copy()
+    df["ORGANISM"] = df["ORGANISM"].apply(T.standardize_organism)
+    cols = [
+        "DATE_SHIPPED",
+        "PLATE",
+        "PLATE_SETUP",
+        "RPT",
+        "PLATE_ROW",
+        "PLATE_COL",
+        "ORGANISM",
+        "ISOLATE_NBR",
+        "BI_NBR",
+        "ORGANISM_ORIG",
+    ]
+    return df[cols]
+
+
+def make_shipment(plates, n=600, seed=0):
+    rng = np.random.default_rng(seed)
+    organisms = ["EC", "MRSA#", "EFAECALI2", "KP", "sa", "PA", None]
+    locations = zip(rng.choice(list("ABCDEFGH"), n), rng.integers(1, 13, n))
+    return pd.DataFrame(
+        {
+            "DATE shipped": rng.choice(
+                pd.to_datetime(["2021-11-15", "2022-01-10", None]), n, p=[0.5, 0.45, 0.05]
+            ),
+            "LSARP_PLATE": rng.choice([f"LSARP_{plate}" for plate in plates], n),
+            "LSARP_LOCN": [f"{row},{col}" for row, col in locations],
+            "ORGANISM": rng.choice(organisms, n),
+            "ISOLATE_NBR": [
+                f"BI_{i:04d}" if i % 3 else f"ATCC_{i}" for i in rng.integers(0, 10_000, n)
+            ],
+        }
+    )
+
+
+@pytest.mark.parametrize(
+    "plates",
+    [
+        ["EC001-R1", "EC001-R2", "SA002-R1"],
+        ["EC001_RPT", "EC002-R1", "KP003-R3"],
+        # Without repeat number in one plate RPT is R0 for all rows
+        ["EC001", "EC002-R1"],
+    ],
+)
+def test_format_shipment_like_row_wise(plates):
+    df = make_shipment(plates)
+
+    result = T.format_shipment(df.copy())
+
+    pd.testing.assert_frame_equal(result, reference_format_shipment(df.copy()))
+
+
+def test_map_unique():
+    series = pd.Series(["b", None, "a", "b", "a"], index=[5, 4, 3, 2, 1], name="X")
+
+    result = T.map_unique(series, lambda x: x.str.upper())
+
+    pd.testing.assert_series_equal(result, series.str.upper())
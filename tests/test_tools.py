@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from lsarp_api.tools import add_date_features_from_datetime_col, atomic_write
+
+TIMES = ["2020-12-31 23:59", "2021-01-03 08:00", "2021-06-15 10:00", None]
+
+COMPONENTS = {
+    "YEAR": [2020, 2021, 2021, None],
+    "MONTH": [12, 1, 6, None],
+    # 2021-01-03 is a Sunday in ISO week 53 of 2020
+    "WEEK": [53, 53, 24, None],
+    "DAYOFWEEK": [3, 6, 1, None],
+    "DAY": [31, 3, 15, None],
+    "DAYOFYEAR": [366, 3, 166, None],
+    "QUARTER": [4, 1, 2, None],
+    "QUADRIMESTER": [3, 1, 2, None],
+}
+
+LABELS = {
+    "YEAR_DAY": ["2020-366", "2021-003", "2021-166", np.nan],
+    "YEAR_WEEK": ["2020-53", "2021-53", "2021-24", np.nan],
+    "YEAR_MONTH": ["2020-12", "2021-01", "2021-06", np.nan],
+    "YEAR_QUARTER": ["2020-4", "2021-1", "2021-2", np.nan],
+    "YEAR_QUADRIMESTER": ["2020-3", "2021-1", "2021-2", np.nan],
+}
+
+NUMERIC = {
+    "YEAR_DAY": [2020 + 365 / 365, 2021 + 2 / 365, 2021 + 165 / 365, np.nan],
+    "YEAR_WEEK": [2020 + 52 / 52, 2021 + 52 / 52, 2021 + 23 / 52, np.nan],
+    "YEAR_MONTH": [2020 + 11 / 12, 2021.0, 2021 + 5 / 12, np.nan],
+    "YEAR_QUARTER": [2020.75, 2021.0, 2021.25, np.nan],
+    "YEAR_QUADRIMESTER": [2020 + 2 / 3, 2021.0, 2021 + 1 / 3, np.nan],
+}
+
+
+def date_features(numeric, n_rows=4):
+    df = pd.DataFrame({"T": pd.to_datetime(TIMES[:n_rows])})
+    add_date_features_from_datetime_col(df, "T", numeric=numeric)
+    return df
+
+
+@pytest.mark.parametrize("numeric", [False, True, "mixed"])
+def test_date_components(numeric):
+    df = date_features(numeric)
+
+    for name, values in COMPONENTS.items():
+        expected = pd.Series(values, dtype="Int16", name=name)
+        pd.testing.assert_series_equal(df[name], expected)
+    expected = pd.Series(
+        pd.to_datetime(["2020-12-31", "2021-01-03", "2021-06-15", None]), name="DATE"
+    )
+    pd.testing.assert_series_equal(df["DATE"], expected)
+
+
+def test_date_components_without_missing_values():
+    df = date_features(False, n_rows=3)
+
+    for name, values in COMPONENTS.items():
+        assert df[name].dtype == "int16"
+        assert df[name].tolist() == values[:3]
+
+
+def test_date_labels():
+    df = date_features(False)
+
+    for name, values in LABELS.items():
+        assert df[name].dtype.ordered
+        assert df[name].tolist()[:3] == values[:3]
+        assert pd.isna(df[name].iloc[3])
+    assert df.YEAR_MONTH.cat.categories.tolist() == ["2020-12", "2021-01", "2021-06"]
+
+
+@pytest.mark.parametrize("numeric", [True, "mixed"])
+def test_date_numeric(numeric):
+    df = date_features(numeric)
+
+    expected_cols = dict(NUMERIC)
+    if numeric == "mixed":
+        expected_cols.pop("YEAR_DAY")
+        assert "YEAR_DAY" not in df.columns
+    for name, values in expected_cols.items():
+        np.testing.assert_allclose(df[name].to_numpy(dtype=float), values)
+
+
+def test_atomic_write(tmp_path):
+    fn = tmp_path / "table.txt"
+    fn.write_text("old")
+
+    with pytest.raises(RuntimeError):
+        with atomic_write(fn) as tmp:
+            tmp.write_text("partial")
+            raise RuntimeError()
+    assert fn.read_text() == "old"
+    assert [path.name for path in tmp_path.iterdir()] == ["table.txt"]
+
+    with atomic_write(fn) as tmp:
+        tmp.write_text("new")
+    assert fn.read_text() == "new"
+    assert [path.name for path in tmp_path.iterdir()] == ["table.txt"]
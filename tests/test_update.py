@@ -0,0 +1,93 @@
+import logging
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import make_apl
+from lsarp_api.apl.update import build_artifacts, update_artifacts
+
+logging.disable(logging.WARNING)
+
+
+@pytest.fixture(scope="module")
+def versions(tmp_path_factory):
+    """
+    Two APL versions, the second one with added, removed and
+    modified samples.
+    """
+    path = tmp_path_factory.mktemp("versions")
+    old = make_apl(n_rows=3000, seed=0)
+
+    bi_nbrs = old.BI_NBR.unique()
+    removed = bi_nbrs[:15]
+    changed = bi_nbrs[100:120]
+    new = old[~old.BI_NBR.isin(removed)].copy()
+    rows = new.BI_NBR.isin(changed)
+    new.loc[rows, "INTERP"] = new.loc[rows, "INTERP"].map({"S": "R"}).fillna("S")
+
+    # Added samples of known and new patients
+    added = make_apl(n_rows=400, seed=1)
+    added["BI_NBR"] = "NEW_" + added.BI_NBR.astype(str)
+    pids = old.PID.unique()
+    added["PID"] = np.where(
+        added.index % 2 == 0, pids[added.index % len(pids)], "NEW_" + added.PID.astype(str)
+    )
+    new = pd.concat([new, added], ignore_index=True)
+
+    fns = {"old": path / "old.parquet", "new": path / "new.parquet"}
+    old.to_parquet(fns["old"])
+    new.to_parquet(fns["new"])
+    return fns, {"added": len(added.BI_NBR.unique()), "changed": 20, "removed": 15}
+
+
+def assert_artifacts_equal(artifacts, expected):
+    assert set(artifacts) == set(expected)
+    for name, table in expected.items():
+        pd.testing.assert_frame_equal(artifacts[name], table)
+
+
+def test_update_artifacts(versions):
+    fns, n_changes = versions
+    previous = build_artifacts(fns["old"])
+
+    artifacts, changes = update_artifacts(fns["new"], previous)
+
+    assert {key: len(values) for key, values in changes.items()} == n_changes
+    assert_artifacts_equal(artifacts, build_artifacts(fns["new"]))
+
+
+def test_update_artifacts_without_hashes(versions):
+    fns, n_changes = versions
+    previous = build_artifacts(fns["old"])
+    del previous["sample_hashes"]
+
+    artifacts, changes = update_artifacts(fns["new"], previous, fn_previous=fns["old"])
+
+    assert {key: len(values) for key, values in changes.items()} == n_changes
+    assert_artifacts_equal(artifacts, build_artifacts(fns["new"]))
+
+
+def test_update_artifacts_unchanged(versions):
+    fns, _ = versions
+    previous = build_artifacts(fns["old"])
+
+    artifacts, changes = update_artifacts(fns["old"], previous)
+
+    assert changes == {"added": [], "changed": [], "removed": []}
+    for name in ["results", "index", "reports"]:
+        assert artifacts[name] is previous[name]
+    assert_artifacts_equal(artifacts, previous)
+
+
+def test_update_artifacts_reordered(versions, tmp_path):
+    fns, _ = versions
+    previous = build_artifacts(fns["old"])
+    df = pd.read_parquet(fns["old"])
+    rank = df.BI_NBR.astype(str).rank(method="dense", ascending=False)
+    df.iloc[np.argsort(rank.to_numpy(), kind="stable")].to_parquet(tmp_path / "new.parquet")
+
+    artifacts, changes = update_artifacts(tmp_path / "new.parquet", previous)
+
+    assert changes == {"added": [], "changed": [], "removed": []}
+    assert_artifacts_equal(artifacts, build_artifacts(tmp_path / "new.parquet"))
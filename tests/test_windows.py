@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from lsarp_api.ahs.AHS import AHS
+from lsarp_api.ahs.windows import WindowIndex
+
+# The last windows are empty
+WINDOWS = [(365, -7), (30, 0), (7, 8), (1, 1), (400, 400), (1, 0), (-5, 5)]
+
+
+def reference_get_slice(df, days_before=365, days_after=-7, reference_time_col="COLLECT_DTM", time_col="ADMITDATE"):
+    """
+    The row-wise get_slice of the original implementation.
+    """
+    df = df.dropna().copy()
+    n_days = df[time_col].dt.date - df[reference_time_col].dt.date
+    df["n_days"] = [e.days if e is not None else None for e in n_days]
+    return df[(df.n_days > -days_before) & (df.n_days < days_after)]
+
+
+@pytest.fixture(scope="module")
+def dxcodes():
+    rng = np.random.default_rng(0)
+    n = 5000
+    collect = pd.Timestamp("2015-01-01") + pd.to_timedelta(
+        rng.integers(0, 5 * 365 * 24 * 60, n), unit="min"
+    )
+    # Times of day on both sides of midnight
+    admit = collect + pd.to_timedelta(rng.integers(-400 * 24 * 60, 30 * 24 * 60, n), unit="min")
+    df = pd.DataFrame(
+        {
+            "BI_NBR": rng.choice([f"BI_{i:04d}" for i in range(300)], n),
+            "DXCODE": rng.choice(["A41", "J18", "N39", None], n, p=[0.3, 0.3, 0.3, 0.1]),
+            "COLLECT_DTM": collect,
+            "ADMITDATE": admit,
+        }
+    )
+    df.loc[rng.choice(n, 50, replace=False), "ADMITDATE"] = pd.NaT
+    return df
+
+
+@pytest.mark.parametrize("days_before,days_after", WINDOWS)
+def test_window_index_slice(dxcodes, days_before, days_after):
+    index = WindowIndex(dxcodes)
+
+    result = index.slice(days_before=days_before, days_after=days_after)
+
+    expected = reference_get_slice(dxcodes, days_before=days_before, days_after=days_after)
+    assert result.n_days.is_monotonic_increasing
+    pd.testing.assert_frame_equal(result.sort_index(), expected, check_dtype=False)
+
+
+def test_window_index_counts(dxcodes):
+    index = WindowIndex(dxcodes)
+    windows = WINDOWS[:4]
+
+    counts = index.counts(windows)
+
+    for window in windows:
+        expected = reference_get_slice(dxcodes, *window).groupby("BI_NBR").size()
+        pd.testing.assert_series_equal(
+            counts[window][counts[window] > 0], expected, check_names=False
+        )
+
+
+def test_ahs_get_slice(dxcodes):
+    ahs = AHS()
+    ahs.dxcodes = dxcodes
+    expected = reference_get_slice(dxcodes, 30, 0)
+
+    pd.testing.assert_frame_equal(ahs.get_slice(days_before=30, days_after=0).sort_index(), expected)
+    assert ahs.window_index() is ahs.window_index()
+    slices = ahs.get_slices(WINDOWS)
+    pd.testing.assert_frame_equal(slices[(30, 0)].sort_index(), expected)
+
+    # The index is rebuilt when the table is replaced
+    ahs.dxcodes = dxcodes[dxcodes.DXCODE == "A41"]
+    pd.testing.assert_frame_equal(
+        ahs.get_slice(days_before=30, days_after=0).sort_index(),
+        expected[expected.DXCODE == "A41"],
+    )